@@ -27,14 +27,17 @@ __license__ = "Apache-2.0"
 from flask import make_response, jsonify
 
 from actinia_gdi.model.responseModels import SimpleStatusCodeResponseModel
-from actinia_gdi.core import common
-from actinia_gdi.resources.config import ACTINIACORE
+from actinia_gdi.core.healthProbe import healthProbe
+from actinia_gdi.core.jobStore import jobStore
 from actinia_gdi.resources.logging import log
 
 
 def checkConnection(name):
     """ Method to test connection
 
+    The result of the last background check is returned, together with its
+    latency and the health of the jobtable and its connection pool.
+
     Args:
       name (string): resource to test. Can be 'actinia-core' or 'geonetwork'
 
@@ -43,41 +46,37 @@ def checkConnection(name):
       connection success or failure
     """
 
-    if name == 'actinia-core':
-        url = ACTINIACORE.url + "version"
-        name = 'actinia-core'
-        type = 'json'
-
-    try:
-        records = common.checkConnection(url, name, type)
-    except Exception:
+    if name != 'actinia-core':
         log.error("Don't know which connection to test")
+        return None
 
-    if records is not None:
-        res = jsonify(SimpleStatusCodeResponseModel(
-            status=200, message="success"))
-        return make_response(res, 200)
-    elif records is None:
-        res = jsonify(SimpleStatusCodeResponseModel(
-            status=404, message="failure"))
-        return make_response(res, 200)
+    state = healthProbe.state()
+    if state['actinia_core']['healthy']:
+        resp = SimpleStatusCodeResponseModel(status=200, message="success")
+    else:
+        resp = SimpleStatusCodeResponseModel(status=404, message="failure")
+    resp['actinia_core'] = state['actinia_core']
+    resp['jobtable'] = dict(state['jobstore'], pool=jobStore.stats())
+    return make_response(jsonify(resp), 200)
 
 
 def checkConnectionWithoutResponse(name):
     """ Method to test connection
 
+    Reads the result of the last background check instead of calling the
+    resource.
+
     Args:
       name (string): resource to test. Can be 'actinia-core' or 'geonetwork'
-    """
 
-    if name == 'actinia-core':
-        url = ACTINIACORE.url + "version"
-        name = 'actinia-core'
-        type = 'json'
+    Returns:
+      connection (bool): True if the resource is reachable, else None
+    """
 
-    try:
-        connectionTest = common.checkConnection(url, name, type)
-        return connectionTest
-    except Exception:
+    if name != 'actinia-core':
         log.error("Don't know which connection to test")
         return None
+
+    if healthProbe.isHealthy('actinia_core'):
+        return True
+    return None
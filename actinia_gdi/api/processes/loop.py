@@ -28,7 +28,9 @@ __license__ = "Apache-2.0"
 
 # from actinia_gdi.apidocs.processes import loop  # TODO
 from actinia_gdi.api.processes.processes import Job, JobHtml, JobId
-from actinia_gdi.api.processes.processes import JobIdCancel
+from actinia_gdi.api.processes.processes import JobEvents, JobStats
+from actinia_gdi.api.processes.processes import JobExport
+from actinia_gdi.api.processes.processes import JobIdCancel, JobBatch
 
 
 class JobHtmlLoopWrapper(JobHtml):
@@ -51,6 +53,46 @@ class JobLoopWrapper(Job):
         return super(JobLoopWrapper, self).post()
 
 
+class JobBatchLoopWrapper(JobBatch):
+    # no docs because 405
+    def get(self):
+        return super(JobBatchLoopWrapper, self).get()
+
+    # @swagger.doc(loop.jobBatch_post_docs)
+    def post(self):
+        return super(JobBatchLoopWrapper, self).post()
+
+
+class JobStatsLoopWrapper(JobStats):
+    # @swagger.doc(loop.jobStats_get_docs)
+    def get(self):
+        return super(JobStatsLoopWrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobStatsLoopWrapper, self).post()
+
+
+class JobExportLoopWrapper(JobExport):
+    # @swagger.doc(loop.jobExport_get_docs)
+    def get(self):
+        return super(JobExportLoopWrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobExportLoopWrapper, self).post()
+
+
+class JobEventsLoopWrapper(JobEvents):
+    # @swagger.doc(loop.jobEvents_get_docs)
+    def get(self):
+        return super(JobEventsLoopWrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobEventsLoopWrapper, self).post()
+
+
 class JobIdLoopWrapper(JobId):
     # @swagger.doc(loop.jobId_get_docs)
     def get(self, jobid):
@@ -24,7 +24,11 @@ __copyright__ = "2018-present mundialis GmbH & Co. KG"
 __license__ = "Apache-2.0"
 
 
+import hashlib
+from datetime import datetime
+
 from flask import make_response, jsonify, request, render_template
+from flask import json, stream_with_context, Response
 from flask_restful import Resource
 # from flask_restful_swagger_2 import swagger
 
@@ -32,10 +36,111 @@ from flask_restful import Resource
 from actinia_gdi.model.responseModels import SimpleStatusCodeResponseModel
 from actinia_gdi.core.processes import getAllJobIDs, getJobs
 from actinia_gdi.core.processes import createJob, getJob
-from actinia_gdi.core.processes import cancelJob
+from actinia_gdi.core.processes import cancelJob, getJobStatistics
+from actinia_gdi.core.processes import checkJobFields, getJobVersion
+from actinia_gdi.core.processes import getJobWithVersion
+from actinia_gdi.core.processes import createJobs, validateJobs
+from actinia_gdi.core.processes import exportJobHistory
+from actinia_gdi.core.jobExport import EXPORT_FORMATS, exportFormats
+from actinia_gdi.core.jobtable import encodeJobCursor, TERMINAL_STATUS
+from actinia_gdi.core.jobEvents import buildEventFilter, jobEvent
+from actinia_gdi.core.jobEvents import JobEventQueue
+from actinia_gdi.core.loadShedding import ServiceUnavailable
+from actinia_gdi.resources.config import JOBCACHE, JOBEVENTS, JOBTABLE
 from actinia_gdi.resources.logging import log
 
 
+def serviceUnavailable(error):
+    """ Method to answer 503 with the seconds to wait in Retry-After
+    """
+    log.warning('Rejected job: ' + str(error))
+    res = make_response(jsonify(SimpleStatusCodeResponseModel(
+        status=503,
+        message='Service Unavailable: ' + str(error)
+    )), 503)
+    res.headers['Retry-After'] = str(error.retry_after)
+    return res
+
+
+def streamJobs(jobs, limit, orderBy=None):
+    """ Generator to write jobs as JSON while reading them from jobtable
+
+    Produces the same document as jsonify({'jobs': [...]}) plus the cursor
+    "next" to continue the listing if "limit" was reached.
+    """
+    yield '{"jobs": ['
+    count = 0
+    last = None
+    for job in jobs:
+        if count > 0:
+            yield ', '
+        yield json.dumps(job)
+        count += 1
+        last = job
+    cursor = None
+    if limit is not None and count == limit and last is not None:
+        cursor = encodeJobCursor(last, orderBy)
+    yield '], "next": ' + json.dumps(cursor) + '}'
+
+
+def streamJobEvents(matches):
+    """ Generator to write job events as server-sent events
+
+    Sends a comment every JOBEVENTS.heartbeat seconds to keep the
+    connection open and a "reset" event if events were dropped.
+    """
+    events = JobEventQueue(matches)
+    try:
+        yield ': connected\n\n'
+
+        while True:
+            event = events.get(JOBEVENTS.heartbeat)
+            if events.reset:
+                events.reset = False
+                yield 'event: reset\ndata: {}\n\n'
+            if event is None:
+                yield ': keep-alive\n\n'
+                continue
+            yield 'event: job\ndata: ' + json.dumps(event) + '\n\n'
+    finally:
+        events.close()
+
+
+def setJobCacheHeaders(res, job, fields=None):
+    """ Method to set ETag, Last-Modified and Cache-Control of a job
+
+    The ETag changes with the version of the job and the requested fields.
+    Finished jobs do not change anymore and may be cached for
+    JOBCACHE.http_max_age, others must be revalidated.
+
+    Args:
+    res (Response): the response
+    job (dict): the job or the version from getJobWithVersion
+    fields (str): the "fields" query arg
+
+    Returns:
+    res (Response): the response with headers
+    """
+    etag = '%s-%s' % (job['idpk_jobs'], job['version'])
+    if fields:
+        etag += '-' + hashlib.sha1(fields.encode('utf-8')).hexdigest()[:8]
+    res.set_etag(etag)
+
+    for key in ['time_modified', 'time_ended', 'time_started',
+                'time_created']:
+        if isinstance(job.get(key), datetime):
+            res.last_modified = job[key]
+            break
+
+    if job['status'] in TERMINAL_STATUS:
+        res.cache_control.public = True
+        res.cache_control.max_age = JOBCACHE.http_max_age
+    else:
+        res.cache_control.no_cache = True
+
+    return res
+
+
 class JobHtml(Resource):
     """ Definition for endpoint test
     @app.route('/processes/test/jobs')
@@ -87,16 +192,55 @@ class Job(Resource):
         This method is called by HTTP GET
         @app.route('/processes/test/jobs')
         This method is calling core method readJob
+
+        Jobs are streamed ordered by id. Use "limit" to page through the
+        list and pass the returned "next" cursor as "after" for the next
+        page. Use "fields" (comma separated) to only read these columns.
+        Finished jobs which were moved to the archive are only listed with
+        "archived=true".
+
+        Other args filter the jobs, e.g. "status__in=PENDING,RUNNING",
+        "time_created__gte=2019-01-01T00:00:00Z" or
+        "job_description.feature_uuid=..." (see buildJobFilter). Use
+        "order_by" with an indexed column, e.g. "-time_created", to change
+        the order.
         """
 
         args = request.args
         process = request.path.split('/')[2]
-        jobsArray = getJobs(args, process)
 
-        jobs = {}
-        jobs['jobs'] = jobsArray
-
-        return make_response(jsonify(jobs))
+        limit = args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError('limit must be positive')
+            except ValueError as e:
+                log.error(str(e))
+                res = jsonify(SimpleStatusCodeResponseModel(
+                    status=400,
+                    message='Bad Request: invalid limit'
+                ))
+                return make_response(res, 400)
+
+        archived = args.get('archived', 'false').lower() == 'true'
+
+        orderBy = args.get('order_by')
+
+        jobs = getJobs(args, process, limit, args.get('after'),
+                       args.get('fields'), archived, orderBy)
+
+        if jobs is None:
+            res = jsonify(SimpleStatusCodeResponseModel(
+                status=400,
+                message='Bad Request: invalid filter, fields, order or cursor'
+            ))
+            return make_response(res, 400)
+
+        return Response(
+            stream_with_context(streamJobs(jobs, limit, orderBy)),
+            mimetype='application/json'
+        )
 
     # @swagger.doc(processes.jobs_post_docs)
     def post(self):
@@ -114,8 +258,17 @@ class Job(Resource):
 
         process = request.path.split('/')[2]
 
-        job = createJob(request.get_json(force=True), process)
-        if job is not None:
+        try:
+            job = createJob(request.get_json(force=True), process)
+        except ServiceUnavailable as e:
+            return serviceUnavailable(e)
+        if job is not None and job['status'] == 'QUEUED':
+            # submitted to actinia-core later, see JOBQUEUE
+            res = make_response(jsonify(job), 202)
+            res.headers['Location'] = '%s/%s' % (
+                request.base_url, job[JOBTABLE.id_field])
+            return res
+        elif job is not None:
             return make_response(jsonify(job), 201)
         else:
             res = (jsonify(SimpleStatusCodeResponseModel(
@@ -125,6 +278,258 @@ class Job(Resource):
             return make_response(res, 404)
 
 
+class JobBatch(Resource):
+    """ Definition for endpoint loop
+    @app.route('/processes/loop/jobs:batch')
+
+    Contains HTTP POST endpoint creating many jobs at once
+    Contains swagger documentation
+    """
+
+    def get(self):
+        res = jsonify(SimpleStatusCodeResponseModel(
+            status=405,
+            message="Method Not Allowed"
+        ))
+        return make_response(res, 405)
+
+    # @swagger.doc(processes.jobBatch_post_docs)
+    def post(self):
+        """ Create new jobs from an array of jobs
+
+        This method is called by HTTP POST
+        @app.route('/processes/loop/jobs:batch')
+        This method is calling core method createJobs
+
+        All items are checked before any job is started. Returns for each
+        item its "index" and the created "job" or an error "message", with
+        status 201 if all jobs were created, 207 if some were created, 500
+        if none was created or 202 if all jobs were queued.
+        """
+        process = request.path.split('/')[2]
+        jsonList = request.get_json(force=True, silent=True)
+
+        errors = validateJobs(jsonList)
+        if errors:
+            res = jsonify(SimpleStatusCodeResponseModel(
+                status=400,
+                message='Bad Request: ' + '; '.join(
+                    ('item %s: ' % error['index']
+                     if error['index'] is not None else '')
+                    + error['message'] for error in errors)
+            ))
+            return make_response(res, 400)
+
+        log.info("\n Received HTTP POST with %s jobs" % len(jsonList))
+
+        try:
+            results = createJobs(jsonList, process)
+        except ServiceUnavailable as e:
+            return serviceUnavailable(e)
+
+        if all(result.get('job') and result['job']['status'] == 'QUEUED'
+               for result in results):
+            return make_response(jsonify({'jobs': results}), 202)
+        if all(result.get('job') for result in results):
+            return make_response(jsonify({'jobs': results}), 201)
+        if not any(result.get('job') for result in results):
+            return make_response(jsonify({'jobs': results}), 500)
+        return make_response(jsonify({'jobs': results}), 207)
+
+
+class JobStats(Resource):
+    """ Definition for endpoint test
+    @app.route('/processes/test/jobs/stats')
+
+    Contains HTTP GET endpoint reading the job statistics
+    Contains swagger documentation
+    """
+
+    # @swagger.doc(processes.jobStats_get_docs)
+    def get(self):
+        """ Wrapper method to receive HTTP call and pass it to function
+
+        This method is called by HTTP GET
+        @app.route('/processes/test/jobs/stats')
+        This method is calling core method getJobStatistics
+
+        Returns the number of jobs per status, percentiles of queue wait
+        and run duration and the finished jobs per hour of the last
+        "hours" (default 24).
+        """
+        process = request.path.split('/')[2]
+
+        try:
+            hours = int(request.args.get('hours', 24))
+            if hours < 1:
+                raise ValueError('hours must be positive')
+        except ValueError as e:
+            log.error(str(e))
+            res = jsonify(SimpleStatusCodeResponseModel(
+                status=400,
+                message='Bad Request: invalid hours'
+            ))
+            return make_response(res, 400)
+
+        stats = getJobStatistics(process, hours)
+
+        if stats is not None:
+            return make_response(jsonify(stats), 200)
+        else:
+            res = (jsonify(SimpleStatusCodeResponseModel(
+                status=500,
+                message='Error'
+            )))
+            return make_response(res, 500)
+
+    def post(self):
+        res = jsonify(SimpleStatusCodeResponseModel(
+            status=405,
+            message="Method Not Allowed"
+        ))
+        return make_response(res, 405)
+
+
+class JobExport(Resource):
+    """ Definition for endpoint test
+    @app.route('/processes/test/jobs/export')
+
+    Contains HTTP GET endpoint exporting all jobs
+    Contains swagger documentation
+    """
+
+    # @swagger.doc(processes.jobExport_get_docs)
+    def get(self):
+        """ Wrapper method to receive HTTP call and pass it to function
+
+        This method is called by HTTP GET
+        @app.route('/processes/test/jobs/export')
+        This method is calling core method exportJobHistory
+
+        Streams all jobs of the jobtable and the archive as "format"
+        ndjson (default), csv or parquet (if pyarrow is installed). Jobs
+        can be filtered like job listings. Stored parts of actinia-core
+        responses are exported with their payloads.
+        """
+        process = request.path.split('/')[2]
+
+        exportFormat = request.args.get('format', 'ndjson')
+        filters = {key: value for key, value in request.args.items()
+                   if key != 'format'}
+
+        data = None
+        if exportFormat in exportFormats():
+            data = exportJobHistory(filters, process, exportFormat)
+        if data is None:
+            res = jsonify(SimpleStatusCodeResponseModel(
+                status=400,
+                message='Bad Request: invalid filter or format, use one of '
+                        + ', '.join(exportFormats())
+            ))
+            return make_response(res, 400)
+
+        return Response(
+            stream_with_context(data),
+            mimetype=EXPORT_FORMATS[exportFormat],
+            headers={'Content-Disposition': 'attachment; filename="jobs-%s.%s"'
+                     % (process, exportFormat)}
+        )
+
+    def post(self):
+        res = jsonify(SimpleStatusCodeResponseModel(
+            status=405,
+            message="Method Not Allowed"
+        ))
+        return make_response(res, 405)
+
+
+class JobEvents(Resource):
+    """ Definition for endpoint test
+    @app.route('/processes/test/jobs/events')
+
+    Contains HTTP GET endpoint streaming changes of jobs
+    Contains swagger documentation
+    """
+
+    # @swagger.doc(processes.jobEvents_get_docs)
+    def get(self):
+        """ Wrapper method to receive HTTP call and pass it to function
+
+        This method is called by HTTP GET
+        @app.route('/processes/test/jobs/events')
+
+        Sends an event with id, status, process, actinia_core_jobid and
+        version of each created or changed job of the process. Events can
+        be filtered like job listings by id, status and actinia_core_jobid,
+        e.g. "idpk_jobs=1" for a single job.
+
+        With "Accept: text/event-stream" the events are streamed as
+        server-sent events. Otherwise the request waits up to "timeout"
+        seconds for events (long-poll) and returns them as {"events": [..]}.
+        Pass the known "version" of a single job to get its current state
+        right away if it already changed.
+
+        Each open stream or waiting request keeps a worker busy, so serve
+        this endpoint with actinia_gdi.asyncwsgi.
+        """
+        process = request.path.split('/')[2]
+
+        matches = buildEventFilter(request.args, process)
+        try:
+            timeout = min(int(request.args.get('timeout', JOBEVENTS.max_wait)),
+                          JOBEVENTS.max_wait)
+            version = request.args.get('version')
+            if version is not None:
+                version = int(version)
+        except ValueError as e:
+            log.error(str(e))
+            matches = None
+        if matches is None:
+            res = jsonify(SimpleStatusCodeResponseModel(
+                status=400,
+                message='Bad Request: invalid filter, timeout or version'
+            ))
+            return make_response(res, 400)
+
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            return Response(
+                stream_with_context(streamJobEvents(matches)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache',
+                         'X-Accel-Buffering': 'no'}
+            )
+
+        # subscribe before reading the job, so no change is missed
+        events = JobEventQueue(matches)
+        try:
+            received = []
+            jobid = request.args.get(JOBTABLE.id_field)
+            if jobid is not None and version is not None:
+                job = getJob(jobid, 'status,process,actinia_core_jobid,'
+                             + 'version')
+                if job is not None and job['version'] > version:
+                    received.append(jobEvent(job))
+            if not received:
+                event = events.get(max(timeout, 0))
+                if event is not None:
+                    received.append(event)
+            received += events.drain()
+        finally:
+            events.close()
+
+        return make_response(jsonify({
+            'events': received,
+            'reset': events.reset
+        }), 200)
+
+    def post(self):
+        res = jsonify(SimpleStatusCodeResponseModel(
+            status=405,
+            message="Method Not Allowed"
+        ))
+        return make_response(res, 405)
+
+
 class JobId(Resource):
     """ Definition for endpoint test
     @app.route('/processes/test/jobs/<jobid>')
@@ -140,16 +545,38 @@ class JobId(Resource):
         This method is called by HTTP GET
         @app.route('/processes/test/jobs/<jobid>')
         This method is calling core method readJob
+
+        Use "fields" (comma separated) to only read these columns.
+
+        Answers "304 Not Modified" for matching "If-None-Match" or
+        "If-Modified-Since" headers before the job is read.
         """
         if jobid is None:
             return make_response("Not found", 404)
 
         log.info("\n Received HTTP GET request for job with id " + str(jobid))
 
-        job = getJob(jobid)
+        fields = request.args.get('fields')
+        if not checkJobFields(fields):
+            res = jsonify(SimpleStatusCodeResponseModel(
+                status=400,
+                message='Bad Request: invalid fields'
+            ))
+            return make_response(res, 400)
+
+        version = getJobVersion(jobid)
+        if version is not None:
+            res = setJobCacheHeaders(make_response('', 200), version, fields)
+            res.make_conditional(request)
+            if res.status_code == 304:
+                return res
+            job, version = getJobWithVersion(jobid, fields)
+        else:
+            job = None
 
         if job is not None:
-            return make_response(jsonify(job), 200)
+            res = make_response(jsonify(job), 200)
+            return setJobCacheHeaders(res, version, fields)
         else:
             res = (jsonify(SimpleStatusCodeResponseModel(
                 status=404,
@@ -28,7 +28,9 @@ __license__ = "Apache-2.0"
 
 # from actinia_gdi.apidocs.processes import loop  # TODO
 from actinia_gdi.api.processes.processes import Job, JobHtml, JobId
-from actinia_gdi.api.processes.processes import JobIdCancel
+from actinia_gdi.api.processes.processes import JobEvents, JobStats
+from actinia_gdi.api.processes.processes import JobExport
+from actinia_gdi.api.processes.processes import JobIdCancel, JobBatch
 
 
 class JobHtmlS1Wrapper(JobHtml):
@@ -51,6 +53,46 @@ class JobS1Wrapper(Job):
         return super(JobS1Wrapper, self).post()
 
 
+class JobBatchS1Wrapper(JobBatch):
+    # no docs because 405
+    def get(self):
+        return super(JobBatchS1Wrapper, self).get()
+
+    # @swagger.doc(loop.jobBatch_post_docs)
+    def post(self):
+        return super(JobBatchS1Wrapper, self).post()
+
+
+class JobStatsS1Wrapper(JobStats):
+    # @swagger.doc(loop.jobStats_get_docs)
+    def get(self):
+        return super(JobStatsS1Wrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobStatsS1Wrapper, self).post()
+
+
+class JobExportS1Wrapper(JobExport):
+    # @swagger.doc(loop.jobExport_get_docs)
+    def get(self):
+        return super(JobExportS1Wrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobExportS1Wrapper, self).post()
+
+
+class JobEventsS1Wrapper(JobEvents):
+    # @swagger.doc(loop.jobEvents_get_docs)
+    def get(self):
+        return super(JobEventsS1Wrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobEventsS1Wrapper, self).post()
+
+
 class JobIdS1Wrapper(JobId):
     # @swagger.doc(loop.jobId_get_docs)
     def get(self, jobid):
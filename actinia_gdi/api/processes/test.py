@@ -33,6 +33,8 @@ from flask_restful import Resource
 # from actinia_gdi.apidocs.processes import test
 from actinia_gdi.api.common import checkConnection
 from actinia_gdi.api.processes.processes import Job, JobHtml, JobId
+from actinia_gdi.api.processes.processes import JobEvents, JobStats
+from actinia_gdi.api.processes.processes import JobExport
 from actinia_gdi.core.actiniaCore import postActiniaCore
 from actinia_gdi.core.actiniaCore import shortenActiniaCoreResp
 from actinia_gdi.model.responseModels import SimpleStatusCodeResponseModel
@@ -99,6 +101,36 @@ class JobTestWrapper(Job):
             return make_response(res, 500)
 
 
+class JobStatsTestWrapper(JobStats):
+    # @swagger.doc(test.jobStats_get_docs)
+    def get(self):
+        return super(JobStatsTestWrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobStatsTestWrapper, self).post()
+
+
+class JobExportTestWrapper(JobExport):
+    # @swagger.doc(test.jobExport_get_docs)
+    def get(self):
+        return super(JobExportTestWrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobExportTestWrapper, self).post()
+
+
+class JobEventsTestWrapper(JobEvents):
+    # @swagger.doc(test.jobEvents_get_docs)
+    def get(self):
+        return super(JobEventsTestWrapper, self).get()
+
+    # no docs because 405
+    def post(self):
+        return super(JobEventsTestWrapper, self).post()
+
+
 class JobIdTestWrapper(JobId):
     # @swagger.doc(test.jobId_get_docs)
     def get(self, jobid):
@@ -31,7 +31,9 @@ from flask_restful import Resource
 
 # from actinia_gdi.apidocs.processes import processes
 from actinia_gdi.model.responseModels import SimpleStatusCodeResponseModel
-from actinia_gdi.core.processes import updateJob
+from actinia_gdi.core.processes import updateJob, updateJobLater, getMetrics
+from actinia_gdi.core.reconciler import reconciler
+from actinia_gdi.resources.config import RECONCILER
 from actinia_gdi.resources.logging import log
 
 
@@ -74,6 +76,13 @@ class Update(Resource):
 
         log.info("\n Received webhook call for " + resourceID)
 
+        if updateJobLater(resourceID, actiniaCoreResp):
+            res = jsonify(SimpleStatusCodeResponseModel(
+                status=202,
+                message='Accepted'
+            ))
+            return make_response(res, 202)
+
         job = updateJob(resourceID, actiniaCoreResp)
 
         if job is not None:
@@ -84,3 +93,31 @@ class Update(Resource):
                 message='Error'
             )))
             return make_response(res, 404)
+
+
+class Metrics(Resource):
+    """ Definition for endpoint metrics
+    @app.route('/metrics')
+
+    Contains HTTP GET endpoint reading the metrics of a worker
+    """
+
+    def get(self):
+        """ Read metrics of the worker answering the request, e.g. use and
+        waits of the jobtable connection pool and hits of the job cache
+
+        This method is called by HTTP GET
+        @app.route('/metrics')
+        This method is calling core method getMetrics
+        """
+        metrics = getMetrics()
+        if RECONCILER.enabled is True:
+            metrics['reconciler'] = reconciler.stats()
+        return make_response(jsonify(metrics), 200)
+
+    def post(self):
+        res = jsonify(SimpleStatusCodeResponseModel(
+            status=405,
+            message="Method Not Allowed"
+        ))
+        return make_response(res, 405)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Application entrypoint for asynchronous serving with gevent
+
+The standard library and psycopg2 are patched before the app is loaded, so
+waiting for actinia-core (requests) or the jobtable (psycopg2) yields to
+other requests instead of blocking a thread. Install with the "async" extra
+and run e.g.
+gunicorn -k gevent --worker-connections 1000 actinia_gdi.asyncwsgi
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+from actinia_gdi.main import app as application
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+HTTP client for actinia-core with pooled connections and timeouts
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from actinia_gdi.resources.config import ACTINIACORE, CIRCUITBREAKER
+from actinia_gdi.core.common import auth
+from actinia_gdi.core.jobStats import bucketPercentiles, durationBucket
+from actinia_gdi.core.loadShedding import CircuitBreaker
+
+
+# methods which can be sent again if actinia-core did not answer
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'DELETE'])
+
+
+class ActiniaCoreClient:
+    """Sends requests to actinia-core over one requests.Session per worker
+
+    Connections are kept alive and reused, up to pool_size at a time. Each
+    request has a connect and a read timeout. Idempotent requests are
+    retried with exponential backoff if the connection failed or
+    actinia-core answered 502, 503 or 504. Other requests are only retried
+    if they could not be sent at all. The latency of each call is counted
+    by method and first path segment.
+
+    All calls pass the circuit breaker of their backend, which raises
+    CircuitOpenError instead of sending while the backend is failing.
+    Health probes bypass it, so they neither count as trial calls of a
+    half-open circuit nor close it.
+    """
+
+    def __init__(self, config, breakerConfig):
+        self.config = config
+        self.breakerConfig = breakerConfig
+        self._breakers = dict()
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._calls = dict()
+
+    def session(self):
+        """ Return the session of this process, created on first use
+        """
+        if self._pid == os.getpid():
+            return self._session
+        with self._lock:
+            if self._pid != os.getpid():
+                retry = Retry(
+                    total=self.config.retries,
+                    read=self.config.retries,
+                    connect=self.config.retries,
+                    status=self.config.retries,
+                    backoff_factor=self.config.retry_backoff,
+                    status_forcelist=[502, 503, 504],
+                    allowed_methods=IDEMPOTENT_METHODS,
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=len(self.backends()),
+                                      pool_maxsize=self.config.pool_size,
+                                      max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.auth = auth(self.config)
+                self._session = session
+                self._pid = os.getpid()
+        return self._session
+
+    def backends(self):
+        """ Return the urls of all actinia-core backends
+        """
+        return list(self.config.backends) or [self.config.url]
+
+    def backend(self, url=None):
+        """ Return the backend url is sent to, ACTINIACORE.url if it is
+        none of the backends
+        """
+        for backend in self.backends():
+            if url is not None and url.startswith(backend):
+                return backend
+        return self.config.url
+
+    def breaker(self, url=None):
+        """ Return the circuit breaker of the backend of url
+        """
+        backend = self.backend(url)
+        with self._lock:
+            if backend not in self._breakers:
+                self._breakers[backend] = CircuitBreaker(self.breakerConfig)
+            return self._breakers[backend]
+
+    def _callName(self, method, url):
+        backend = self.backend(url)
+        path = url[len(backend):] if url.startswith(backend) else url
+        return method + ' ' + path.strip('/').split('/')[0]
+
+    def _count(self, name, seconds, failed):
+        with self._lock:
+            call = self._calls.setdefault(
+                name, {'calls': 0, 'errors': 0, 'buckets': dict()})
+            call['calls'] += 1
+            if failed:
+                call['errors'] += 1
+            bucket = durationBucket(seconds * 1000)
+            call['buckets'][bucket] = call['buckets'].get(bucket, 0) + 1
+
+    def request(self, method, url, useBreaker=True, **kwargs):
+        """ Send a request to actinia-core
+
+        Args:
+        method (str): HTTP method
+        url (str): full url
+        useBreaker (bool): False to bypass the circuit breaker
+        kwargs: further args of requests.Session.request
+
+        Returns:
+        response (requests.Response): the response, raises
+        requests.exceptions.RequestException if there is none
+        """
+        kwargs.setdefault('timeout', (self.config.connect_timeout,
+                                      self.config.read_timeout))
+        name = self._callName(method, url)
+        breaker = self.breaker(url) if useBreaker else None
+        if breaker is not None:
+            breaker.check()
+        start = time.monotonic()
+        failed = True
+        try:
+            response = self.session().request(method, url, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            seconds = time.monotonic() - start
+            self._count(name, seconds, failed)
+            if breaker is not None:
+                breaker.record(seconds, failed)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def probe(self, url, **kwargs):
+        """ Send a GET request of a health probe past the circuit breaker
+        """
+        return self.request('GET', url, useBreaker=False, **kwargs)
+
+    def stats(self):
+        """ Return the number of calls, failed calls and the latency
+        percentiles in milliseconds by call
+        """
+        with self._lock:
+            calls = {name: dict(call, buckets=dict(call['buckets']))
+                     for name, call in self._calls.items()}
+        stats = dict()
+        for name, call in calls.items():
+            latency = bucketPercentiles(call['buckets'])
+            del latency['count']
+            stats[name] = {'calls': call['calls'], 'errors': call['errors'],
+                           'latency_ms': latency}
+        return stats
+
+    def breakerStats(self):
+        """ Return the state and counters of the circuit breaker by backend
+        """
+        return {backend: self.breaker(backend).stats()
+                for backend in self.backends()}
+
+
+actiniaCoreClient = ActiniaCoreClient(ACTINIACORE, CIRCUITBREAKER)
@@ -31,7 +31,9 @@ from flask import make_response
 
 from actinia_gdi.resources.config import ACTINIACORE
 from actinia_gdi.resources.logging import log
-from actinia_gdi.core.common import auth
+from actinia_gdi.core.actiniaClient import actiniaCoreClient
+from actinia_gdi.core.loadShedding import CircuitOpenError
+from actinia_gdi.core.loadShedding import ServiceUnavailable
 from actinia_gdi.core.pcBuilder import buildPCDummy
 from actinia_gdi.core.pcBuilder import buildPCS1Grd
 
@@ -78,18 +80,23 @@ def shortenActiniaCoreResp(fullResp):
     return json.loads('{"status": "' + url + '"}')
 
 
-def postActiniaCore(process, preProcessChain):
+def postActiniaCore(process, preProcessChain, actiniaCoreUrl=None):
     """ Method to start new job in actinia-core
 
     Args:
     process: (str): the process which is triggered
     preProcessChain: (dict): the enriched preProcessChain object
+    actiniaCoreUrl: (str): the actinia-core backend, ACTINIACORE.url if
+    not set
+
+    Raises ServiceUnavailable if the circuit of the backend is open.
 
     Returns:
     TODO: (dict): status url of actinia-core job
     """
 
-    url = ACTINIACORE.url + PROCESSING_ENDPOINT
+    actiniaCoreUrl = actiniaCoreUrl or ACTINIACORE.url
+    url = actiniaCoreUrl + PROCESSING_ENDPOINT
     headers = {'content-type': 'application/json; charset=utf-8'}
 
     if process == 'test':
@@ -104,26 +111,30 @@ def postActiniaCore(process, preProcessChain):
         # actinia-core. This leads to correct status "ERROR" at the moment.
         # Make smarter (not call actinia-core, return correct error msg)
         log.info('Posting to ' + url)
-        actiniaResp = requests.post(
-            url,
-            data=postbody,
-            headers=headers,
-            auth=auth(ACTINIACORE)
-        )
+        try:
+            actiniaResp = actiniaCoreClient.post(
+                url,
+                data=postbody,
+                headers=headers
+            )
+        except CircuitOpenError as e:
+            # nothing was sent, the client may try again later
+            raise ServiceUnavailable(str(e), e.retry_after)
 
         # TODO: remove GET request here. It is a workaround for a bug in
         # actinia-core which does not start a job if no request follows
         actiniaCoreId = json.loads(actiniaResp.text)['resource_id']
-        url = ACTINIACORE.url + "resources/actinia-gdi/" + actiniaCoreId
-        actiniaResp2 = requests.get(url, auth=auth(ACTINIACORE))
+        url = actiniaCoreUrl + "resources/actinia-gdi/" + actiniaCoreId
+        actiniaResp2 = actiniaCoreClient.get(url)
 
-    except requests.exceptions.ConnectionError:
+    except requests.exceptions.RequestException as e:
+        log.error('Could not post to actinia-core: ' + str(e))
         return None
 
     return json.loads(actiniaResp2.text)
 
 
-def cancelActiniaCore(resourceId):
+def cancelActiniaCore(resourceId, actiniaCoreUrl=None):
     """ Wrapper method to cancel a job by using the jobId
 
     This method is called by HTTP POST
@@ -132,6 +143,8 @@ def cancelActiniaCore(resourceId):
 
     Args:
     resourceId: (string): actinia-core job id
+    actiniaCoreUrl: (str): the actinia-core backend of the job,
+    ACTINIACORE.url if not set
 
     """
     if resourceId is None:
@@ -141,13 +154,14 @@ def cancelActiniaCore(resourceId):
           + resourceId)
 
     DELETING_ENDPOINT = 'resources/'
-    url = (ACTINIACORE.url + DELETING_ENDPOINT + ACTINIACORE.user + '/'
-           + resourceId)
+    url = ((actiniaCoreUrl or ACTINIACORE.url) + DELETING_ENDPOINT
+           + ACTINIACORE.user + '/' + resourceId)
     log.info('Requesting from ' + url)
 
     try:
-        actiniaResp = requests.delete(url, auth=auth(ACTINIACORE))
-    except requests.exceptions.ConnectionError:
+        actiniaResp = actiniaCoreClient.delete(url)
+    except requests.exceptions.RequestException as e:
+        log.error('Could not cancel in actinia-core: ' + str(e))
         return None
     try:
         status = parseActiniaAsyncStatusResponse(
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+
+Routing of new jobs to one of several actinia-core backends
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import hashlib
+import math
+import threading
+
+from actinia_gdi.core.actiniaClient import actiniaCoreClient
+from actinia_gdi.core.jobStore import jobStore
+from actinia_gdi.core.loadShedding import ServiceUnavailable
+from actinia_gdi.resources.config import ACTINIACORE
+from actinia_gdi.resources.logging import log
+
+
+ROUTING_POLICIES = ['least_jobs', 'round_robin', 'affinity']
+
+
+def affinityScore(backend, key, weight):
+    """ Method to score a backend for a key by weighted rendezvous hashing,
+    the backend with the highest score gets the key
+
+    Each key keeps its backend as long as the backend is available, if it
+    is not only the keys of this backend move to others.
+    """
+    digest = hashlib.sha256(
+        (backend + '\n' + key).encode('utf-8')).digest()
+    # uniform in (0, 1)
+    value = (int.from_bytes(digest[:8], 'big') + 1) / (2 ** 64 + 2)
+    return -weight / math.log(value)
+
+
+class BackendRouter:
+    """Chooses the actinia-core backend of each new job
+
+    least_jobs: the backend with the fewest PENDING or RUNNING jobs in the
+    jobtable in relation to its weight.
+
+    round_robin: the backends in turn, each as often as its weight
+    (smooth weighted round robin).
+
+    affinity: jobs with the same value of affinity_key, e.g. on the same
+    input data, go to the same backend. Jobs without it use least_jobs.
+
+    Backends whose circuit breaker is open or whose weight is 0 are
+    skipped.
+    """
+
+    def __init__(self, client, weights, policy, affinityKey, load):
+        self.client = client
+        self.backends = client.backends()
+        self.weights = {backend: weights[index] if index < len(weights)
+                        else 1 for index, backend in enumerate(self.backends)}
+        if policy not in ROUTING_POLICIES:
+            log.error('Unknown routing "%s", using least_jobs' % policy)
+            policy = 'least_jobs'
+        self.policy = policy
+        self.affinityKey = affinityKey
+        self.load = load
+        self._lock = threading.Lock()
+        self._current = {backend: 0 for backend in self.backends}
+        self.counters = {backend: 0 for backend in self.backends}
+
+    def retryAfter(self):
+        """ Return the seconds until a backend accepts calls, 0 if one does
+        now
+        """
+        return min(self.client.breaker(backend).retryAfter()
+                   for backend in self.backends)
+
+    def available(self):
+        """ Return the backends with weight whose circuit is closed
+
+        Raises ServiceUnavailable if there are none.
+        """
+        waits = {backend: self.client.breaker(backend).retryAfter()
+                 for backend in self.backends}
+        available = [backend for backend in self.backends
+                     if not waits[backend] and self.weights[backend] > 0]
+        if not available:
+            raise ServiceUnavailable('actinia-core is failing',
+                                     min(waits.values()))
+        return available
+
+    def _readLoad(self, available):
+        load = {backend: 0 for backend in available}
+        try:
+            counts = self.load()
+        except Exception as e:
+            log.error('Could not read the load of actinia-core backends')
+            log.error(str(e))
+            return load
+        for url, count in counts.items():
+            # jobs created before backends were recorded
+            backend = self.client.backend(url)
+            if backend in load:
+                load[backend] += count
+        return load
+
+    def _roundRobin(self, available):
+        with self._lock:
+            for backend in available:
+                self._current[backend] += self.weights[backend]
+            backend = max(available, key=lambda b: self._current[b])
+            self._current[backend] -= sum(self.weights[b] for b in available)
+        return backend
+
+    def _affinity(self, available, key):
+        return max(available, key=lambda backend: affinityScore(
+            backend, str(key), self.weights[backend]))
+
+    def chooseMany(self, jsonList):
+        """ Choose the backend of each job of a batch
+
+        The load is read once and counted up for each chosen backend, so a
+        batch is spread over the backends.
+
+        Args:
+        jsonList (list): the prePCs of the jobs
+
+        Returns:
+        backends (list): the url of the backend of each job
+        """
+        available = self.available()
+        load = None
+        backends = []
+        for jsonDict in jsonList:
+            key = None
+            if self.policy == 'affinity' and isinstance(jsonDict, dict):
+                key = jsonDict.get(self.affinityKey)
+            if len(available) == 1:
+                backend = available[0]
+            elif self.policy == 'round_robin':
+                backend = self._roundRobin(available)
+            elif key is not None:
+                backend = self._affinity(available, key)
+            else:
+                if load is None:
+                    load = self._readLoad(available)
+                backend = min(available, key=lambda b: (
+                    load[b] / self.weights[b], self.backends.index(b)))
+                load[backend] += 1
+            backends.append(backend)
+        with self._lock:
+            for backend in backends:
+                self.counters[backend] += 1
+        return backends
+
+    def choose(self, jsonDict):
+        """ Choose the backend of a job, see chooseMany
+        """
+        return self.chooseMany([jsonDict])[0]
+
+    def stats(self):
+        with self._lock:
+            routed = dict(self.counters)
+        return {
+            'routing': self.policy,
+            'backends': {backend: {
+                'weight': self.weights[backend],
+                'routed': routed[backend],
+                'retry_after': self.client.breaker(backend).retryAfter()
+            } for backend in self.backends}
+        }
+
+
+backendRouter = BackendRouter(actiniaCoreClient, ACTINIACORE.weights,
+                              ACTINIACORE.routing, ACTINIACORE.affinity_key,
+                              jobStore.getBackendLoad)
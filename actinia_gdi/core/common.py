@@ -43,7 +43,7 @@ def auth(CONFIG):
     return auth
 
 
-def checkConnection(url, name, expectedFormat):
+def checkConnection(url, name, expectedFormat, client=requests):
     """ Method to test connection
 
     Args:
@@ -51,6 +51,8 @@ def checkConnection(url, name, expectedFormat):
       name (string): name of resource to test. Only used for logging
       expectedFormat (string): Format in which resource will respond. Can be
         'xml' or 'json'
+      client: requests or a client with the same get method, e.g.
+        actinia_gdi.core.actiniaClient.actiniaCoreClient
     """
 
     # can be called by e.g.
@@ -59,8 +61,8 @@ def checkConnection(url, name, expectedFormat):
     log.debug('Testing connection to ' + url)
 
     try:
-        resp = requests.get(url)
-    except requests.exceptions.ConnectionError:
+        resp = client.get(url)
+    except requests.exceptions.RequestException:
         log.error('Connection Error to ' + name)
         return None
 
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Background health checks of actinia-core and the job store
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import copy
+import os
+import threading
+import time
+from datetime import datetime
+
+from actinia_gdi.core import common
+from actinia_gdi.core.actiniaClient import actiniaCoreClient
+from actinia_gdi.core.jobStore import jobStore
+from actinia_gdi.resources.config import ACTINIACORE
+from actinia_gdi.resources.logging import log
+
+
+class ProbeClient:
+    """Sends the GET requests of checkConnection past the circuit breaker
+    """
+
+    def get(self, url, **kwargs):
+        return actiniaCoreClient.probe(url, **kwargs)
+
+
+def probeActiniaCore():
+    """ Method to check if the actinia-core backends answer their version,
+    raises an error if none does
+
+    The circuit breakers are bypassed, so probes do not close a circuit
+    without a real request succeeding.
+    """
+    failed = [backend for backend in actiniaCoreClient.backends()
+              if common.checkConnection(backend + 'version', 'actinia-core',
+                                        'json', ProbeClient()) is None]
+    if len(failed) == len(actiniaCoreClient.backends()):
+        raise ConnectionError('actinia-core not reachable')
+    if failed:
+        log.warning('actinia-core not reachable at ' + ', '.join(failed))
+
+
+class HealthProbe:
+    """Checks actinia-core and the job store every interval seconds
+
+    Requests read the last result instead of checking themselves. If no
+    result is available or it is older than three intervals, e.g. as the
+    thread was not started yet, the check is done right away.
+
+    The thread is started on first use, so each gunicorn worker gets its
+    own after forking.
+    """
+
+    def __init__(self, interval, probes):
+        self.interval = interval
+        self.probes = probes
+        self._state = None
+        self._checked = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """ Start checking if not yet done in this process
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='HealthProbe',
+                                  daemon=True)
+        thread.start()
+
+    def check(self):
+        """ Run all probes now and keep the result
+
+        Returns:
+        state (dict): by probe name if it is "healthy", the "latency_ms" and
+        time ("checked") of the check and the "error" if it failed
+        """
+        state = dict()
+        for name, probe in self.probes.items():
+            start = time.monotonic()
+            error = None
+            try:
+                probe()
+            except Exception as e:
+                error = str(e)
+            state[name] = {
+                'healthy': error is None,
+                'latency_ms': round((time.monotonic() - start) * 1000, 1),
+                'checked': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'error': error
+            }
+        with self._lock:
+            self._state = state
+            self._checked = time.monotonic()
+        return copy.deepcopy(state)
+
+    def state(self):
+        """ Return the last result of check
+        """
+        self.start()
+        with self._lock:
+            state = self._state
+            fresh = self._checked is not None \
+                and time.monotonic() - self._checked < 3 * self.interval
+        if state is None or not fresh:
+            return self.check()
+        return copy.deepcopy(state)
+
+    def isHealthy(self, name):
+        """ Return True if the last check of the probe succeeded
+        """
+        return self.state()[name]['healthy']
+
+    def _run(self):
+        while True:
+            try:
+                state = self.check()
+                for name in state:
+                    if not state[name]['healthy']:
+                        log.warning('Health check of %s failed: %s'
+                                    % (name, state[name]['error']))
+            except Exception as e:
+                log.error('Health check failed: ' + str(e))
+            time.sleep(self.interval)
+
+
+healthProbe = HealthProbe(ACTINIACORE.health_interval, {
+    'actinia_core': probeActiniaCore,
+    'jobstore': jobStore.ping
+})
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Cache for jobs read by id
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class JobCache:
+    """Bounded LRU cache of job records with a time to live.
+
+    Records in one of the terminal status never change again and stay
+    cached until they are evicted. Changed jobs are removed by invalidate.
+    """
+
+    def __init__(self, size, ttl, terminalStatus):
+        self.size = size
+        self.ttl = ttl
+        self.terminalStatus = terminalStatus
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+        # number of the last invalidation of each job, see token and put
+        self._generations = OrderedDict()
+        self._invalidations = 0
+        # highest number dropped from _generations
+        self._floor = 0
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    def get(self, jobid):
+        """ Return a copy of the cached record or None
+        """
+        if self.size <= 0:
+            return None
+        key = str(jobid)
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is not None:
+                expires, record = entry
+                if expires is None or expires > time.monotonic():
+                    self._records.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return dict(record)
+                del self._records[key]
+                self.counters['expirations'] += 1
+            self.counters['misses'] += 1
+        return None
+
+    def token(self, jobid):
+        """ Return a token to take before reading a record which is put
+        into the cache afterwards
+        """
+        with self._lock:
+            return self._generations.get(str(jobid), self._floor)
+
+    def put(self, jobid, record, token):
+        """ Cache a record read from the jobtable
+
+        A record which might still change is only cached if the job was
+        not invalidated since the token was taken, as it could have been
+        read before the change was committed.
+        """
+        if self.size <= 0 or record is None:
+            return
+        terminal = record.get('status') in self.terminalStatus
+        key = str(jobid)
+        with self._lock:
+            if not terminal and token != self._generations.get(
+                    key, self._floor):
+                return
+            expires = None if terminal else time.monotonic() + self.ttl
+            self._records[key] = (expires, dict(record))
+            self._records.move_to_end(key)
+            while len(self._records) > self.size:
+                self._records.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def invalidate(self, jobid):
+        """ Remove a changed job
+        """
+        key = str(jobid)
+        with self._lock:
+            self._invalidations += 1
+            self._generations[key] = self._invalidations
+            self._generations.move_to_end(key)
+            # a dropped job gets the floor, so puts of records read before
+            # its last invalidation still fail
+            while len(self._generations) > max(self.size, 1):
+                _, self._floor = self._generations.popitem(last=False)
+            if self._records.pop(key, None) is not None:
+                self.counters['invalidations'] += 1
+
+    def stats(self):
+        """ Return the counters and the number of cached jobs
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self._records)
+        return stats
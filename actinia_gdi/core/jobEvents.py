@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Module to share job changes between workers with postgres LISTEN/NOTIFY
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+
+from actinia_gdi.model.jobtabelle import jobdb
+from actinia_gdi.resources.config import JOBTABLE, JOBEVENTS
+from actinia_gdi.resources.logging import log
+
+
+# keys of a job record sent with each notification
+EVENT_KEYS = ['status', 'process', 'actinia_core_jobid', 'version']
+
+# query args of the event stream which are no filters
+EVENT_ARGS = ['timeout', 'version']
+
+
+def jobEvent(record):
+    """ Method to create the event sent for a changed job
+
+    Args:
+    record (dict): the changed job
+
+    Returns:
+    event (dict): id and EVENT_KEYS of the job
+    """
+    event = {JOBTABLE.id_field: record[JOBTABLE.id_field]}
+    for key in EVENT_KEYS:
+        event[key] = record.get(key)
+    return event
+
+
+def notifyJobChanges(records):
+    """ Method to notify all workers about changed jobs
+
+    Must be called inside the transaction which changed the jobs, postgres
+    delivers the notifications when it is committed. All jobs are notified
+    with one statement, one notification per job.
+
+    Args:
+    records (list): the changed jobs
+    """
+    if not records:
+        return
+    jobdb.execute_sql(
+        'SELECT pg_notify(%s, event) FROM unnest(%s::text[]) AS event', (
+            JOBTABLE.notify_channel,
+            [json.dumps(jobEvent(record)) for record in records]))
+
+
+class JobEventListener:
+    """Listens for job changes on a dedicated postgres connection and calls
+    the subscribed callbacks with each event.
+
+    The listener thread is started on first use, so each gunicorn worker
+    gets its own after forking. It reconnects if the connection is lost.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def subscribe(self, callback):
+        """ Call callback(event) for each changed job
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def start(self):
+        """ Start listening if not yet done in this process
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='JobEventListener',
+                                  daemon=True)
+        thread.start()
+
+    def dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                log.error('Job event subscriber failed: ' + str(e))
+
+    def _listen(self):
+        conn = psycopg2.connect(
+            host=JOBTABLE.host,
+            port=JOBTABLE.port,
+            dbname=JOBTABLE.database,
+            user=JOBTABLE.user,
+            password=JOBTABLE.pw
+        )
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('LISTEN "%s"' % self.channel)
+            log.debug('Listening for job changes on ' + self.channel)
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self.dispatch(json.loads(notify.payload))
+        finally:
+            conn.close()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                log.error('Listening for job changes failed: ' + str(e))
+            time.sleep(5)
+
+
+def buildEventFilter(filters, process):
+    """ Method to build the check which events a client receives
+
+    Events can be filtered by the id field, status and actinia_core_jobid,
+    each as "<key>=<value>" or "<key>__in=<value>,<value>".
+
+    Args:
+    filters (ImmutableMultiDict): the args from the HTTP call
+    process (str): the process to receive events for ('test' for all)
+
+    Returns:
+    matches (function): True for events to send or None if a filter is
+    invalid
+    """
+    checks = []
+    if process != 'test':
+        checks.append(('process', [process]))
+
+    for key in filters:
+        if key in EVENT_ARGS:
+            continue
+        name, _, operator = key.partition('__')
+        if name not in [JOBTABLE.id_field, 'status', 'actinia_core_jobid'] \
+                or operator not in ['', 'in']:
+            log.error('Unknown event filter "%s"' % key)
+            return None
+        values = filters[key].split(',') if operator else [filters[key]]
+        checks.append((name, values))
+
+    def matches(event):
+        return all(str(event.get(name)) in values for name, values in checks)
+
+    return matches
+
+
+class JobEventQueue:
+    """Queue of the events for one client of the event stream
+
+    Subscribes to jobEventListener until closed. If the client does not
+    read fast enough, events are dropped and "reset" is set, so the client
+    can read the jobs again.
+    """
+
+    def __init__(self, matches, size=JOBEVENTS.queue_size):
+        self.matches = matches
+        self.reset = False
+        self._queue = queue.Queue(size)
+        jobEventListener.subscribe(self._put)
+        jobEventListener.start()
+
+    def _put(self, event):
+        if not self.matches(event):
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.reset = True
+
+    def get(self, timeout):
+        """ Return the next event or None after timeout seconds
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """ Return all queued events without waiting
+        """
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        jobEventListener.unsubscribe(self._put)
+
+
+jobEventListener = JobEventListener(JOBTABLE.notify_channel)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Module to export jobs as NDJSON, CSV or Parquet
+
+Jobs are written in chunks of JOBTABLE.export_chunk while they are read, so
+the memory used does not depend on the number of exported jobs.
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import csv
+import io
+import itertools
+import json
+from datetime import datetime
+
+from peewee import DateTimeField, IntegerField
+
+from actinia_gdi.model.jobtabelle import Job
+from actinia_gdi.resources.config import JOBTABLE
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# media type of each export format
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def exportFormats():
+    """ Method to list the export formats which can be written
+
+    Parquet needs the pyarrow package.
+
+    Returns:
+    formats (list): names of EXPORT_FORMATS
+    """
+    return [name for name in EXPORT_FORMATS
+            if name != 'parquet' or pyarrow is not None]
+
+
+def exportColumns():
+    """ Method to list the exported columns in the order of the jobtable
+    """
+    return [field.name for field in Job._meta.sorted_fields]
+
+
+def exportValue(value):
+    """ Method to write a value as text, JSON columns as JSON
+
+    Args:
+    value: value of a job column
+
+    Returns:
+    text (str): the value as text, None stays None
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def iterChunks(records, size):
+    """ Generator to group records in lists of size records
+    """
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def writeNdjson(chunks, columns):
+    for chunk in chunks:
+        yield ''.join(json.dumps({
+            column: record.get(column) for column in columns
+        }, default=exportValue) + '\n' for record in chunk).encode('utf-8')
+
+
+def writeCsv(chunks, columns):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for chunk in chunks:
+        for record in chunk:
+            writer.writerow([exportValue(record.get(column))
+                             for column in columns])
+        yield out.getvalue().encode('utf-8')
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode('utf-8')
+
+
+class ParquetSink:
+    """File object collecting what pyarrow writes until it is taken
+
+    The position is counted over all writes, as the parquet footer refers
+    to the offsets of the row groups in the whole file.
+    """
+
+    def __init__(self):
+        self.closed = False
+        self._buffer = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._buffer.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._buffer)
+        self._buffer = []
+        return data
+
+
+def parquetSchema(columns):
+    """ Method to create the parquet schema of the exported columns
+
+    Ids and versions are integers, times are timestamps and all other
+    columns are text, JSON columns as JSON.
+    """
+    fields = []
+    for column in columns:
+        field = Job._meta.fields[column]
+        if isinstance(field, IntegerField):
+            fields.append((column, pyarrow.int64()))
+        elif isinstance(field, DateTimeField):
+            fields.append((column, pyarrow.timestamp('us')))
+        else:
+            fields.append((column, pyarrow.string()))
+    return pyarrow.schema(fields)
+
+
+def writeParquet(chunks, columns):
+    schema = parquetSchema(columns)
+    sink = ParquetSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    try:
+        for chunk in chunks:
+            data = dict()
+            for column in columns:
+                values = [record.get(column) for record in chunk]
+                if pyarrow.types.is_string(schema.field(column).type):
+                    values = [exportValue(value) for value in values]
+                data[column] = values
+            # each chunk is written as one row group
+            writer.write_table(pyarrow.Table.from_pydict(data, schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def exportJobs(records, exportFormat, chunkSize=None):
+    """ Method to write jobs in an export format
+
+    Args:
+    records (iterable): the jobs
+    exportFormat (str): one of exportFormats()
+    chunkSize (int): number of jobs written at a time, defaults to
+    JOBTABLE.export_chunk
+
+    Returns:
+    data (generator): the export as bytes, one part per chunk
+    """
+    chunks = iterChunks(records, chunkSize or JOBTABLE.export_chunk)
+    columns = exportColumns()
+    if exportFormat == 'csv':
+        return writeCsv(chunks, columns)
+    if exportFormat == 'parquet':
+        return writeParquet(chunks, columns)
+    return writeNdjson(chunks, columns)
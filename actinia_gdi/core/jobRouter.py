@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Routing of read-only jobtable queries to the read replica
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import threading
+import time
+
+from actinia_gdi.model.jobtabelle import jobdb, jobreplica
+from actinia_gdi.resources.config import JOBTABLE, JOBTABLE_REPLICA
+from actinia_gdi.core.jobEvents import jobEventListener
+
+
+class JobRouter:
+    """Chooses the database for read-only queries.
+
+    Reads go to the replica if one is configured. A job which was changed
+    in the last recent_seconds, by this or (notified) by another worker, is
+    read from the primary instead, so it is never older than the last
+    change seen. Listings can lag behind by the replication delay.
+    """
+
+    def __init__(self, primary, replica, recentSeconds):
+        self.primary = primary
+        self.replica = replica
+        self.recentSeconds = recentSeconds
+        self._changed = dict()
+        self._lock = threading.Lock()
+
+    def changed(self, jobid):
+        """ Read the job from the primary for the next recentSeconds
+        """
+        if self.replica is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._changed[str(jobid)] = now + self.recentSeconds
+            if len(self._changed) > 10000:
+                self._changed = {key: until for key, until in
+                                 self._changed.items() if until > now}
+
+    def read(self, jobid=None):
+        """ Return the database to read a job or (without jobid) a listing
+        """
+        if self.replica is None:
+            return self.primary
+        if jobid is not None:
+            with self._lock:
+                until = self._changed.get(str(jobid))
+            if until is not None and until > time.monotonic():
+                return self.primary
+            # changes of other workers are only known while listening
+            jobEventListener.start()
+        return self.replica
+
+
+jobRouter = JobRouter(jobdb, jobreplica, JOBTABLE_REPLICA.recent_seconds)
+jobEventListener.subscribe(
+    lambda event: jobRouter.changed(event[JOBTABLE.id_field]))
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Job statistics maintained incrementally by a trigger on the jobtable
+
+Each status transition updates a few counters, so reading the statistics
+does not depend on the number of jobs. Jobs moved to the archive are still
+counted.
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import math
+from datetime import datetime, timedelta
+
+from peewee import fn
+
+from actinia_gdi.model.jobtabelle import jobdb
+from actinia_gdi.model.jobtabelle import JobStatsStatus, JobStatsDuration
+from actinia_gdi.model.jobtabelle import JobStatsHourly
+from actinia_gdi.resources.config import JOBTABLE
+from actinia_gdi.resources.logging import log
+from actinia_gdi.core.jobRouter import jobRouter
+
+
+# durations are counted in buckets, BUCKETS_PER_DOUBLING per doubling of
+# seconds, so percentiles are exact to about 20 percent
+BUCKETS_PER_DOUBLING = 4
+
+PERCENTILES = [50, 90, 99]
+
+# all processes are counted by the test endpoint, as for listing jobs
+ALL_PROCESSES = 'test'
+
+STATS_MODELS = [JobStatsStatus, JobStatsDuration, JobStatsHourly]
+
+
+def _name(model):
+    return '"%s"."%s"' % (JOBTABLE.schema, model._meta.table_name)
+
+
+def _function(suffix):
+    return '"%s"."%s_stats_%s"' % (JOBTABLE.schema, JOBTABLE.table, suffix)
+
+
+def _upsert(model, columns, values):
+    columns = columns + ['shard']
+    return (
+        'INSERT INTO %s (%s, count) VALUES (%s, s, 1) ON CONFLICT (%s) '
+        'DO UPDATE SET count = %s.count + 1;' % (
+            _name(model), ', '.join(columns), ', '.join(values),
+            ', '.join(columns), model._meta.table_name))
+
+
+def _sqlList(values):
+    return ', '.join("'%s'" % value for value in values)
+
+
+# arbitrary key of the postgres advisory lock held while creating the
+# statistics tables and the trigger
+STATS_LOCK_KEY = 4711003
+
+
+def _functionBodies(terminalStatus):
+    """ Bodies of the functions of initJobStats by suffix, as postgres
+    stores them in pg_proc.prosrc
+    """
+    bucket = """
+                SELECT floor(%s * log(2.0, (greatest(
+                    extract(epoch FROM duration), 0) + 1)::numeric))::integer
+            """ % BUCKETS_PER_DOUBLING
+
+    decrement = (
+        "UPDATE %s SET count = count - 1 WHERE process = "
+        "coalesce(OLD.process, '') AND status = coalesce(OLD.status, '') "
+        "AND shard = s;" % _name(JobStatsStatus))
+    increment = _upsert(JobStatsStatus, ['process', 'status'],
+                        ['p', "coalesce(NEW.status, '')"])
+
+    # the job keeps its shard, so a status change moves the count between
+    # rows of the same shard. Both rows are locked in the order of their
+    # keys, so opposite transitions of jobs in the same shard wait for
+    # each other instead of deadlocking.
+    trigger = """
+            DECLARE
+                p text := coalesce(NEW.process, '');
+                s integer := NEW.idpk_jobs %% %s;
+            BEGIN
+                IF TG_OP = 'UPDATE' THEN
+                    IF OLD.status IS NOT DISTINCT FROM NEW.status THEN
+                        RETURN NULL;
+                    END IF;
+                    IF (coalesce(OLD.process, ''), coalesce(OLD.status, ''))
+                            < (p, coalesce(NEW.status, '')) THEN
+                        %s
+                        %s
+                    ELSE
+                        %s
+                        %s
+                    END IF;
+                ELSE
+                    %s
+                END IF;
+                IF NEW.status = 'RUNNING' AND NEW.time_started IS NOT NULL
+                        AND NEW.time_created IS NOT NULL THEN
+                    %s
+                END IF;
+                IF NEW.status IN (%s) AND NEW.time_ended IS NOT NULL THEN
+                    IF NEW.time_started IS NOT NULL THEN
+                        %s
+                    END IF;
+                    %s
+                END IF;
+                RETURN NULL;
+            END
+            """ % (
+        JOBTABLE.stats_shards,
+        decrement, increment, increment, decrement, increment,
+        _upsert(JobStatsDuration, ['process', 'kind', 'bucket'],
+                ['p', "'wait'", '%s(NEW.time_started - NEW.time_created)'
+                 % _function('bucket')]),
+        _sqlList(terminalStatus),
+        _upsert(JobStatsDuration, ['process', 'kind', 'bucket'],
+                ['p', "'run'", '%s(NEW.time_ended - NEW.time_started)'
+                 % _function('bucket')]),
+        _upsert(JobStatsHourly, ['process', 'hour', 'status'],
+                ['p', "date_trunc('hour', NEW.time_ended)",
+                 'NEW.status']))
+
+    return {'bucket': bucket, 'trigger': trigger}
+
+
+def _sharded():
+    """ Check if the statistics tables have the shard column
+    """
+    return all('shard' in [column.name for column in jobdb.get_columns(
+        model._meta.table_name, JOBTABLE.schema)] for model in STATS_MODELS)
+
+
+def _jobStatsCurrent(bodies):
+    """ Check on the current connection if the statistics tables, the
+    functions with the given bodies and the trigger exist
+    """
+    if not all(model.table_exists() for model in STATS_MODELS):
+        return False
+    if not _sharded():
+        return False
+
+    cursor = jobdb.execute_sql("""
+        SELECT p.proname, p.prosrc FROM pg_catalog.pg_proc p
+        JOIN pg_catalog.pg_namespace n ON n.oid = p.pronamespace
+        WHERE n.nspname = %s AND p.proname IN %s
+        """, (JOBTABLE.schema, tuple(
+        '%s_stats_%s' % (JOBTABLE.table, suffix) for suffix in bodies)))
+    existing = dict(cursor.fetchall())
+    for suffix, body in bodies.items():
+        if existing.get('%s_stats_%s' % (JOBTABLE.table, suffix)) != body:
+            return False
+
+    cursor = jobdb.execute_sql("""
+        SELECT 1 FROM pg_catalog.pg_trigger t
+        JOIN pg_catalog.pg_class c ON c.oid = t.tgrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND t.tgname = %s
+        """, (JOBTABLE.schema, JOBTABLE.table, JOBTABLE.table + '_stats'))
+    return cursor.fetchone() is not None
+
+
+def initJobStats(terminalStatus):
+    """ Method to create the statistics tables and the trigger on startup
+
+    Nothing is changed if the tables, the functions and the trigger exist
+    as declared here, so starting workers do not take locks on the
+    jobtable. Otherwise they are created by one worker holding an advisory
+    lock, the others wait for it. The tables are filled from the jobtable
+    and the archive if they are created now.
+
+    Args:
+    terminalStatus (list): status of finished jobs
+    """
+    hot = '"%s"."%s"' % (JOBTABLE.schema, JOBTABLE.table)
+    bodies = _functionBodies(terminalStatus)
+
+    with jobdb:
+        if _jobStatsCurrent(bodies):
+            log.debug('Job statistics are up to date')
+            return
+
+        # released at the end of the transaction
+        jobdb.execute_sql('SELECT pg_advisory_xact_lock(%s)',
+                          (STATS_LOCK_KEY,))
+        # another worker might have finished meanwhile
+        if _jobStatsCurrent(bodies):
+            log.debug('Job statistics were created by another worker')
+            return
+
+        # tables created before the counts were sharded are filled again
+        if JobStatsStatus.table_exists() and not _sharded():
+            jobdb.drop_tables(STATS_MODELS, safe=True)
+            log.info('Dropped job statistics without shards')
+
+        created = not JobStatsStatus.table_exists()
+        jobdb.create_tables(STATS_MODELS, safe=True)
+
+        jobdb.execute_sql(
+            'CREATE OR REPLACE FUNCTION %s(duration interval) '
+            'RETURNS integer AS $$%s$$ LANGUAGE sql IMMUTABLE' % (
+                _function('bucket'), bodies['bucket']))
+        jobdb.execute_sql(
+            'CREATE OR REPLACE FUNCTION %s() RETURNS trigger '
+            'AS $$%s$$ LANGUAGE plpgsql' % (
+                _function('trigger'), bodies['trigger']))
+
+        jobdb.execute_sql('DROP TRIGGER IF EXISTS "%s_stats" ON %s' % (
+            JOBTABLE.table, hot))
+        jobdb.execute_sql(
+            'CREATE TRIGGER "%s_stats" AFTER INSERT OR UPDATE OF status '
+            'ON %s FOR EACH ROW EXECUTE PROCEDURE %s()' % (
+                JOBTABLE.table, hot, _function('trigger')))
+        log.info('Created job statistics')
+
+    if created:
+        rebuildJobStats(terminalStatus)
+
+
+def rebuildJobStats(terminalStatus):
+    """ Method to compute the statistics from all jobs again
+
+    The jobtable is locked against changes while the statistics are
+    computed.
+
+    Args:
+    terminalStatus (list): status of finished jobs
+    """
+    hot = '"%s"."%s"' % (JOBTABLE.schema, JOBTABLE.table)
+    archive = '"%s"."%s"' % (JOBTABLE.schema, JOBTABLE.archive_table)
+    terminal = _sqlList(terminalStatus)
+    jobs = (
+        "(SELECT coalesce(process, '') AS process, status, time_created, "
+        "time_started, time_ended FROM %s UNION ALL "
+        "SELECT coalesce(process, ''), status, time_created, "
+        "time_started, time_ended FROM %s) AS jobs" % (hot, archive))
+
+    with jobdb:
+        jobdb.execute_sql('LOCK TABLE %s IN SHARE MODE' % hot)
+        for model in STATS_MODELS:
+            jobdb.execute_sql('DELETE FROM %s' % _name(model))
+
+        jobdb.execute_sql(
+            "INSERT INTO %s (process, status, shard, count) "
+            "SELECT process, coalesce(status, ''), 0, count(*) FROM %s "
+            "GROUP BY 1, 2" % (_name(JobStatsStatus), jobs))
+        jobdb.execute_sql(
+            "INSERT INTO %s (process, kind, bucket, shard, count) "
+            "SELECT process, 'wait', %s(time_started - time_created), 0, "
+            "count(*) FROM %s WHERE time_started IS NOT NULL "
+            "AND time_created IS NOT NULL AND status <> 'PENDING' "
+            "GROUP BY 1, 2, 3" % (
+                _name(JobStatsDuration), _function('bucket'), jobs))
+        jobdb.execute_sql(
+            "INSERT INTO %s (process, kind, bucket, shard, count) "
+            "SELECT process, 'run', %s(time_ended - time_started), 0, "
+            "count(*) FROM %s WHERE status IN (%s) "
+            "AND time_started IS NOT NULL AND time_ended IS NOT NULL "
+            "GROUP BY 1, 2, 3" % (
+                _name(JobStatsDuration), _function('bucket'), jobs,
+                terminal))
+        jobdb.execute_sql(
+            "INSERT INTO %s (process, hour, status, shard, count) "
+            "SELECT process, date_trunc('hour', time_ended), status, 0, "
+            "count(*) FROM %s WHERE status IN (%s) "
+            "AND time_ended IS NOT NULL GROUP BY 1, 2, 3" % (
+                _name(JobStatsHourly), jobs, terminal))
+    log.info('Rebuilt job statistics')
+
+
+def durationBucket(seconds):
+    """ Method to find the bucket of a duration as the SQL function of
+    initJobStats
+
+    Args:
+    seconds (float): the duration
+
+    Returns:
+    bucket (int): the bucket
+    """
+    return int(math.floor(
+        BUCKETS_PER_DOUBLING * math.log2(max(seconds, 0) + 1)))
+
+
+def bucketPercentiles(buckets):
+    """ Method to estimate percentiles of a duration histogram
+
+    Args:
+    buckets (dict): number of durations by bucket
+
+    Returns:
+    stats (dict): count and upper bounds in seconds of the PERCENTILES
+    """
+    total = sum(buckets.values())
+    stats = {'count': total}
+    for percentile in PERCENTILES:
+        stats['p' + str(percentile)] = None
+        if total == 0:
+            continue
+        needed = total * percentile / 100.0
+        cumulative = 0
+        for bucket in sorted(buckets):
+            cumulative += buckets[bucket]
+            if cumulative >= needed:
+                stats['p' + str(percentile)] = round(
+                    2 ** ((bucket + 1) / BUCKETS_PER_DOUBLING) - 1, 1)
+                break
+    return stats
+
+
+def getJobStats(process, hours=24):
+    """ Method to read the statistics of a process
+
+    Args:
+    process (str): the process ('test' for all processes)
+    hours (int): number of past hours to return the throughput for
+
+    Returns:
+    stats (dict): jobs per status, queue wait and run duration
+    percentiles in seconds and finished jobs per hour
+    """
+    def forProcess(model):
+        if process == ALL_PROCESSES:
+            return True
+        return model.process == process
+
+    since = datetime.utcnow().replace(
+        minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+
+    db = jobRouter.read()
+    with db:
+        status = {row.status: int(row.total) for row in JobStatsStatus.select(
+            JobStatsStatus.status,
+            fn.SUM(JobStatsStatus.count).alias('total')
+        ).where(forProcess(JobStatsStatus)).group_by(
+                JobStatsStatus.status).execute(db)}
+
+        durations = {'wait': dict(), 'run': dict()}
+        for row in JobStatsDuration.select(
+            JobStatsDuration.kind, JobStatsDuration.bucket,
+            fn.SUM(JobStatsDuration.count).alias('total')
+        ).where(forProcess(JobStatsDuration)).group_by(
+                JobStatsDuration.kind, JobStatsDuration.bucket).execute(db):
+            durations[row.kind][row.bucket] = int(row.total)
+
+        throughput = dict()
+        for row in JobStatsHourly.select(
+            JobStatsHourly.hour, JobStatsHourly.status,
+            fn.SUM(JobStatsHourly.count).alias('total')
+        ).where(forProcess(JobStatsHourly) & (JobStatsHourly.hour >= since)
+                ).group_by(JobStatsHourly.hour, JobStatsHourly.status
+                           ).execute(db):
+            hour = row.hour.strftime('%Y-%m-%dT%H:%M:%SZ')
+            throughput.setdefault(hour, {'hour': hour})
+            throughput[hour][row.status] = int(row.total)
+
+    return {
+        'process': process,
+        'status': {key: value for key, value in status.items() if value},
+        'queue_wait': bucketPercentiles(durations['wait']),
+        'run_duration': bucketPercentiles(durations['run']),
+        'throughput': [throughput[hour] for hour in sorted(throughput)]
+    }
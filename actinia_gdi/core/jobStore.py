@@ -0,0 +1,673 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Storage of jobs used by the processes
+
+The postgres jobtable is used by default. JOBTABLE.store = memory keeps all
+jobs of a worker in memory instead, to run tests and benchmarks of the API
+without a database.
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import copy
+import operator
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from actinia_gdi.model.jobtabelle import Job, jobdb, jobreplica
+from actinia_gdi.resources.config import JOBTABLE, JOBQUEUE
+from actinia_gdi.resources.logging import log
+from actinia_gdi.core import jobtable
+from actinia_gdi.core.jobEvents import jobEvent, jobEventListener
+from actinia_gdi.core.jobStats import bucketPercentiles, durationBucket
+from actinia_gdi.core.jobStats import getJobStats, ALL_PROCESSES
+
+
+class JobStore(ABC):
+    """Interface of the storage of jobs
+
+    Records are dicts with the columns of the Job model. Stores implement
+    all abstract methods, the others have defaults.
+    """
+
+    def init(self):
+        """ Prepare the store on startup
+        """
+        pass
+
+    @abstractmethod
+    def insertNewJob(self, rule_configuration, job_description, process,
+                     feature_type, actiniaCoreResp, actiniaCoreUrl=None):
+        """ Store a new job and return its record
+        """
+
+    @abstractmethod
+    def insertNewJobs(self, jobs):
+        """ Store new jobs, each a tuple of the args of insertNewJob, and
+        return their records in the same order
+        """
+
+    @abstractmethod
+    def getJobById(self, jobid, fields=None):
+        """ Return the job or only the comma separated fields of it, None
+        if it does not exist or a field is unknown
+        """
+
+    @abstractmethod
+    def getAllIds(self):
+        """ Return the ids of all jobs
+        """
+
+    @abstractmethod
+    def iterJobs(self, filters, process, limit=None, after=None,
+                 fields=None, archived=False, orderBy=None):
+        """ Return a generator of the matching jobs or None if an arg is
+        invalid, see actinia_gdi.core.jobtable.iterJobs
+        """
+
+    @abstractmethod
+    def iterJobHistory(self, filters, process):
+        """ Return a generator of all matching jobs including archived
+        ones for export or None if a filter is invalid
+        """
+
+    def getAllJobs(self, filters, process):
+        """ Return a list of the matching jobs or None if a filter is
+        invalid
+        """
+        jobs = self.iterJobs(filters, process)
+        if jobs is None:
+            return None
+        return list(jobs)
+
+    @abstractmethod
+    def updateJobByResourceID(self, resourceId, resp, status):
+        """ Apply an actinia-core status, return the record, the uuid of
+        its feature and the time of the update
+        """
+
+    @abstractmethod
+    def updateJobsByResourceIDs(self, updates):
+        """ Apply buffered running updates, return the number of updated
+        jobs
+        """
+
+    @abstractmethod
+    def cancelJobById(self, jobid, fromStatus=None):
+        """ Set the job to TERMINATED if it is in one of fromStatus and
+        return its record
+        """
+
+    @abstractmethod
+    def submitQueuedJob(self, submit, cancel):
+        """ Submit the oldest QUEUED job with submit(process,
+        rule_configuration), return its record or None if no job is
+        waiting, see actinia_gdi.core.jobtable.submitQueuedJob
+        """
+
+    @abstractmethod
+    def getBackendLoad(self):
+        """ Return the number of PENDING or RUNNING jobs by
+        actinia_core_url
+        """
+
+    @abstractmethod
+    def getStaleJobs(self, staleBefore, limit, position=None):
+        """ Return up to limit PENDING or RUNNING jobs not changed since
+        staleBefore, see actinia_gdi.core.jobtable.getStaleJobs
+        """
+
+    @abstractmethod
+    def touchJob(self, jobid, version):
+        """ Mark a polled job as not stale if it is still at version, see
+        actinia_gdi.core.jobtable.touchJob
+        """
+
+    @abstractmethod
+    def advisoryLock(self, key):
+        """ Return a context manager holding the lock key of all workers,
+        it gives False if another worker holds it
+        """
+
+    @abstractmethod
+    def getJobStats(self, process, hours=24):
+        """ Return the statistics of a process, see
+        actinia_gdi.core.jobStats.getJobStats
+        """
+
+    def stats(self):
+        """ Return metrics of the store
+        """
+        return dict()
+
+    def ping(self):
+        """ Raise an exception if the store can not be used
+        """
+        pass
+
+
+class PostgresJobStore(JobStore):
+    """Stores jobs in the postgres jobtable
+    """
+
+    def init(self):
+        jobtable.initJobDB()
+        # runs in each gunicorn worker, as the app is not preloaded
+        jobdb.prewarm(JOBTABLE.prewarm)
+        if jobreplica is not None:
+            jobreplica.prewarm(JOBTABLE.prewarm)
+
+    def insertNewJob(self, rule_configuration, job_description, process,
+                     feature_type, actiniaCoreResp, actiniaCoreUrl=None):
+        return jobtable.insertNewJob(rule_configuration, job_description,
+                                     process, feature_type, actiniaCoreResp,
+                                     actiniaCoreUrl)
+
+    def insertNewJobs(self, jobs):
+        return jobtable.insertNewJobs(jobs)
+
+    def getJobById(self, jobid, fields=None):
+        columns = jobtable.parseJobFields(fields)
+        if columns is None:
+            return None
+        return jobtable.getJobById(jobid, columns)
+
+    def getAllIds(self):
+        return jobtable.getAllIds()
+
+    def iterJobs(self, filters, process, limit=None, after=None,
+                 fields=None, archived=False, orderBy=None):
+        return jobtable.iterJobs(filters, process, limit, after, fields,
+                                 archived, orderBy)
+
+    def iterJobHistory(self, filters, process):
+        return jobtable.iterJobHistory(filters, process)
+
+    def updateJobByResourceID(self, resourceId, resp, status):
+        return jobtable.updateJobByResourceID(resourceId, resp, status)
+
+    def updateJobsByResourceIDs(self, updates):
+        return jobtable.updateJobsByResourceIDs(updates)
+
+    def cancelJobById(self, jobid, fromStatus=None):
+        return jobtable.cancelJobById(jobid, fromStatus)
+
+    def submitQueuedJob(self, submit, cancel):
+        return jobtable.submitQueuedJob(submit, cancel)
+
+    def getBackendLoad(self):
+        return jobtable.getBackendLoad()
+
+    def getStaleJobs(self, staleBefore, limit, position=None):
+        return jobtable.getStaleJobs(staleBefore, limit, position)
+
+    def touchJob(self, jobid, version):
+        return jobtable.touchJob(jobid, version)
+
+    def advisoryLock(self, key):
+        return jobtable.advisoryLock(key)
+
+    def getJobStats(self, process, hours=24):
+        return getJobStats(process, hours)
+
+    def stats(self):
+        stats = {
+            'jobdb': jobdb.stats(),
+            'jobcache': jobtable.jobCache.stats()
+        }
+        if jobreplica is not None:
+            stats['jobreplica'] = jobreplica.stats()
+        return stats
+
+    def ping(self):
+        with jobdb:
+            jobdb.execute_sql('SELECT 1')
+
+
+# comparison of a column with a filter value for each filter operator
+FILTER_FUNCTIONS = {
+    '=': operator.eq,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'in': lambda value, values: value in values
+}
+
+
+def jsonContains(document, value):
+    """ Method to check a JSON document like the postgres @> operator
+
+    Args:
+    document: the JSON column
+    value: the JSON value from the filter
+
+    Returns:
+    contains (bool): True if value is contained in document
+    """
+    if isinstance(value, dict):
+        return isinstance(document, dict) and all(
+            key in document and jsonContains(document[key], item)
+            for key, item in value.items())
+    if isinstance(value, list):
+        return isinstance(document, list) and all(
+            any(jsonContains(element, item) for element in document)
+            for item in value)
+    if isinstance(document, list):
+        return value in document
+    return document == value
+
+
+class MemoryJobStore(JobStore):
+    """Keeps the jobs of this worker in memory
+
+    Filters, fields, order and cursors are checked and applied as by the
+    postgres store. Changes are dispatched to the subscribers of
+    jobEventListener of this worker. Responses of actinia-core are stored
+    as they are and nothing is archived.
+    """
+
+    def __init__(self):
+        self._jobs = dict()
+        self._byResource = dict()
+        self._lastId = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _utcnow():
+        return datetime.utcnow().replace(microsecond=0)
+
+    def _dispatch(self, records):
+        for record in records:
+            jobEventListener.dispatch(jobEvent(record))
+
+    def insertNewJob(self, rule_configuration, job_description, process,
+                     feature_type, actiniaCoreResp, actiniaCoreUrl=None):
+        return self.insertNewJobs([(rule_configuration, job_description,
+                                    process, feature_type,
+                                    actiniaCoreResp, actiniaCoreUrl)])[0]
+
+    def insertNewJobs(self, jobs):
+        utcnow = self._utcnow()
+        records = []
+        rows = jobtable._newJobRows(jobs, utcnow, trim=False)
+        with self._lock:
+            for row in rows:
+                self._lastId += 1
+                record = {name: None for name in Job._meta.fields}
+                record.update(row)
+                record[JOBTABLE.id_field] = self._lastId
+                record['version'] = 0
+                record['submit_attempts'] = 0
+                self._jobs[self._lastId] = record
+                if record['actinia_core_jobid'] is not None:
+                    self._byResource[record['actinia_core_jobid']] = \
+                        self._lastId
+                records.append(copy.deepcopy(record))
+        self._dispatch(records)
+        log.info("Created %s new jobs in memory." % len(records))
+        return records
+
+    def getJobById(self, jobid, fields=None):
+        columns = jobtable.parseJobFields(fields)
+        if columns is None:
+            return None
+        try:
+            jobid = int(jobid)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            record = copy.deepcopy(self._jobs.get(jobid))
+        if record is not None and columns:
+            return {column.name: record[column.name] for column in columns}
+        return record
+
+    def getAllIds(self):
+        with self._lock:
+            return sorted(self._jobs)
+
+    def _buildFilter(self, filters, process):
+        conditions = jobtable.parseJobFilters(filters)
+        if conditions is None:
+            return None
+        checks = [(field.name, op, value)
+                  for field, op, value in conditions]
+        if process != ALL_PROCESSES:
+            checks.append(('process', '=', process))
+
+        def matches(record):
+            for name, op, value in checks:
+                column = record.get(name)
+                if op == 'contains':
+                    if not jsonContains(column, value):
+                        return False
+                elif column is None \
+                        or not FILTER_FUNCTIONS[op](column, value):
+                    return False
+            return True
+
+        return matches
+
+    def iterJobs(self, filters, process, limit=None, after=None,
+                 fields=None, archived=False, orderBy=None):
+        matches = self._buildFilter(filters, process)
+        columns = jobtable.parseJobFields(fields)
+        order = jobtable.parseJobOrder(orderBy)
+        if matches is None or columns is None or order is None:
+            return None
+        position = None
+        if after:
+            position = jobtable.decodeJobCursor(after, orderBy)
+            if position is None:
+                return None
+        if archived:
+            return iter([])
+
+        orderField, descending = order
+        with self._lock:
+            records = [record for record in self._jobs.values()
+                       if matches(record)]
+        return self._iterRecords(records, limit, position, columns,
+                                 orderField.name, descending)
+
+    def iterJobHistory(self, filters, process):
+        return self.iterJobs(filters, process)
+
+    def _iterRecords(self, records, limit, position, columns, orderName,
+                     descending):
+        idName = JOBTABLE.id_field
+
+        def isAfter(record):
+            value = record[orderName]
+            if position is None:
+                return True
+            if (value is None) != (position['value'] is None) \
+                    and orderName != idName:
+                # in the other segment
+                return (value is None) != descending
+            if value is None or orderName == idName:
+                key, last = record[idName], position['id']
+            else:
+                key = (value, record[idName])
+                last = (position['value'], position['id'])
+            return key < last if descending else key > last
+
+        # jobs without a value in the order column follow the others in
+        # ascending and precede them in descending order
+        valued = sorted(
+            (record for record in records
+             if record[orderName] is not None and isAfter(record)),
+            key=lambda record: (record[orderName], record[idName]),
+            reverse=descending)
+        empty = sorted(
+            (record for record in records
+             if record[orderName] is None and isAfter(record)),
+            key=lambda record: record[idName], reverse=descending)
+        listed = empty + valued if descending else valued + empty
+
+        for record in listed[:limit]:
+            record = copy.deepcopy(record)
+            if columns:
+                record = {column.name: record[column.name]
+                          for column in columns + [getattr(Job, orderName)]}
+            yield record
+
+    def updateJobByResourceID(self, resourceId, resp, status):
+        utcnow = self._utcnow()
+        gdiStatus = jobtable.JOB_STATUS.get(status)
+        if gdiStatus is None:
+            log.error('Could not set the status to actinia-core status:'
+                      + status + '(Status not found.)')
+            return None, None, None
+
+        record, updated = self._update(resourceId, resp, gdiStatus, utcnow)
+        if record is None:
+            log.warning("Job does not exist and can therefore not be updated")
+            return None, None, None
+
+        try:
+            gnosUuid = record['job_description']['feature_uuid']
+        except Exception:
+            gnosUuid = None
+
+        return record, gnosUuid, utcnow
+
+    def _update(self, resourceId, resp, gdiStatus, utcnow):
+        """ Apply the status transition as the conditional UPDATE of the
+        postgres store, return a copy of the record and if it changed
+        """
+        with self._lock:
+            record = self._jobs.get(self._byResource.get(resourceId))
+            if record is None:
+                return None, False
+            updated = record['status'] in \
+                jobtable.JOB_STATUS_PREDECESSORS[gdiStatus]
+            if updated:
+                record['status'] = gdiStatus
+                record['actinia_core_response'] = resp
+                record['time_modified'] = utcnow
+                record['version'] += 1
+                if gdiStatus == 'RUNNING':
+                    record['time_started'] = record['time_started'] or utcnow
+                elif gdiStatus in jobtable.TERMINAL_STATUS:
+                    record['time_ended'] = utcnow
+            record = copy.deepcopy(record)
+
+        if updated:
+            self._dispatch([record])
+        return record, updated
+
+    def updateJobsByResourceIDs(self, updates):
+        count = 0
+        for resourceId, (resp, utcnow) in updates.items():
+            utcnow = datetime.strptime(utcnow, '%Y-%m-%dT%H:%M:%SZ')
+            _, updated = self._update(resourceId, resp, 'RUNNING', utcnow)
+            count += updated
+        return count
+
+    def cancelJobById(self, jobid, fromStatus=None):
+        utcnow = self._utcnow()
+        if fromStatus is None:
+            fromStatus = jobtable.JOB_STATUS_PREDECESSORS['TERMINATED']
+        with self._lock:
+            record = self._jobs.get(int(jobid))
+            if record is None:
+                log.warning("Job does not exist and can therefore not be "
+                            + "cancelled")
+                return None
+            changed = record['status'] in fromStatus
+            if changed:
+                record['status'] = 'TERMINATED'
+                record['time_ended'] = utcnow
+                record['time_modified'] = utcnow
+                record['version'] += 1
+            record = copy.deepcopy(record)
+
+        if changed:
+            self._dispatch([record])
+        return record
+
+    def submitQueuedJob(self, submit, cancel):
+        retryBefore = self._utcnow() - timedelta(
+            seconds=JOBQUEUE.retry_delay)
+        with self._lock:
+            queued = [jobid for jobid, record in self._jobs.items()
+                      if record['status'] == 'QUEUED'
+                      and (record['submit_attempts'] == 0
+                           or record['time_modified'] < retryBefore)]
+            if not queued:
+                return None
+            record = self._jobs[min(queued)]
+            record['status'] = 'SUBMITTING'
+            record['time_modified'] = self._utcnow()
+            record['version'] += 1
+            job = copy.deepcopy(record)
+        self._dispatch([job])
+
+        actiniaCoreResp, actiniaCoreUrl = submit(
+            job['process'], job['rule_configuration'])
+
+        utcnow = self._utcnow()
+        resourceId = None
+        if actiniaCoreResp is not None:
+            row = jobtable._newJobRow(None, None, None, None,
+                                      actiniaCoreResp, utcnow, trim=False)
+            resourceId = row['actinia_core_jobid']
+        with self._lock:
+            record = self._jobs[job[JOBTABLE.id_field]]
+            # not cancelled while it was submitted
+            updated = record['status'] == 'SUBMITTING' \
+                and record['version'] == job['version']
+            if updated:
+                record['time_modified'] = utcnow
+                record['version'] += 1
+            if updated and actiniaCoreResp is None:
+                record['status'] = 'QUEUED'
+                record['submit_attempts'] += 1
+                if record['submit_attempts'] >= JOBQUEUE.max_attempts:
+                    record['status'] = 'ERROR'
+                    record['time_ended'] = utcnow
+            elif updated:
+                record['status'] = row['status']
+                record['actinia_core_jobid'] = resourceId
+                record['actinia_core_response'] = actiniaCoreResp
+                record['actinia_core_url'] = actiniaCoreUrl
+                self._byResource[resourceId] = record[JOBTABLE.id_field]
+                if actiniaCoreResp.get('status') == 'error':
+                    record['status'] = 'ERROR'
+                    record['time_ended'] = utcnow
+            record = copy.deepcopy(record)
+
+        if updated:
+            self._dispatch([record])
+        elif resourceId is not None:
+            cancel(resourceId, actiniaCoreUrl)
+        return record
+
+    def getJobStats(self, process, hours=24):
+        since = self._utcnow().replace(minute=0, second=0) \
+            - timedelta(hours=hours - 1)
+        status = dict()
+        durations = {'wait': dict(), 'run': dict()}
+        throughput = dict()
+
+        with self._lock:
+            records = [record for record in self._jobs.values()
+                       if process == ALL_PROCESSES
+                       or record['process'] == process]
+            for record in records:
+                status[record['status']] = status.get(record['status'], 0) + 1
+                created = record['time_created']
+                started = record['time_started']
+                ended = record['time_ended']
+                if started is not None:
+                    bucket = durationBucket(
+                        (started - created).total_seconds())
+                    durations['wait'][bucket] = \
+                        durations['wait'].get(bucket, 0) + 1
+                if ended is None \
+                        or record['status'] not in jobtable.TERMINAL_STATUS:
+                    continue
+                if started is not None:
+                    bucket = durationBucket((ended - started).total_seconds())
+                    durations['run'][bucket] = \
+                        durations['run'].get(bucket, 0) + 1
+                hour = ended.replace(minute=0, second=0)
+                if hour >= since:
+                    hour = hour.strftime('%Y-%m-%dT%H:%M:%SZ')
+                    throughput.setdefault(hour, {'hour': hour})
+                    throughput[hour][record['status']] = \
+                        throughput[hour].get(record['status'], 0) + 1
+
+        return {
+            'process': process,
+            'status': status,
+            'queue_wait': bucketPercentiles(durations['wait']),
+            'run_duration': bucketPercentiles(durations['run']),
+            'throughput': [throughput[hour] for hour in sorted(throughput)]
+        }
+
+    def getBackendLoad(self):
+        load = dict()
+        with self._lock:
+            for record in self._jobs.values():
+                if record['status'] in jobtable.OUTSTANDING_STATUS:
+                    url = record['actinia_core_url']
+                    load[url] = load.get(url, 0) + 1
+        return load
+
+    def getStaleJobs(self, staleBefore, limit, position=None):
+        with self._lock:
+            jobs = [record for record in self._jobs.values()
+                    if record['status'] in jobtable.OUTSTANDING_STATUS
+                    and record['time_modified'] < staleBefore
+                    and record['actinia_core_jobid'] is not None]
+        jobs.sort(key=lambda record: (record['time_modified'],
+                                      record[JOBTABLE.id_field]))
+        if position is not None:
+            jobs = [record for record in jobs
+                    if (record['time_modified'], record[JOBTABLE.id_field])
+                    > (position['value'], position['id'])]
+        columns = [JOBTABLE.id_field, 'status', 'version', 'time_modified',
+                   'actinia_core_jobid', 'actinia_core_url']
+        return [{column: record[column] for column in columns}
+                for record in jobs[:limit]]
+
+    def touchJob(self, jobid, version):
+        with self._lock:
+            record = self._jobs.get(int(jobid))
+            if record is None or record['version'] != version \
+                    or record['status'] not in jobtable.OUTSTANDING_STATUS:
+                return False
+            record['time_modified'] = self._utcnow()
+        return True
+
+    @contextmanager
+    def advisoryLock(self, key):
+        # there are no other workers sharing the jobs
+        yield True
+
+    def stats(self):
+        with self._lock:
+            return {'jobstore': {'jobs': len(self._jobs)}}
+
+
+def createJobStore(store):
+    """ Method to create the job store configured by JOBTABLE.store
+
+    Args:
+    store (str): "postgres" or "memory"
+
+    Returns:
+    jobStore (JobStore): the store
+    """
+    if store == 'memory':
+        log.info('Jobs are stored in memory')
+        return MemoryJobStore()
+    if store != 'postgres':
+        log.error('Unknown job store "%s", using postgres' % store)
+    return PostgresJobStore()
+
+
+jobStore = createJobStore(JOBTABLE.store)
@@ -24,17 +24,74 @@ __copyright__ = "2018-present mundialis GmbH & Co. KG"
 __license__ = "Apache-2.0"
 
 
-from datetime import datetime
+import base64
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
 
 from playhouse.shortcuts import model_to_dict
-from peewee import Expression, AutoField
-from flask import current_app
+from peewee import Expression, AutoField, DateTimeField, Tuple, ValuesList
+from peewee import fn
+from playhouse.postgres_ext import BinaryJSONField, ServerSide
 
-from actinia_gdi.model.jobtabelle import Job, jobdb
-from actinia_gdi.resources.config import JOBTABLE
+from actinia_gdi.model.jobtabelle import Job, JobArchive, JobPayload, jobdb
+from actinia_gdi.resources.config import JOBTABLE, JOBCACHE, JOBQUEUE
 from actinia_gdi.resources.logging import log
 from actinia_gdi.core.actiniaCore import parseActiniaAsyncStatusResponse
 from actinia_gdi.core.actiniaCore import parseActiniaIdFromUrl
+from actinia_gdi.core.jobCache import JobCache
+from actinia_gdi.core.payloadStore import insertPayloads, splitPayloads
+from actinia_gdi.core.payloadStore import resolvePayloads, storePayloads
+from actinia_gdi.core.jobStats import initJobStats
+from actinia_gdi.core.jobEvents import jobEventListener, notifyJobChanges
+from actinia_gdi.core.jobRouter import jobRouter
+
+
+# actinia-gdi status for each actinia-core status
+JOB_STATUS = {
+    'accepted': 'PENDING',
+    'running': 'RUNNING',
+    'finished': 'SUCCESS',
+    'error': 'ERROR',
+    'terminated': 'TERMINATED'
+}
+
+# The job state machine: allowed predecessors of each actinia-gdi status.
+# QUEUED is only set on insert and when a submission failed. SUBMITTING is
+# set while a submitter sends the job to actinia-core. PENDING is set on
+# insert or submission, RUNNING may follow itself to store the progress and
+# terminal states never change again.
+JOB_STATUS_PREDECESSORS = {
+    'QUEUED': [],
+    'SUBMITTING': ['QUEUED'],
+    'PENDING': [],
+    'RUNNING': ['PENDING', 'RUNNING'],
+    'SUCCESS': ['PENDING', 'RUNNING'],
+    'ERROR': ['PENDING', 'RUNNING'],
+    'TERMINATED': ['QUEUED', 'SUBMITTING', 'PENDING', 'RUNNING']
+}
+
+# status of jobs which are not yet sent to actinia-core
+UNSUBMITTED_STATUS = ['QUEUED', 'SUBMITTING']
+
+TERMINAL_STATUS = ['SUCCESS', 'ERROR', 'TERMINATED']
+
+# Jobs read by id are cached per worker. Each change is notified to all
+# workers inside the changing transaction and invalidated locally after it.
+jobCache = JobCache(JOBCACHE.size, JOBCACHE.ttl, TERMINAL_STATUS)
+jobEventListener.subscribe(
+    lambda event: jobCache.invalidate(event[JOBTABLE.id_field]))
+
+
+def jobChanged(jobid):
+    """ Method to forget a job changed by this worker in the cache and to
+    read it from the primary database for a while
+    """
+    jobCache.invalidate(jobid)
+    jobRouter.changed(jobid)
 
 
 # We used `jobdb.connect(reuse_if_open=True)` at the beginning
@@ -42,21 +99,377 @@ from actinia_gdi.core.actiniaCore import parseActiniaIdFromUrl
 # peewee docs but we still try to jobdb.close() at the end of
 # each method.
 
+# arbitrary key of the postgres advisory lock held while building indexes
+INDEX_LOCK_KEY = 4711001
+# arbitrary key of the postgres advisory lock held by the reconciler
+RECONCILE_LOCK_KEY = 4711002
+# arbitrary key of the postgres advisory lock held while adding columns
+COLUMNS_LOCK_KEY = 4711004
+
+
+# columns added after the jobtable was first released, see addJobColumns
+ADDED_COLUMNS = ['version', 'time_modified', 'submit_attempts',
+                 'actinia_core_url']
+
+
 def initJobDB():
-    """Create jobtable on startup."""
-    Job.create_table(safe=True)
-    log.debug('Created jobtable if not exists')
+    """Create jobtable and its indexes on startup.
+
+    Missing indexes of an existing jobtable are built in the background
+    after its columns were added, as they may index the new columns.
+    """
+    created = False
+    if not Job.table_exists():
+        # a new table is empty, so indexes are created right away with it
+        Job.create_table(safe=True)
+        log.debug('Created jobtable if not exists')
+        created = True
+    addJobColumns(Job)
+    initJobArchive()
+    addJobColumns(JobArchive)
+    JobPayload.create_table(safe=True)
+    initJobStats(TERMINAL_STATUS)
+    if not created and JOBTABLE.create_indexes is True:
+        startJobIndexes()
+
+
+def _missingJobColumns(model):
+    """ Names of the ADDED_COLUMNS the table of model does not have yet
+    """
+    cursor = jobdb.execute_sql("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s
+        """, (JOBTABLE.schema, model._meta.table_name))
+    existing = [row[0] for row in cursor.fetchall()]
+    return [name for name in ADDED_COLUMNS if name not in existing]
+
+
+def addJobColumns(model):
+    """ Method to add the ADDED_COLUMNS to an existing jobtable or archive
+
+    The columns are read from information_schema first, so the table is
+    only altered, and locked exclusively, if a column is missing. One
+    worker adds them holding an advisory lock, the others wait for it.
+
+    Existing jobs get their time_created as time_modified, so they are
+    found by getStaleJobs.
+
+    Args:
+    model (Model): Job or JobArchive
+    """
+    with jobdb:
+        if not _missingJobColumns(model):
+            return
+        # released at the end of the transaction
+        jobdb.execute_sql('SELECT pg_advisory_xact_lock(%s)',
+                          (COLUMNS_LOCK_KEY,))
+        missing = _missingJobColumns(model)
+        for name in missing:
+            log.info('Adding column %s to %s' % (
+                name, model._meta.table_name))
+            ctx = jobdb.get_sql_context()
+            ctx.sql(model._meta.fields[name].ddl(ctx))
+            column, params = ctx.query()
+            jobdb.execute_sql(
+                'ALTER TABLE "%s"."%s" ADD COLUMN IF NOT EXISTS %s' % (
+                    JOBTABLE.schema, model._meta.table_name, column), params)
+        if 'time_modified' in missing:
+            model.update(time_modified=model.time_created).where(
+                model.time_modified.is_null()).execute()
+
+
+def _readJobIndexReport():
+    """ Compare the indexes of the jobtable with the declared ones on the
+    current connection
+    """
+    declared = [idx._name for idx in Job._meta.fields_to_index()]
+
+    cursor = jobdb.execute_sql("""
+        SELECT i.relname, x.indisvalid, x.indisprimary,
+               coalesce(s.idx_scan, 0)
+        FROM pg_catalog.pg_index x
+        JOIN pg_catalog.pg_class t ON t.oid = x.indrelid
+        JOIN pg_catalog.pg_class i ON i.oid = x.indexrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = t.relnamespace
+        LEFT JOIN pg_catalog.pg_stat_user_indexes s
+               ON s.indexrelid = x.indexrelid
+        WHERE n.nspname = %s AND t.relname = %s
+        """, (JOBTABLE.schema, JOBTABLE.table))
+    return compareJobIndexes(declared, cursor.fetchall())
+
+
+def compareJobIndexes(declared, existing):
+    """ Method to compare the declared indexes with the existing ones
+
+    Args:
+    declared (list): names of the declared indexes
+    existing (list): for each existing index a tuple of name, valid,
+    primary and number of scans
+
+    Returns:
+    report (dict): see getJobIndexReport
+    """
+    valid = [name for name, isvalid, _, _ in existing if isvalid]
+    report = {
+        'declared': declared,
+        'missing': [name for name in declared if name not in valid],
+        'unused': [name for name, _, isprimary, scans in existing
+                   if scans == 0 and not isprimary],
+        'undeclared': [name for name, _, isprimary, _ in existing
+                       if name not in declared and not isprimary]
+    }
+    return report
+
+
+def getJobIndexReport():
+    """ Method to compare the indexes of the jobtable with the declared ones
+
+    Returns:
+    report (dict): lists of index names which are declared, missing (or
+    invalid), unused (never scanned since statistics reset) and undeclared
+    """
+    with jobdb.connection_context():
+        report = _readJobIndexReport()
+
+    return report
+
+
+def jobIndexStatements(names):
+    """ Method to generate the statements building declared indexes
+
+    Indexes are built CONCURRENTLY, so an existing large jobtable stays
+    writable meanwhile. An invalid index left by an aborted build is not
+    replaced by IF NOT EXISTS, so it is dropped first.
+
+    Args:
+    names (list): names of the declared indexes to build
+
+    Returns:
+    statements (list): tuples of name, SQL and params to execute in order
+    """
+    statements = []
+    for idx in Job._meta.fields_to_index():
+        if idx._name not in names:
+            continue
+        sql, params = jobdb.get_sql_context().sql(idx).query()
+        statements.append((idx._name, 'DROP INDEX CONCURRENTLY IF EXISTS '
+                           '"%s"."%s"' % (JOBTABLE.schema, idx._name), []))
+        statements.append((idx._name, sql.replace(
+            'CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1), params))
+    return statements
+
+
+def createJobIndexes():
+    """ Method to create missing declared indexes of the jobtable
+
+    Building an index of a large jobtable takes long, so workers run this
+    in the background, see startJobIndexes, or it is run by the
+    createjobindexes command. A postgres advisory lock makes sure that
+    only one of them builds the indexes at a time.
+    """
+    # everything runs on one connection as the advisory lock is bound to it
+    with jobdb.connection_context():
+        report = _readJobIndexReport()
+        if report['undeclared']:
+            log.warning('Jobtable has undeclared indexes: '
+                        + ', '.join(report['undeclared']))
+        if not report['missing']:
+            log.debug('All declared jobtable indexes exist')
+            return
+
+        locked = jobdb.execute_sql(
+            'SELECT pg_try_advisory_lock(%s)',
+            (INDEX_LOCK_KEY,)).fetchone()[0]
+        if not locked:
+            log.info('Jobtable indexes are being created by another worker')
+            return
+        try:
+            # another worker might have finished meanwhile
+            report = _readJobIndexReport()
+            for name, sql, params in jobIndexStatements(report['missing']):
+                log.info('Building jobtable index %s: %s' % (name, sql))
+                jobdb.execute_sql(sql, params)
+        finally:
+            jobdb.execute_sql('SELECT pg_advisory_unlock(%s)',
+                              (INDEX_LOCK_KEY,))
+
+
+def startJobIndexes():
+    """ Method to create missing indexes of the jobtable in a background
+    thread, so starting workers are not blocked (and killed by the timeout
+    of gunicorn) while an index of a large jobtable is built
+    """
+    def run():
+        try:
+            createJobIndexes()
+        except Exception as e:
+            log.error('Could not create jobtable indexes')
+            log.error(str(e))
+
+    threading.Thread(target=run, daemon=True, name='JobIndexes').start()
+
+
+def _archiveTable(partition=None):
+    """ Quoted name of the archive table or of one of its partitions
+    """
+    name = JOBTABLE.archive_table
+    if partition:
+        name += '_' + partition
+    return '"%s"."%s"' % (JOBTABLE.schema, name)
+
 
+def initJobArchive():
+    """ Method to create the archive table for finished jobs on startup
 
-def smallifyResp(resp):
-    smallRes = dict()
-    smallRes['message'] = resp.get('message', None)
-    smallRes['process_results'] = resp.get('process_results', None)
-    smallRes['progress'] = resp.get('progress', None)
-    smallRes['time_delta'] = resp.get('time_delta', None)
-    # TODO: this will certainly break....
-    smallRes['urls.resources'] = resp.get('urls.resources', None)
-    return smallRes
+    The archive has the columns of the jobtable and is partitioned by
+    month of time_created, so old months can be dropped as a whole.
+    Jobs without time_created go to the default partition. Besides the
+    indexes for ordering, the JSON columns declared with an index in
+    JobArchive are GIN indexed.
+    """
+    hot = '"%s"."%s"' % (JOBTABLE.schema, JOBTABLE.table)
+    with jobdb:
+        jobdb.execute_sql(
+            'CREATE TABLE IF NOT EXISTS %s (LIKE %s INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE (time_created)' % (_archiveTable(), hot))
+        jobdb.execute_sql(
+            'CREATE TABLE IF NOT EXISTS %s PARTITION OF %s DEFAULT'
+            % (_archiveTable('default'), _archiveTable()))
+        for columns in [[JOBTABLE.id_field]] + [
+                [column, JOBTABLE.id_field] for column in orderColumns()]:
+            jobdb.execute_sql(
+                'CREATE INDEX IF NOT EXISTS "%s_%s" ON %s (%s)' % (
+                    JOBTABLE.archive_table, '_'.join(columns),
+                    _archiveTable(), ', '.join(columns)))
+        for field in JobArchive._meta.sorted_fields:
+            if field.index and field.index_type:
+                jobdb.execute_sql(
+                    'CREATE INDEX IF NOT EXISTS "%s_%s" ON %s USING %s (%s)'
+                    % (JOBTABLE.archive_table, field.column_name,
+                       _archiveTable(), field.index_type, field.column_name))
+    log.debug('Created job archive if not exists')
+
+
+def createJobArchivePartition(month):
+    """ Method to create the archive partition of a month if not exists
+
+    Args:
+    month (datetime): first day of the month
+    """
+    end = (month + timedelta(days=32)).replace(day=1)
+    jobdb.execute_sql(
+        "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s "
+        "FOR VALUES FROM ('%s') TO ('%s')" % (
+            _archiveTable(month.strftime('y%Ym%m')), _archiveTable(),
+            month.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+
+
+def archiveJobs(days=None):
+    """ Method to move finished jobs from the jobtable to the archive
+
+    Jobs in a terminal status which ended more than "days" ago are moved in
+    batches of JOBTABLE.archive_batch, each with a single
+    DELETE ... RETURNING feeding an INSERT into the archive.
+
+    Args:
+    days (int): age in days, defaults to JOBTABLE.archive_after
+
+    Returns:
+    count (int): number of archived jobs
+    """
+    if days is None:
+        days = JOBTABLE.archive_after
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    idField = getattr(Job, JOBTABLE.id_field)
+    columns = ', '.join(
+        '"%s"' % field.column_name for field in Job._meta.sorted_fields)
+    count = 0
+
+    while True:
+        with jobdb:
+            batch = list(Job.select(idField, Job.time_created).where(
+                (Job.status.in_(TERMINAL_STATUS)) & (Job.time_ended < cutoff)
+            ).order_by(idField).limit(JOBTABLE.archive_batch).tuples())
+            if not batch:
+                break
+
+            months = set(created.replace(day=1, hour=0, minute=0, second=0,
+                                         microsecond=0)
+                         for _, created in batch if created is not None)
+            for month in sorted(months):
+                createJobArchivePartition(month)
+
+            ids = [jobid for jobid, _ in batch]
+            jobdb.execute_sql(
+                'WITH moved AS (DELETE FROM "%s"."%s" WHERE "%s" = ANY(%%s) '
+                'RETURNING %s) INSERT INTO %s (%s) SELECT %s FROM moved' % (
+                    JOBTABLE.schema, JOBTABLE.table, JOBTABLE.id_field,
+                    columns, _archiveTable(), columns, columns), (ids,))
+        count += len(ids)
+        log.info('Archived %s jobs' % count)
+
+    return count
+
+
+def trimActiniaCoreResp(resp):
+    """ Method to reduce the actinia-core response stored in the jobtable
+
+    Large fields are moved to the payload store and referenced. If this
+    fails, the full response is kept in the jobtable.
+
+    Args:
+    resp (dict): actinia-core response
+
+    Returns:
+    resp (dict): the response to store
+    """
+    try:
+        return storePayloads(resp)
+    except Exception as e:
+        log.error('Could not store payloads of actinia-core response')
+        log.error(str(e))
+        return resp
+
+
+def _newJobRow(rule_configuration, job_description, process, feature_type,
+               actiniaCoreResp, utcnow, trim=True, actiniaCoreUrl=None):
+    """ Build the values of a new job for insertNewJob and insertNewJobs,
+    a job without actinia-core response is QUEUED
+    """
+    status = 'QUEUED'
+    actiniaCoreJobID = None
+    if actiniaCoreResp is not None:
+        status = 'PENDING'
+        actiniaCoreJobUrl = parseActiniaAsyncStatusResponse(
+            actiniaCoreResp,
+            "urls.status"
+        )
+        actiniaCoreJobID = parseActiniaIdFromUrl(actiniaCoreJobUrl)
+
+        if trim:
+            actiniaCoreResp = trimActiniaCoreResp(actiniaCoreResp)
+
+    return {
+        'rule_configuration': rule_configuration,
+        'job_description': job_description,
+        'status': status,
+        'time_created': utcnow,
+        'time_modified': utcnow,
+        'process': process,
+        'feature_type': feature_type,
+        'actinia_core_response': actiniaCoreResp,
+        'actinia_core_jobid': actiniaCoreJobID,
+        'actinia_core_url': actiniaCoreUrl
+    }
+
+
+def _newJobRows(jobs, utcnow, trim=True):
+    """ Build the values of new jobs, each a tuple of the args of
+    insertNewJob where the actinia-core url is optional
+    """
+    return [_newJobRow(*job[:5], utcnow, trim=trim,
+                       actiniaCoreUrl=job[5] if len(job) > 5 else None)
+            for job in jobs]
 
 
 def insertNewJob(
@@ -64,13 +477,17 @@ def insertNewJob(
         job_description,
         process,
         feature_type,
-        actiniaCoreResp
+        actiniaCoreResp,
+        actiniaCoreUrl=None
 ):
     """Insert new job into jobtabelle.
 
     Args:
       rule_configuration (dict): original preProcessChain
       job_description (TODO): enriched preProcessChain with geometadata
+      actiniaCoreResp (dict): response of actinia-core, None to insert a
+        QUEUED job for submitQueuedJob
+      actiniaCoreUrl (str): url of the actinia-core backend of the job
 
     Returns:
       record (dict): the new record
@@ -78,69 +495,173 @@ def insertNewJob(
     """
     utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    actiniaCoreJobUrl = parseActiniaAsyncStatusResponse(
-        actiniaCoreResp,
-        "urls.status"
-    )
-    actiniaCoreJobID = parseActiniaIdFromUrl(actiniaCoreJobUrl)
+    query = Job.insert(**_newJobRow(
+        rule_configuration, job_description, process, feature_type,
+        actiniaCoreResp, utcnow, actiniaCoreUrl=actiniaCoreUrl)
+    ).returning(Job)
+
+    # INSERT ... RETURNING gives back the stored record in one round trip
+    with jobdb:
+        queryResult = query.execute()[0]
+        record = model_to_dict(queryResult)
+        notifyJobChanges([record])
+    jobRouter.changed(record[JOBTABLE.id_field])
 
-    if current_app.debug is False:
-        smallRes = dict()
-        smallRes['message'] = actiniaCoreResp.get('message', None)
-        smallRes['process_results'] = actiniaCoreResp.get(
-            'process_results', None)
-        actiniaCoreResp = smallRes
+    log.info("Created new job with id " + str(record['idpk_jobs']) + ".")
 
-        # actiniaCoreResp = smallifyResp(actiniaCoreResp)
-    # TODO: test in debug, then remove
-    # actiniaCoreResp = smallifyResp(actiniaCoreResp)
+    jobdb.close()
 
-    job = Job(**{
-        'rule_configuration': rule_configuration,
-        'job_description': job_description,
-        'status': 'PENDING',
-        'time_created': utcnow,
-        'process': process,
-        'feature_type': feature_type,
-        'actinia_core_response': actiniaCoreResp,
-        'actinia_core_jobid': actiniaCoreJobID
-    })
+    return record
+
+
+def insertNewJobs(jobs):
+    """Insert new jobs into jobtabelle with one multi-row INSERT
+
+    The large fields of all actinia-core responses are stored with one
+    more INSERT in the same transaction. If this fails, the full
+    responses are kept in the jobtable.
+
+    Args:
+      jobs (list): for each job a tuple of rule_configuration,
+      job_description, process, feature_type, actinia-core response and
+      optionally actinia-core url as for insertNewJob
+
+    Returns:
+      records (list): the new records in the order of jobs
+
+    """
+    utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    rows = _newJobRows(jobs, utcnow, trim=False)
+    if not rows:
+        return []
+
+    responses = [row['actinia_core_response'] for row in rows]
+    payloads = []
+
+    def keepResponses(e):
+        log.error('Could not store payloads of actinia-core responses')
+        log.error(str(e))
+        for row, resp in zip(rows, responses):
+            row['actinia_core_response'] = resp
+
+    try:
+        for row in rows:
+            if row['actinia_core_response'] is not None:
+                row['actinia_core_response'], rowPayloads = splitPayloads(
+                    row['actinia_core_response'])
+                payloads += rowPayloads
+    except Exception as e:
+        keepResponses(e)
+        payloads = []
 
     with jobdb:
-        job.save()
+        if payloads:
+            try:
+                # savepoint, so the jobs are inserted anyway
+                with jobdb.atomic():
+                    insertPayloads(payloads)
+            except Exception as e:
+                keepResponses(e)
 
-        queryResult = Job.select().where(Job.time_created == utcnow).get()
+        query = Job.insert_many(rows).returning(Job)
+        records = [model_to_dict(row) for row in query.execute()]
+        notifyJobChanges(records)
+    for record in records:
+        jobRouter.changed(record[JOBTABLE.id_field])
 
-    record = model_to_dict(queryResult)
+    # ids are assigned in the order of the inserted rows
+    records.sort(key=lambda record: record[JOBTABLE.id_field])
 
-    log.info("Created new job with id " + str(record['idpk_jobs']) + ".")
+    log.info("Created %s new jobs." % len(records))
 
     jobdb.close()
 
-    return record
+    return records
+
+
+def parseJobFields(fields, model=Job):
+    """ Method to translate the "fields" query arg into jobtable columns
+
+    The id field is always added so records can still be referenced.
+
+    Args:
+    fields (str): comma separated column names, empty for all columns
+    model (Model): Job or JobArchive
+
+    Returns:
+    columns (list): the peewee fields to select (empty list selects all)
+    or None if an unknown column was requested
+    """
+    if not fields:
+        return []
+
+    columns = [getattr(model, JOBTABLE.id_field)]
+    for name in fields.split(','):
+        name = name.strip()
+        if not name or name == JOBTABLE.id_field:
+            continue
+        if name not in model._meta.fields:
+            log.error('Unknown field "%s" requested' % name)
+            return None
+        columns.append(model._meta.fields[name])
 
+    return columns
 
-def getJobById(jobid):
+
+def getJobById(jobid, columns=None):
     """ Method to read job from jobtabelle by id
 
+    Jobs which are not found in the jobtable are read from the archive.
+    The payloads of the actinia-core response are resolved before the
+    record is cached, so they are not read again for a cached job.
+
     Args:
     jobid (int): id of job
+    columns (list): fields from parseJobFields to read, None for all
 
     Returns:
     record (dict): the record matching the id
     """
+    columns = columns or []
+    if JOBCACHE.size > 0:
+        record = jobCache.get(jobid)
+        if record is not None:
+            log.debug("Information read from cache for job with id "
+                      + str(jobid) + ".")
+            if columns:
+                return {column.name: record.get(column.name)
+                        for column in columns}
+            return record
+        jobEventListener.start()
+
+    token = jobCache.token(jobid)
+    db = jobRouter.read(jobid)
     try:
-        with jobdb:
-            queryResult = Job.select().where(
-                getattr(Job, JOBTABLE.id_field) == jobid).get()
-        record = model_to_dict(queryResult)
+        with db:
+            try:
+                queryResult = Job.select(*columns).where(
+                    getattr(Job, JOBTABLE.id_field) == jobid).get(db)
+                record = model_to_dict(queryResult, only=columns)
+            except Job.DoesNotExist:
+                archiveColumns = [getattr(JobArchive, column.name)
+                                  for column in columns]
+                queryResult = JobArchive.select(*archiveColumns).where(
+                    getattr(JobArchive, JOBTABLE.id_field) == jobid).get(db)
+                record = model_to_dict(queryResult, only=archiveColumns)
+            if record.get('actinia_core_response'):
+                record['actinia_core_response'] = resolvePayloads(
+                    record['actinia_core_response'], db)
         log.info("Information read from jobtable for job with id "
                  + str(record['idpk_jobs']) + ".")
 
-    except Job.DoesNotExist:
+    except JobArchive.DoesNotExist:
         record = None
 
-    jobdb.close()
+    if not columns:
+        jobCache.put(jobid, record, token)
+
+    db.close()
 
     return record
 
@@ -153,123 +674,647 @@ def getAllIds():
     Returns:
     jobIds (list): the record matching the id
     """
-    with jobdb:
-        queryResult = Job.select(getattr(Job, JOBTABLE.id_field)).dicts()
+    db = jobRouter.read()
+    with db:
+        queryResult = list(Job.select(
+            getattr(Job, JOBTABLE.id_field)).dicts().execute(db))
 
     jobIds = []
 
-    # iterating reopens db connection!!
     for i in queryResult:
         jobIds.append(i[JOBTABLE.id_field])
 
     log.debug("Information read from jobtable.")
 
-    jobdb.close()
+    db.close()
 
     return jobIds
 
 
-def getAllJobs(filters, process):
-    """ Method to read all jobs from jobtabelle with filter
+# status of jobs which are sent to actinia-core and not yet finished
+OUTSTANDING_STATUS = ['PENDING', 'RUNNING']
 
-    Args: filters (ImmutableMultiDict): the args from the HTTP call
+
+def getBackendLoad():
+    """ Method to count the outstanding jobs of each actinia-core backend
 
     Returns:
-    jobs (list): the records matching the filter
+    load (dict): number of PENDING or RUNNING jobs by actinia_core_url,
+    jobs without url are counted for None
     """
-    log.debug('Received query for jobs')
+    db = jobRouter.read()
+    with db:
+        queryResult = list(Job.select(
+            Job.actinia_core_url, fn.COUNT(Job.idpk_jobs).alias('count')
+        ).where(Job.status.in_(OUTSTANDING_STATUS)).group_by(
+            Job.actinia_core_url).dicts().execute(db))
+
+    db.close()
+
+    return {row['actinia_core_url']: row['count'] for row in queryResult}
+
+
+def getStaleJobs(staleBefore, limit, position=None):
+    """ Method to read outstanding jobs which were not changed since
+    staleBefore, the least recently changed first
+
+    The jobs are found by the index on status and time_modified.
+
+    Args:
+    staleBefore (datetime): time before which the jobs were last changed
+    limit (int): maximum number of jobs
+    position (dict): "id" and time_modified "value" of the last job read
+    before, to read the next jobs
+
+    Returns:
+    jobs (list): id, status, version, time_modified, actinia_core_jobid
+    and actinia_core_url of each job
+    """
+    idField = getattr(Job, JOBTABLE.id_field)
+    condition = Job.status.in_(OUTSTANDING_STATUS) \
+        & (Job.time_modified < staleBefore) \
+        & Job.actinia_core_jobid.is_null(False)
+    if position is not None:
+        condition &= keysetCondition(Job.time_modified, False, idField,
+                                     position)
+
+    query = Job.select(
+        idField, Job.status, Job.version, Job.time_modified,
+        Job.actinia_core_jobid, Job.actinia_core_url
+    ).where(condition).order_by(Job.time_modified, idField).limit(limit)
+
+    with jobdb:
+        jobs = list(query.dicts())
+
+    jobdb.close()
+
+    return jobs
+
+
+def touchJob(jobid, version):
+    """ Method to mark an outstanding job as polled
+
+    Only time_modified is set, so the job is not stale until stale_seconds
+    passed again. A job changed since it was read keeps its values.
+
+    Args:
+    jobid (int): id of the job
+    version (int): version of the job when it was read
+
+    Returns:
+    touched (bool): True if the job was marked
+    """
+    utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    idField = getattr(Job, JOBTABLE.id_field)
+
+    query = Job.update(time_modified=utcnow).where(
+        (idField == jobid)
+        & (Job.version == version)
+        & (Job.status.in_(OUTSTANDING_STATUS)))
+
+    with jobdb:
+        touched = query.execute() > 0
+
+    jobdb.close()
+
+    return touched
+
+
+@contextmanager
+def advisoryLock(key):
+    """ Method to hold a postgres advisory lock while the block runs
+
+    The lock is taken on a dedicated connection, as a connection of the
+    pool could be handed to another thread while it is held. Closing the
+    connection releases the lock, also if the worker dies.
+
+    Args:
+    key (int): key of the lock
+
+    Returns:
+    locked (bool): False if another session holds the lock
+    """
+    conn = psycopg2.connect(
+        host=JOBTABLE.host,
+        port=JOBTABLE.port,
+        dbname=JOBTABLE.database,
+        user=JOBTABLE.user,
+        password=JOBTABLE.pw
+    )
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', (key,))
+            locked = cursor.fetchone()[0]
+        yield locked
+    finally:
+        conn.close()
+
 
+# query args which are no filters on jobtable columns
+RESERVED_ARGS = ['limit', 'after', 'fields', 'archived', 'order_by']
+
+# suffixes of filter args, e.g. time_created__gte=2019-01-01
+FILTER_OPERATORS = {
+    'in': 'IN',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+    'contains': '@>'
+}
+
+
+def parseFilterTime(value):
+    """ Method to read a time filter value
+
+    Args:
+    value (str): ISO 8601 date or time, UTC if without offset
+
+    Returns:
+    time (datetime): naive UTC time as stored in the jobtable
+    """
+    time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc).replace(tzinfo=None)
+    return time
+
+
+def parseFilterValue(field, value):
+    """ Method to check a filter value against the type of its column
+
+    Args:
+    field (Field): the filtered column
+    value (str): the value from the query arg
+
+    Returns:
+    value: the value to compare the column with, raises ValueError if
+    invalid
+    """
+    if isinstance(field, AutoField):
+        return int(value)
+    if isinstance(field, DateTimeField):
+        return parseFilterTime(value)
+    return value
+
+
+def orderColumns(model=Job):
+    """ Method to list the columns jobs can be ordered by besides the id
+
+    Args:
+    model (Model): Job or JobArchive
+
+    Returns:
+    columns (list): names of the columns with a declared index on the
+    column and the id
+    """
+    return [columns[0] for columns, _ in model._meta.indexes
+            if list(columns[1:]) == [JOBTABLE.id_field]]
+
+
+def parseJobOrder(orderBy, model=Job):
+    """ Method to translate the "order_by" query arg into a column
+
+    Only columns of orderColumns can be used, prefixed with "-" for
+    descending order. Jobs are always ordered by id in addition.
+
+    Args:
+    orderBy (str): column name, None to order by id
+    model (Model): Job or JobArchive
+
+    Returns:
+    order (tuple): the column and True if descending or None if invalid
+    """
+    idField = getattr(model, JOBTABLE.id_field)
+    if not orderBy:
+        return idField, False
+
+    descending = orderBy.startswith('-')
+    field = model._meta.fields.get(orderBy.lstrip('-'))
+    if field is None or not (field is idField
+                             or field.name in orderColumns(model)):
+        log.error('Cannot order jobs by "%s"' % orderBy)
+        return None
+
+    return field, descending
+
+
+def encodeJobCursor(record, orderBy=None):
+    """ Method to create an opaque cursor pointing behind a record
+
+    Args:
+    record (dict): the last record of a page
+    orderBy (str): the "order_by" query arg of the listing
+
+    Returns:
+    cursor (str): urlsafe cursor to pass as "after" to continue listing
+    """
+    cursor = {JOBTABLE.id_field: record[JOBTABLE.id_field]}
+    if orderBy:
+        value = record.get(orderBy.lstrip('-'))
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        cursor['order_by'] = orderBy
+        cursor['value'] = value
+    cursor = json.dumps(cursor)
+    return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+
+
+def decodeJobCursor(cursor, orderBy=None, model=Job):
+    """ Method to read a cursor created by encodeJobCursor
+
+    Args:
+    cursor (str): the cursor
+    orderBy (str): the "order_by" query arg, must be the same as when
+    the cursor was created
+    model (Model): Job or JobArchive
+
+    Returns:
+    position (dict): "id" and "value" of the order column of the last job
+    already listed or None if invalid
+    """
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if decoded.get('order_by') != (orderBy or None):
+            raise ValueError('cursor was created for another order')
+        value = decoded.get('value')
+        field = model._meta.fields.get((orderBy or '').lstrip('-'))
+        if value is not None and isinstance(field, DateTimeField):
+            value = datetime.fromisoformat(value)
+        return {'id': int(decoded[JOBTABLE.id_field]), 'value': value}
+    except Exception as e:
+        log.error('Invalid cursor "%s": %s' % (cursor, str(e)))
+        return None
+
+
+def parseJobFilters(filters, model=Job):
+    """ Method to check the filters for listing jobs
+
+    Filters are query args "<column>=<value>" for exact matches and
+    "<column>__<operator>=<value>" with an operator of FILTER_OPERATORS.
+    "in" takes comma separated values, "contains" a JSON document for JSON
+    columns. "<json column>.<key>.<key>=<value>" matches a (nested) string
+    value of a JSON column, e.g. job_description.feature_uuid=... . Both
+    JSON filters are only allowed on indexed JSON columns.
+
+    Args:
+    filters (ImmutableMultiDict): the args from the HTTP call
+    model (Model): Job or JobArchive
+
+    Returns:
+    conditions (list): for each filter the column, the operator of
+    FILTER_OPERATORS or "=" and the parsed value or None if a filter is
+    invalid
+    """
+    conditions = []
+    if not filters:
+        return conditions
+
+    log.debug("Found filters: " + str(filters))
+    keys = [key for key in filters if key not in RESERVED_ARGS]
+
+    for key in keys:
+        value = filters[key]
+        name, _, operator = key.partition('__')
+        name, _, path = name.partition('.')
+        field = model._meta.fields.get(name)
+
+        log.debug("Filter " + str(key) + " with value " + str(value))
+
+        if field is None:
+            log.error('Unknown filter "%s"' % key)
+            return None
+
+        isJson = isinstance(field, BinaryJSONField)
+        if isJson and not field.index:
+            log.error('Cannot filter by not indexed "%s"' % name)
+            return None
+        if (path or operator == 'contains') and not isJson:
+            log.error('Cannot filter "%s" by JSON' % name)
+            return None
+        if operator and (path or operator not in FILTER_OPERATORS):
+            log.error('Unknown filter operator in "%s"' % key)
+            return None
+
+        try:
+            if path:
+                for pathKey in reversed(path.split('.')):
+                    value = {pathKey: value}
+                operator = 'contains'
+            elif operator == 'contains':
+                value = json.loads(value)
+            elif isJson:
+                raise ValueError('JSON columns need a JSON filter')
+            elif operator == 'in':
+                value = [parseFilterValue(field, v)
+                         for v in value.split(',')]
+            else:
+                value = parseFilterValue(field, value)
+        except ValueError as e:
+            log.error('Invalid filter "%s": %s' % (key, str(e)))
+            return None
+
+        conditions.append((field, operator or '=', value))
+
+    return conditions
+
+
+def buildJobFilter(filters, process, model=Job):
+    """ Method to build the where clause for listing jobs
+
+    Args:
+    filters (ImmutableMultiDict): the args from the HTTP call, see
+    parseJobFilters
+    process (str): the process to list jobs for ('test' lists all)
+    model (Model): Job or JobArchive
+
+    Returns:
+    query (Expression): the where clause or None if a filter is invalid
+    """
     if process == 'test':
         query = Expression('a', '=', 'a')
     else:
-        query = Expression(getattr(Job, 'process'), '=', process)
+        query = Expression(getattr(model, 'process'), '=', process)
 
-    if filters:
-        log.debug("Found filters: " + str(filters))
-        keys = [key for key in filters]
+    conditions = parseJobFilters(filters, model)
+    if conditions is None:
+        return None
 
-        for key in keys:
+    for field, operator, value in conditions:
+        if operator == 'contains':
+            exp = field.contains(value)
+        elif operator == 'in':
+            exp = field.in_(value)
+        else:
+            # even though operators are listed as == and & in peewee
+            # docs, for Expression creation use '=' and 'AND'.
+            exp = Expression(field, FILTER_OPERATORS.get(operator, '='),
+                             value)
+        query = Expression(query, 'AND', exp)
 
-            try:
-                getattr(Job, key)
-            except Exception as e:
-                log.warning(str(e))
-                continue
+    return query
 
-            log.debug("Filter " + str(key)
-                      + " with value " + str(filters[key]))
 
-            if isinstance(getattr(Job, key), AutoField):
-                try:
-                    int(filters[key])
-                except Exception as e:
-                    log.error(str(e))
-                    jobdb.close()
-                    return
+def iterJobPages(query, limit=None, position=None, columns=None, model=Job,
+                 order=None):
+    """ Generator reading jobs page by page ordered by id or another column
 
-            try:
-                # even though operators are listed as == and & in peewee docs,
-                # for Expression creation use '=' and 'AND'.
-                exp = Expression(getattr(Job, key), '=', filters[key])
-                query = Expression(query, 'AND', exp)
-            except AttributeError as e:
-                log.error(str(e))
+    Each page is read with a keyset condition on the order column and the
+    id instead of an OFFSET, so every page is a range scan of the index on
+    both columns and at most JOBTABLE.page_size records are held in memory
+    at once. As in the index, jobs without a value in the order column
+    follow the others in ascending and precede them in descending order.
+    They are read as a segment of their own.
 
-    with jobdb:
-        queryResult = Job.select().where(query).dicts()
+    Args:
+    query (Expression): the where clause from buildJobFilter
+    limit (int): maximum number of jobs to read, None to read all
+    position (dict): from decodeJobCursor for the last job already listed
+    columns (list): fields from parseJobFields to read, None for all
+    model (Model): Job or JobArchive
+    order (tuple): from parseJobOrder, None to order by id
+
+    Yields:
+    record (dict): one job
+    """
+    idField = getattr(model, JOBTABLE.id_field)
+    orderField, descending = order or (idField, False)
+    columns = columns or []
+    if columns and orderField.name not in [c.name for c in columns]:
+        columns = columns + [orderField]
+    remaining = limit
+
+    orderBy = [orderField] if orderField is idField else [orderField, idField]
+    if descending:
+        orderBy = [field.desc() for field in orderBy]
+    else:
+        orderBy = [field.asc() for field in orderBy]
 
-    jobs = []
-    # iterating reopens db connection!!
-    for i in queryResult:
-        jobs.append(i)
+    # for each segment if it holds the jobs without value, None for the id
+    if orderField is idField:
+        segments = [None]
+    else:
+        segments = [True, False] if descending else [False, True]
+        if position is not None:
+            segments = segments[segments.index(position['value'] is None):]
 
-    log.info("Found " + str(len(jobs)) + " results for query.")
+    for isNull in segments:
+        segmentQuery = model.select(*columns).where(query)
+        if isNull is not None:
+            segmentQuery = segmentQuery.where(orderField.is_null(isNull))
 
-    jobdb.close()
+        while remaining is None or remaining > 0:
+            pageSize = JOBTABLE.page_size
+            if remaining is not None:
+                pageSize = min(pageSize, remaining)
+
+            pageQuery = segmentQuery
+            if position is not None:
+                pageQuery = pageQuery.where(
+                    keysetCondition(orderField, descending, idField,
+                                    position))
+            pageQuery = pageQuery.order_by(*orderBy).limit(pageSize).dicts()
+
+            db = jobRouter.read()
+            with db:
+                page = list(pageQuery.execute(db))
+            db.close()
+
+            for record in page:
+                yield record
+
+            if remaining is not None:
+                remaining -= len(page)
+            if len(page) < pageSize:
+                break
+            position = {'id': page[-1][JOBTABLE.id_field],
+                        'value': page[-1][orderField.name]}
+
+        # the next segment is read from its start
+        position = None
+
+
+def keysetCondition(orderField, descending, idField, position):
+    """ Method to build the condition for jobs after a position
+
+    The condition continues the segment of the position, see iterJobPages.
+    Jobs with a value are compared as row values (value, id), which
+    postgres resolves by a range scan of the index on both columns.
+
+    Args:
+    orderField (Field): the order column
+    descending (bool): True if ordered descending
+    idField (Field): the id column
+    position (dict): "id" and order column "value" of the last listed job
+
+    Returns:
+    condition (Expression): where clause for the following jobs
+    """
+    if orderField is idField or position['value'] is None:
+        key = idField
+        last = position['id']
+    else:
+        key = Tuple(orderField, idField)
+        last = Tuple(position['value'], position['id'])
+    return key < last if descending else key > last
+
+
+def iterJobs(filters, process, limit=None, after=None, fields=None,
+             archived=False, orderBy=None):
+    """ Method to read jobs from jobtabelle with filter as generator
+
+    Args:
+    filters (ImmutableMultiDict): the args from the HTTP call
+    process (str): the process to list jobs for
+    limit (int): maximum number of jobs to read, None to read all
+    after (str): cursor from encodeJobCursor to continue a listing
+    fields (str): comma separated columns to read, None for all
+    archived (bool): read archived jobs instead of the jobtable
+    orderBy (str): indexed column to order by, "-" prefix for descending
+
+    Returns:
+    jobs (generator): the records matching the filter or None if filter,
+    fields, order or cursor are invalid
+    """
+    log.debug('Received query for jobs')
+
+    model = JobArchive if archived else Job
+
+    query = buildJobFilter(filters, process, model)
+    if query is None:
+        return None
+
+    columns = parseJobFields(fields, model)
+    if columns is None:
+        return None
+
+    order = parseJobOrder(orderBy, model)
+    if order is None:
+        return None
+
+    position = None
+    if after:
+        position = decodeJobCursor(after, orderBy, model)
+        if position is None:
+            return None
+
+    return iterJobPages(query, limit, position, columns, model, order)
+
+
+def iterJobHistory(filters, process):
+    """ Method to read all jobs of the jobtable and the archive for export
+
+    The jobs are read with a server-side cursor fetching
+    JOBTABLE.export_chunk rows at a time, so exporting does not depend on
+    the number of jobs. The connection is held until the generator is
+    exhausted or closed.
+
+    Args:
+    filters (ImmutableMultiDict): the args from the HTTP call
+    process (str): the process to export jobs for ('test' for all)
+
+    Returns:
+    jobs (generator): the records matching the filter, first of the
+    jobtable then of the archive, each ordered by id or None if a filter
+    is invalid
+    """
+    queries = []
+    for model in [Job, JobArchive]:
+        query = buildJobFilter(filters, process, model)
+        if query is None:
+            return None
+        queries.append(model.select().where(query).order_by(
+            getattr(model, JOBTABLE.id_field)).dicts())
+
+    return _iterServerSide(queries)
+
+
+def _iterServerSide(queries):
+    db = jobRouter.read()
+    try:
+        # named cursors only exist inside a transaction
+        with db:
+            for query in queries:
+                for record in ServerSide(query.bind(db),
+                                         array_size=JOBTABLE.export_chunk):
+                    yield record
+    finally:
+        db.close()
+
+
+def getAllJobs(filters, process):
+    """ Method to read all jobs from jobtabelle with filter
+
+    Args: filters (ImmutableMultiDict): the args from the HTTP call
+
+    Returns:
+    jobs (list): the records matching the filter
+    """
+    jobs = iterJobs(filters, process)
+    if jobs is None:
+        return None
+
+    jobs = list(jobs)
+
+    log.info("Found " + str(len(jobs)) + " results for query.")
 
     return jobs
 
 
-def cancelJobById(jobid):
+def cancelJobById(jobid, fromStatus=None):
     """ Method to change the status of a job to 'TERMINATED' in the jobtabelle
     by using its jobid
 
+    The status is only changed if the job is in one of fromStatus, checked
+    by the same UPDATE. Otherwise the record is returned unchanged.
+
     Args:
     jobid (int): id of job
+    fromStatus (list): status of jobs to cancel, None for all status which
+    may be terminated
 
     Returns:
     record (dict): the record matching the id
     """
     utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    idField = getattr(Job, JOBTABLE.id_field)
+    if fromStatus is None:
+        fromStatus = JOB_STATUS_PREDECESSORS['TERMINATED']
+
+    query = Job.update(
+        status='TERMINATED',
+        time_ended=utcnow,
+        time_modified=utcnow,
+        version=Job.version + 1
+    ).where(
+        (idField == jobid)
+        & (Job.status.in_(fromStatus))
+    ).returning(Job)
 
     try:
         with jobdb:
-            queryResult = Job.select().where(
-                getattr(Job, JOBTABLE.id_field) == jobid).get()
-        record = model_to_dict(queryResult)
-        log.debug("Information read from jobtable.")
+            queryResult = list(query.execute())
+            changed = len(queryResult) > 0
+            if not changed:
+                # job already ended, keep its status
+                queryResult = [Job.select().where(idField == jobid).get()]
+            record = model_to_dict(queryResult[0])
+            if changed:
+                notifyJobChanges([record])
+        if changed:
+            jobChanged(record[JOBTABLE.id_field])
     except Job.DoesNotExist:
+        log.warning("Job does not exist and can therefore not be cancelled")
         record = None
-    try:
-        query = Job.update(
-            status='TERMINATED',
-            time_ended=utcnow
-        ).where(
-            getattr(Job, JOBTABLE.id_field) == jobid
-        )
-        with jobdb:
-            query.execute()
-            queryResult2 = Job.select().where(
-                getattr(Job, JOBTABLE.id_field) == jobid).get()
-        record = model_to_dict(queryResult2)
     except Exception as e:
         log.error('Could not set the status to "TERMINATED" '
                   + 'and the time_ended in the jobtable.')
         log.error(str(e))
         record = None
 
-    log.info("Information updated in jobtable for job with id "
-             + str(record['idpk_jobs']) + ".")
+    if record is not None:
+        log.info("Information updated in jobtable for job with id "
+                 + str(record['idpk_jobs']) + ".")
 
     jobdb.close()
 
@@ -279,6 +1324,13 @@ def cancelJobById(jobid):
 def updateJobByResourceID(resourceId, resp, status):
     """ Method to update job in jobtabelle when processing status changed
 
+    The status is only changed if the transition is allowed by
+    JOB_STATUS_PREDECESSORS. The check and the update are done by a single
+    conditional UPDATE ... RETURNING, so late or concurrent webhooks can not
+    overwrite a status which was reached in between. The payloads of the
+    response are only stored if the job was updated, in the same
+    transaction.
+
     Args:
     resourceId (str): actinia-core resourceId
     resp (dict): actinia-core response
@@ -288,97 +1340,280 @@ def updateJobByResourceID(resourceId, resp, status):
     updatedRecord (TODO): the updated record
     """
     utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    gdiStatus = JOB_STATUS.get(status)
+    if gdiStatus is None:
+        log.error('Could not set the status to actinia-core status:'
+                  + status + '(Status not found.)')
+        return None, None, None
+
+    fullResp = resp
+    resp, payloads = _splitResponse(resp)
+
+    values = {
+        'status': gdiStatus,
+        'actinia_core_response': resp,
+        'time_modified': utcnow,
+        'version': Job.version + 1
+    }
+    if gdiStatus == 'RUNNING':
+        # keep the time of the first running webhook
+        values['time_started'] = fn.COALESCE(Job.time_started, utcnow)
+        # TODO: check if time_estimated can be set
+    elif gdiStatus in TERMINAL_STATUS:
+        values['time_ended'] = utcnow
+
+    resourceField = getattr(Job, 'actinia_core_jobid')
+    predecessors = JOB_STATUS_PREDECESSORS[gdiStatus]
+
     try:
+        log.debug("Update status to " + status + " for job with "
+                  + "actinia-core id " + resourceId + ".")
         with jobdb:
-            queryResult = Job.select().where(
-                getattr(Job, 'actinia_core_jobid') == resourceId).get()
-        record = model_to_dict(queryResult)
-        log.debug("Information read from jobtable for job with id "
-                  + str(record['idpk_jobs']) + ".")
+            queryResult = []
+            if predecessors:
+                queryResult = list(Job.update(**values).where(
+                    (resourceField == resourceId)
+                    & (Job.status.in_(predecessors))
+                ).returning(Job).execute())
+            updated = len(queryResult) > 0
+            if not updated:
+                # nothing to change or transition not allowed
+                queryResult = [Job.select().where(
+                    resourceField == resourceId).get()]
+            record = model_to_dict(queryResult[0])
+            if updated and payloads:
+                _storeJobPayloads([record], payloads, [fullResp])
+            if updated:
+                notifyJobChanges([record])
+        if updated:
+            jobChanged(record[JOBTABLE.id_field])
     except Job.DoesNotExist:
         log.warning("Job does not exist and can therefore not be updated")
         return None, None, None
+    except Exception as e:
+        log.error('Could not set the status to actinia-core status: ' + status)
+        log.error(str(e))
+        return None, None, None
 
-    # actinia-gdi_["PENDING", "RUNNING", "SUCCEES", "ERROR", "TERMINATED"]
-    # actinia-core [accepted, running, finished, error, terminated]
+    try:
+        gnosUuid = record['job_description']['feature_uuid']
+    except Exception:
+        log.warning('Feature has no uuid')
+        gnosUuid = None
 
+    if updated:
+        log.info("Updated status to " + status + " for job with id "
+                 + str(record['idpk_jobs']) + ".")
+    elif record['status'] == gdiStatus:
+        log.debug('Status already set to "' + gdiStatus + '"')
+    else:
+        log.warning('Ignored status "' + gdiStatus + '" for job with id '
+                    + str(record['idpk_jobs']) + ' in status "'
+                    + str(record['status']) + '"')
+
+    jobdb.close()
+
+    return record, gnosUuid, utcnow
+
+
+def _splitResponse(resp):
+    """ Split the payloads off an actinia-core response, if this fails the
+    full response is kept
+    """
     try:
-        log.debug("Update status to " + status + " for job with id "
-                  + str(record['idpk_jobs']) + ".")
+        return splitPayloads(resp)
+    except Exception as e:
+        log.error('Could not store payloads of actinia-core response')
+        log.error(str(e))
+        return resp, []
 
-        gdiStatus = record['status']
 
-        try:
-            gnosUuid = record['job_description']['feature_uuid']
-        except Exception:
-            log.warning('Feature has no uuid')
-            gnosUuid = None
-
-        if current_app.debug is False:
-            smallRes = dict()
-            smallRes['message'] = resp.get('message', None)
-            smallRes['process_results'] = resp.get('process_results', None)
-            resp = smallRes
-
-            # resp = smallifyResp(resp)
-        # TODO: test in debug, then remove
-        # resp = smallifyResp(resp)
-
-        if status == 'accepted':
-            log.debug('Status already set to "PENDING"')
-            return record, gnosUuid, utcnow
-
-        elif status == 'running':
-            if gdiStatus == 'RUNNING':
-                log.debug('Status already set to "RUNNING"')
-                return record, gnosUuid, utcnow
-
-            query = Job.update(
-                status='RUNNING',
-                actinia_core_response=resp,
-                time_started=utcnow
-                # TODO: check if time_estimated can be set
-                # time_estimated=
-            ).where(
-                getattr(Job, 'actinia_core_jobid') == resourceId
-            )
-
-        elif status in ['finished', 'error', 'terminated']:
-
-            if status == 'finished':
-                gdiStatus = 'SUCCESS'
-            elif status == 'error':
-                gdiStatus = 'ERROR'
-            elif status == 'terminated':
-                gdiStatus = 'TERMINATED'
-
-            query = Job.update(
-                status=gdiStatus,
-                actinia_core_response=resp,
-                time_ended=utcnow
-            ).where(
-                getattr(Job, 'actinia_core_jobid') == resourceId
-            )
+def _storeJobPayloads(records, payloads, responses):
+    """ Store the payloads of the responses of updated jobs in their
+    transaction, if this fails the full responses are written to the jobs
+    """
+    try:
+        # savepoint, so the update of the jobs is kept
+        with jobdb.atomic():
+            insertPayloads(payloads)
+    except Exception as e:
+        log.error('Could not store payloads of actinia-core responses')
+        log.error(str(e))
+        idField = getattr(Job, JOBTABLE.id_field)
+        for record, resp in zip(records, responses):
+            Job.update(actinia_core_response=resp).where(
+                idField == record[JOBTABLE.id_field]).execute()
+            if 'actinia_core_response' in record:
+                record['actinia_core_response'] = resp
 
-        else:
-            log.error('Could not set the status to actinia-core status:'
-                      + status + '(Status not found.)')
-            return None, None, None
 
-        with jobdb:
-            query.execute()
-            queryResult = Job.select().where(
-                getattr(Job, 'actinia_core_jobid') == resourceId).get()
+def updateJobsByResourceIDs(updates):
+    """ Method to write buffered running status updates in one query
 
-        record = model_to_dict(queryResult)
+    All updates are applied by a single UPDATE ... FROM (VALUES ...) with
+    the same status check as updateJobByResourceID. The payloads of the
+    updated jobs are stored in the same transaction with one INSERT.
+
+    Args:
+    updates (dict): (actinia-core response, time of the webhook) by
+    actinia-core resourceId
+
+    Returns:
+    count (int): number of updated jobs
+    """
+    rows = []
+    splitResps = dict()
+    for resourceId, (resp, utcnow) in updates.items():
+        small, payloads = _splitResponse(resp)
+        splitResps[resourceId] = (resp, payloads)
+        rows.append((resourceId, json.dumps(small), utcnow))
+    values = ValuesList(rows, columns=('resource_id', 'resp', 'utcnow'),
+                        alias='updates')
+
+    query = Job.update(
+        status='RUNNING',
+        actinia_core_response=values.c.resp.cast('jsonb'),
+        time_started=fn.COALESCE(
+            Job.time_started, values.c.utcnow.cast('timestamp')),
+        time_modified=values.c.utcnow.cast('timestamp'),
+        version=Job.version + 1
+    ).from_(values).where(
+        (getattr(Job, 'actinia_core_jobid') == values.c.resource_id)
+        & (Job.status.in_(JOB_STATUS_PREDECESSORS['RUNNING']))
+    ).returning(
+        getattr(Job, JOBTABLE.id_field), Job.status, Job.process,
+        getattr(Job, 'actinia_core_jobid'), Job.version
+    ).dicts()
+
+    try:
+        with jobdb:
+            records = list(query.execute())
+            updated = [splitResps[record['actinia_core_jobid']]
+                       for record in records]
+            payloads = [payload for _, jobPayloads in updated
+                        for payload in jobPayloads]
+            if payloads:
+                _storeJobPayloads(records, payloads,
+                                  [resp for resp, _ in updated])
+            notifyJobChanges(records)
+        for record in records:
+            jobChanged(record[JOBTABLE.id_field])
+        count = len(records)
     except Exception as e:
-        log.error('Could not set the status to actinia-core status: ' + status)
+        log.error('Could not write %s buffered status updates' % len(rows))
         log.error(str(e))
-        return None, None, None
+        return 0
 
-    log.info("Updated status to " + status + " for job with id "
-             + str(record['idpk_jobs']) + ".")
+    log.info('Wrote %s of %s buffered status updates' % (count, len(rows)))
 
     jobdb.close()
 
-    return record, gnosUuid, utcnow
+    return count
+
+
+def submitQueuedJob(submit, cancel):
+    """ Method to submit the oldest QUEUED job to actinia-core
+
+    The job is claimed by setting it to SUBMITTING in a short transaction,
+    found with SELECT ... FOR UPDATE SKIP LOCKED, so each job is claimed by
+    one submitter of all workers without holding a lock while actinia-core
+    is called. The result is written in a second transaction only if the
+    job was not changed in between; if it was cancelled meanwhile, the job
+    created in actinia-core is cancelled as well. Jobs of a submitter which
+    died are claimed again after JOBQUEUE.lease seconds. A failed
+    submission is tried again after JOBQUEUE.retry_delay seconds, up to
+    JOBQUEUE.max_attempts times.
+
+    Args:
+    submit (function): called with process and rule_configuration of the
+    job, returns the actinia-core response or None if it failed and the
+    url of the actinia-core backend
+    cancel (function): called with actinia-core resourceId and url of a
+    job which was cancelled while it was submitted
+
+    Returns:
+    record (dict): the updated job, QUEUED again if the submission failed,
+    or None if no job is waiting
+    """
+    idField = getattr(Job, JOBTABLE.id_field)
+    now = datetime.utcnow()
+    retryBefore = now - timedelta(seconds=JOBQUEUE.retry_delay)
+    leaseBefore = now - timedelta(seconds=JOBQUEUE.lease)
+
+    claimable = Job.select(idField).where(
+        ((Job.status == 'QUEUED')
+         & ((Job.submit_attempts == 0) | (Job.time_modified < retryBefore)))
+        | ((Job.status == 'SUBMITTING') & (Job.time_modified < leaseBefore))
+    ).order_by(idField).limit(1).for_update('FOR UPDATE SKIP LOCKED')
+
+    with jobdb:
+        queryResult = list(Job.update(
+            status='SUBMITTING',
+            time_modified=now.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            version=Job.version + 1
+        ).where(idField.in_(claimable)).returning(Job).execute())
+        if not queryResult:
+            return None
+        job = model_to_dict(queryResult[0])
+        notifyJobChanges([job])
+    jobChanged(job[JOBTABLE.id_field])
+
+    actiniaCoreResp, actiniaCoreUrl = submit(job['process'],
+                                             job['rule_configuration'])
+
+    utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    values = {
+        'time_modified': utcnow,
+        'version': Job.version + 1
+    }
+    resourceId = None
+    if actiniaCoreResp is None:
+        values['status'] = 'QUEUED'
+        values['submit_attempts'] = Job.submit_attempts + 1
+        if job['submit_attempts'] + 1 >= JOBQUEUE.max_attempts:
+            values['status'] = 'ERROR'
+            values['time_ended'] = utcnow
+    else:
+        row = _newJobRow(None, None, None, None, actiniaCoreResp, utcnow)
+        resourceId = row['actinia_core_jobid']
+        values['status'] = row['status']
+        values['actinia_core_jobid'] = resourceId
+        values['actinia_core_response'] = row['actinia_core_response']
+        values['actinia_core_url'] = actiniaCoreUrl
+        if actiniaCoreResp.get('status') == 'error':
+            values['status'] = 'ERROR'
+            values['time_ended'] = utcnow
+
+    with jobdb:
+        queryResult = list(Job.update(**values).where(
+            (idField == job[JOBTABLE.id_field])
+            & (Job.status == 'SUBMITTING')
+            & (Job.version == job['version'])
+        ).returning(Job).execute())
+        updated = len(queryResult) > 0
+        if updated:
+            record = model_to_dict(queryResult[0])
+            notifyJobChanges([record])
+        else:
+            # cancelled or claimed again while it was submitted
+            record = Job.select().where(
+                idField == job[JOBTABLE.id_field]).dicts().first()
+
+    if updated:
+        jobChanged(record[JOBTABLE.id_field])
+    elif resourceId is not None:
+        log.warning("Job with id " + str(job['idpk_jobs']) + " changed "
+                    + "while it was submitted, cancel it in actinia-core.")
+        cancel(resourceId, actiniaCoreUrl)
+
+    if updated and record['status'] == 'QUEUED':
+        log.warning("Could not submit job with id "
+                    + str(record['idpk_jobs']) + ", will try again.")
+    elif updated:
+        log.info("Submitted job with id " + str(record['idpk_jobs'])
+                 + " with status " + record['status'] + ".")
+
+    jobdb.close()
+
+    return record or job
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+
+Circuit breaker and admission control in front of actinia-core
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+from actinia_gdi.resources.config import ACTINIACORE
+
+
+class ServiceUnavailable(Exception):
+    """Raised if a job is not submitted to protect actinia-core
+
+    retry_after is the number of seconds after which the client should try
+    again.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while the circuit is open
+    """
+
+    def __init__(self, retry_after):
+        super().__init__('circuit to actinia-core is open')
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calls to actinia-core while too many of them fail or are slow
+
+    Closed: all calls are let through and the last window results are kept.
+    If at least min_calls are known and the rate of failed or slow calls
+    reaches error_rate or slow_rate, the circuit opens.
+
+    Open: no calls are let through for open_seconds.
+
+    Half open: half_open_calls trial calls are let through one at a time.
+    If they all succeed the circuit closes, else it opens again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=config.window)
+        self._state = self.CLOSED
+        self._openedAt = None
+        self._trials = 0
+        self._successes = 0
+        self.counters = {'calls': 0, 'failed': 0, 'slow': 0, 'rejected': 0,
+                         'opened': 0}
+
+    def _open(self):
+        self._state = self.OPEN
+        self._openedAt = time.monotonic()
+        self._results.clear()
+        self.counters['opened'] += 1
+
+    def _refresh(self):
+        if self._state == self.OPEN and time.monotonic() \
+                >= self._openedAt + self.config.open_seconds:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+            self._successes = 0
+
+    def allow(self):
+        """ Return True if a call may be sent, each True must be followed
+        by record
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._trials \
+                    == self._successes:
+                self._trials += 1
+                return True
+            self.counters['rejected'] += 1
+            return False
+
+    def record(self, seconds, failed):
+        """ Count the result of a call let through by allow
+        """
+        slow = seconds * 1000 >= self.config.slow_ms
+        with self._lock:
+            self.counters['calls'] += 1
+            self.counters['failed'] += int(failed)
+            self.counters['slow'] += int(slow)
+            if self._state == self.HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                    return
+                self._successes += 1
+                if self._successes >= self.config.half_open_calls:
+                    self._state = self.CLOSED
+                return
+            if self._state == self.OPEN:
+                # sent before the circuit opened
+                return
+            self._results.append((failed, slow))
+            if len(self._results) < self.config.min_calls:
+                return
+            calls = len(self._results)
+            if sum(r[0] for r in self._results) / calls \
+                    >= self.config.error_rate \
+                    or sum(r[1] for r in self._results) / calls \
+                    >= self.config.slow_rate:
+                self._open()
+
+    def retryAfter(self):
+        """ Return the seconds until calls are let through again, 0 if they
+        are now
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == self.OPEN:
+                return max(1, math.ceil(self._openedAt
+                                        + self.config.open_seconds
+                                        - time.monotonic()))
+            if self._state == self.HALF_OPEN and self._trials \
+                    > self._successes:
+                return 1
+            return 0
+
+    def check(self):
+        """ Raise CircuitOpenError if no call may be sent
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.retryAfter())
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            stats = dict(self.counters, state=self._state)
+            calls = len(self._results)
+            stats['window'] = {
+                'calls': calls,
+                'error_rate': round(sum(r[0] for r in self._results)
+                                    / calls, 3) if calls else 0,
+                'slow_rate': round(sum(r[1] for r in self._results)
+                                   / calls, 3) if calls else 0
+            }
+        return stats
+
+
+class Admission:
+    """Limits the submissions to actinia-core running at a time
+
+    Submissions above the limit are rejected right away instead of waiting,
+    so no more gunicorn threads are blocked by a slow actinia-core.
+    """
+
+    def __init__(self, limit, retry_after):
+        self.limit = limit
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._inFlight = 0
+        self.counters = {'admitted': 0, 'rejected': 0}
+
+    @contextmanager
+    def admit(self, count=1):
+        """ Run the block as count submissions
+
+        Raises ServiceUnavailable if the limit would be exceeded.
+        """
+        with self._lock:
+            if self._inFlight + count > self.limit:
+                self.counters['rejected'] += 1
+                raise ServiceUnavailable(
+                    'more than %s submissions to actinia-core' % self.limit,
+                    self.retry_after)
+            self._inFlight += count
+            self.counters['admitted'] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inFlight -= count
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, in_flight=self._inFlight,
+                        limit=self.limit)
+
+
+submissions = Admission(ACTINIACORE.max_in_flight, ACTINIACORE.retry_after)
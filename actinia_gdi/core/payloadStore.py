@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Out-of-line storage for large parts of actinia-core responses
+
+The configured fields are replaced in the stored response by
+{"$ref": <sha256 digest>} and written compressed to the payload table.
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import hashlib
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from peewee import EXCLUDED
+
+from actinia_gdi.model.jobtabelle import JobPayload, jobdb
+from actinia_gdi.resources.config import PAYLOADSTORE
+from actinia_gdi.resources.logging import log
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+REF_KEY = '$ref'
+
+# stored fields of the actinia-core response with days to keep them,
+# nested fields are separated by a dot
+PAYLOAD_FIELDS = {
+    'process_results': PAYLOADSTORE.process_results,
+    'process_log': PAYLOADSTORE.process_log,
+    'process_chain_list': PAYLOADSTORE.process_chain_list,
+    'urls.resources': PAYLOADSTORE.resources
+}
+
+
+def compressPayload(value):
+    """ Method to serialize and compress a payload
+
+    Uses zstd if the zstandard package is installed, zlib otherwise.
+
+    Args:
+    value: JSON serializable payload
+
+    Returns:
+    digest (str): sha256 of the serialized payload
+    codec (str): 'zstd' or 'zlib'
+    data (bytes): the compressed payload
+    """
+    raw = json.dumps(value, sort_keys=True, separators=(',', ':')).encode()
+    digest = hashlib.sha256(raw).hexdigest()
+    if zstandard is not None:
+        return digest, 'zstd', zstandard.ZstdCompressor().compress(raw)
+    return digest, 'zlib', zlib.compress(raw)
+
+
+def decompressPayload(codec, data):
+    """ Method to decompress and deserialize a payload
+
+    Raises ValueError if the payload was compressed with zstd and the
+    zstandard package is not installed.
+
+    Args:
+    codec (str): 'zstd' or 'zlib'
+    data (bytes): the compressed payload
+
+    Returns:
+    value: the payload
+    """
+    data = bytes(data)
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError('Payload is compressed with zstd, but the '
+                         + 'zstandard package is not installed')
+    if codec == 'zstd':
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = zlib.decompress(data)
+    return json.loads(raw.decode())
+
+
+def _getParent(resp, field):
+    """ Return the dict holding a (nested) field and its last key
+    """
+    keys = field.split('.')
+    for key in keys[:-1]:
+        resp = resp.get(key)
+        if not isinstance(resp, dict):
+            return None, None
+    return resp, keys[-1]
+
+
+def isPayloadRef(value):
+    return isinstance(value, dict) and list(value.keys()) == [REF_KEY]
+
+
+def splitPayloads(resp):
+    """ Method to move large fields out of an actinia-core response
+
+    Args:
+    resp (dict): actinia-core response
+
+    Returns:
+    resp (dict): copy of the response with references to the payloads
+    payloads (list): (field, digest, codec, data) of the moved fields
+    """
+    resp = json.loads(json.dumps(resp))
+    payloads = []
+    for field in PAYLOAD_FIELDS:
+        parent, key = _getParent(resp, field)
+        if parent is None or parent.get(key) is None:
+            continue
+        value = parent[key]
+        if isPayloadRef(value):
+            continue
+        if len(json.dumps(value)) < PAYLOADSTORE.min_size:
+            continue
+        digest, codec, data = compressPayload(value)
+        payloads.append((field, digest, codec, data))
+        parent[key] = {REF_KEY: digest}
+    return resp, payloads
+
+
+def storePayloads(resp):
+    """ Method to store the large fields of an actinia-core response
+
+    Payloads which are already stored only get their expiry extended.
+
+    Args:
+    resp (dict): actinia-core response
+
+    Returns:
+    resp (dict): the response with references to store in the jobtable
+    """
+    if resp is None:
+        return None
+    resp, payloads = splitPayloads(resp)
+    if not payloads:
+        return resp
+
+    with jobdb:
+        insertPayloads(payloads)
+
+    return resp
+
+
+def insertPayloads(payloads):
+    """ Method to store payloads with one multi-row INSERT
+
+    Payloads which are already stored only get their expiry extended. Runs
+    in the transaction of the caller.
+
+    Args:
+    payloads (list): (field, digest, codec, data) from splitPayloads, also
+    of several responses
+    """
+    utcnow = datetime.utcnow()
+    rows = dict()
+    for field, digest, codec, data in payloads:
+        days = PAYLOAD_FIELDS[field]
+        expires = utcnow + timedelta(days=days) if days else None
+        # one row per digest, as a row can only be upserted once per
+        # statement, keeping the latest expiry
+        if digest in rows:
+            known = rows[digest]['time_expires']
+            if known is None or (expires is not None and known > expires):
+                expires = known
+        rows[digest] = {
+            'digest': digest,
+            'codec': codec,
+            'data': data,
+            'time_expires': expires
+        }
+
+    JobPayload.insert_many(list(rows.values())).on_conflict(
+        conflict_target=[JobPayload.digest],
+        update={JobPayload.time_expires: EXCLUDED.time_expires},
+        where=(JobPayload.time_expires.is_null(False)
+               & (EXCLUDED.time_expires.is_null()
+                  | (JobPayload.time_expires < EXCLUDED.time_expires)))
+    ).execute()
+
+
+def _payloadRefs(resp):
+    """ Return the digest of each referenced field of a response
+    """
+    refs = dict()
+    for field in PAYLOAD_FIELDS:
+        parent, key = _getParent(resp, field)
+        if parent is not None and isPayloadRef(parent.get(key)):
+            refs[field] = parent[key][REF_KEY]
+    return refs
+
+
+def _readPayloads(digests, db):
+    """ Read and decompress the payloads of digests with one query
+    """
+    stored = dict()
+    with db:
+        rows = JobPayload.select().where(
+            JobPayload.digest.in_(list(digests))).execute(db)
+        for row in rows:
+            try:
+                stored[row.digest] = decompressPayload(row.codec, row.data)
+            except Exception as e:
+                log.error('Could not read payload ' + row.digest)
+                log.error(str(e))
+    return stored
+
+
+def _replaceRefs(resp, refs, stored):
+    for field, digest in refs.items():
+        parent, key = _getParent(resp, field)
+        parent[key] = stored.get(digest)
+
+
+def resolvePayloads(resp, db=None):
+    """ Method to replace the references in a stored actinia-core response
+    by the payloads
+
+    Expired payloads and payloads which can not be decompressed are
+    replaced by None.
+
+    Args:
+    resp (dict): actinia-core response from the jobtable
+    db (Database): database to read the payloads from, None for jobdb
+
+    Returns:
+    resp (dict): copy of the response with the payloads
+    """
+    if resp is None:
+        return None
+    resp = json.loads(json.dumps(resp))
+    refs = _payloadRefs(resp)
+    if not refs:
+        return resp
+
+    _replaceRefs(resp, refs, _readPayloads(set(refs.values()), db or jobdb))
+
+    return resp
+
+
+def resolveJobPayloads(records, db=None):
+    """ Method to replace the references in the actinia-core responses of
+    several jobs by the payloads, reading all payloads with one query
+
+    Args:
+    records (list): jobs, their responses are replaced by resolved copies
+    db (Database): database to read the payloads from, None for jobdb
+
+    Returns:
+    records (list): the jobs
+    """
+    refs = dict()
+    for index, record in enumerate(records):
+        resp = record.get('actinia_core_response') if record else None
+        if resp:
+            refs[index] = _payloadRefs(resp)
+    digests = set(digest for jobRefs in refs.values()
+                  for digest in jobRefs.values())
+    if not digests:
+        return records
+
+    stored = _readPayloads(digests, db or jobdb)
+    for index, jobRefs in refs.items():
+        if jobRefs:
+            resp = json.loads(json.dumps(
+                records[index]['actinia_core_response']))
+            _replaceRefs(resp, jobRefs, stored)
+            records[index]['actinia_core_response'] = resp
+
+    return records
+
+
+def purgePayloads():
+    """ Method to delete expired payloads
+
+    Returns:
+    count (int): number of deleted payloads
+    """
+    with jobdb:
+        count = JobPayload.delete().where(
+            JobPayload.time_expires < datetime.utcnow()).execute()
+    log.info('Purged %s expired payloads' % count)
+
+    return count
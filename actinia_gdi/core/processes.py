@@ -25,16 +25,26 @@ __license__ = "Apache-2.0"
 
 
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # from actinia_gdi.core.gnosWriter import update
 
 from actinia_gdi.api.common import checkConnectionWithoutResponse
 from actinia_gdi.resources.logging import log
-from actinia_gdi.core.jobtable import insertNewJob, getJobById
-from actinia_gdi.core.jobtable import getAllIds, getAllJobs, cancelJobById
+from actinia_gdi.core.jobStore import jobStore
+from actinia_gdi.core.jobtable import OUTSTANDING_STATUS, UNSUBMITTED_STATUS
+from actinia_gdi.core.jobtable import parseJobFields
 from actinia_gdi.core.actiniaCore import postActiniaCore, cancelActiniaCore
 from actinia_gdi.core.actiniaCore import parseActiniaIdFromUrl
-from actinia_gdi.core.jobtable import updateJobByResourceID
+from actinia_gdi.core.actiniaClient import actiniaCoreClient
+from actinia_gdi.core.backends import backendRouter
+from actinia_gdi.core.jobExport import exportJobs
+from actinia_gdi.core.payloadStore import resolveJobPayloads
+from actinia_gdi.core.loadShedding import ServiceUnavailable, submissions
+from actinia_gdi.core.updateBuffer import updateBuffer
+from actinia_gdi.core.submitQueue import submitQueue
+from actinia_gdi.resources.config import ACTINIACORE, WEBHOOK, JOBQUEUE
+from actinia_gdi.resources.config import JOBTABLE
 
 
 def createJob(jsonDict, process):
@@ -44,23 +54,46 @@ def createJob(jsonDict, process):
 
     This method can be called by HTTP POST
     @app.route('/processes/test/jobs')
+
+    The job is sent to the actinia-core backend chosen by backendRouter.
+
+    Raises ServiceUnavailable if the circuits to all backends are open,
+    the last health check of actinia-core failed or too many jobs are
+    submitted at the moment.
     """
 
     prePC_orig = json.dumps(jsonDict)
 
+    if JOBQUEUE.enabled is True:
+        job = jobStore.insertNewJob(
+            jsonDict,
+            jsonDict,  # as we don't hava a model yet
+            process,
+            jsonDict.get('feature_type'),
+            None
+        )
+        submitQueue.wake()
+        return job
+
     # TODO: define prePC (pre processchain) model if differs from pc
     # prePC = prePC(**jsonDict)
     # as we don't hava a model yet
     # prePC = json.dumps(jsonDict)
 
+    actiniaCoreUrl = backendRouter.choose(jsonDict)
     connection = checkConnectionWithoutResponse('actinia-core')
 
     if connection is not None:
-        actiniaCoreResp = postActiniaCore(
-            process,
-            jsonDict
-        )
+        with submissions.admit():
+            actiniaCoreResp = postActiniaCore(
+                process,
+                jsonDict,
+                actiniaCoreUrl
+            )
         log.debug(actiniaCoreResp)
+        if actiniaCoreResp is None:
+            log.error('Could not start job in actinia-core')
+            return None
 
         # try:
         #     prePCDict = prePC.to_struct()
@@ -69,12 +102,13 @@ def createJob(jsonDict, process):
         #     log.error(e)
         #     return None
 
-        job = insertNewJob(
+        job = jobStore.insertNewJob(
             jsonDict,
             jsonDict,  # as we don't hava a model yet
             process,
             jsonDict.get('feature_type'),  # currently empty (polygon later)
-            actiniaCoreResp
+            actiniaCoreResp,
+            actiniaCoreUrl
         )
 
         if actiniaCoreResp['status'] == 'error':
@@ -82,23 +116,255 @@ def createJob(jsonDict, process):
             resourceId = parseActiniaIdFromUrl(actiniaCoreResp['resource_id'])
             job = updateJob(resourceId, actiniaCoreResp)
 
-        return job
+        return resolveJob(job)
     else:
-        return None
+        raise actiniaCoreUnavailable()
+
+
+def actiniaCoreUnavailable():
+    """ Method to create the error if the last health check of actinia-core
+    failed, to try again after the next check
+    """
+    return ServiceUnavailable('actinia-core not reachable',
+                              ACTINIACORE.health_interval)
+
+
+def resolveJob(job):
+    """ Method to replace the stored parts of the actinia-core response of a
+    job by their payloads before it is returned by the API
+
+    Returns:
+    job (dict): the job
+    """
+    if job:
+        resolveJobPayloads([job])
+    return job
+
+
+def resolveJobs(jobs):
+    """ Generator resolving the payloads of jobs like resolveJob, with one
+    query for JOBTABLE.page_size jobs
+    """
+    chunk = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) >= JOBTABLE.page_size:
+            yield from resolveJobPayloads(chunk)
+            chunk = []
+    yield from resolveJobPayloads(chunk)
+
+
+def validateJobs(jsonList):
+    """ Method to check a batch of prePCs before anything is started
+
+    Returns:
+    errors (list): index and message of each invalid item
+    """
+    if not isinstance(jsonList, list) or not jsonList:
+        return [{'index': None, 'message': 'expected a non-empty array'}]
+    if len(jsonList) > ACTINIACORE.batch_size:
+        return [{'index': None, 'message': 'more than %s jobs'
+                 % ACTINIACORE.batch_size}]
 
+    return [{'index': index, 'message': 'expected an object'}
+            for index, jsonDict in enumerate(jsonList)
+            if not isinstance(jsonDict, dict)]
 
-def getJob(jobid):
+
+def createJobs(jsonList, process):
+    """ Method to start a batch of jobs in actinia-core and write them to
+    the Jobtable
+
+    The prePCs are posted to actinia-core by ACTINIACORE.batch_concurrency
+    threads and all started jobs are inserted in one transaction. Items
+    must be checked with validateJobs before.
+
+    This method can be called by HTTP POST
+    @app.route('/processes/loop/jobs:batch')
+
+    If JOBQUEUE is enabled, all jobs are inserted as QUEUED instead.
+
+    The jobs are spread over the actinia-core backends by backendRouter.
+
+    Raises ServiceUnavailable if the circuits to all backends are open,
+    the last health check of actinia-core failed or too many jobs are
+    submitted at the moment. If the jobs can not be written to the
+    jobtable, the started jobs are cancelled in actinia-core.
+
+    Returns:
+    results (list): for each item its index and the new job or an error
+    message
+    """
+    if JOBQUEUE.enabled is True:
+        jobs = jobStore.insertNewJobs([(
+            jsonDict,
+            jsonDict,  # as we don't hava a model yet
+            process,
+            jsonDict.get('feature_type'),
+            None
+        ) for jsonDict in jsonList])
+        submitQueue.wake()
+        return [{'index': index, 'job': job}
+                for index, job in enumerate(jobs)]
+
+    actiniaCoreUrls = backendRouter.chooseMany(jsonList)
+    connection = checkConnectionWithoutResponse('actinia-core')
+    if connection is None:
+        raise actiniaCoreUnavailable()
+
+    def post(index):
+        try:
+            return postActiniaCore(process, jsonList[index],
+                                   actiniaCoreUrls[index])
+        except Exception as e:
+            log.error('Could not start job in actinia-core: ' + str(e))
+            return None
+
+    concurrency = min(ACTINIACORE.batch_concurrency, len(jsonList))
+    with submissions.admit(concurrency):
+        with ThreadPoolExecutor(concurrency) as executor:
+            actiniaCoreResps = list(executor.map(
+                post, range(len(jsonList))))
+
+    results = [{'index': index} for index in range(len(jsonList))]
+    started = [index for index, resp in enumerate(actiniaCoreResps)
+               if resp is not None]
+    for index, resp in enumerate(actiniaCoreResps):
+        if resp is None:
+            results[index]['message'] = 'Could not start job in actinia-core'
+
+    try:
+        jobs = jobStore.insertNewJobs([(
+            jsonList[index],
+            jsonList[index],  # as we don't hava a model yet
+            process,
+            jsonList[index].get('feature_type'),
+            actiniaCoreResps[index],
+            actiniaCoreUrls[index]
+        ) for index in started])
+    except Exception as e:
+        log.error('Could not write batch of jobs to jobtable')
+        log.error(str(e))
+        # no job would be left to cancel the started ones later
+        for index in started:
+            resourceId = parseActiniaIdFromUrl(
+                actiniaCoreResps[index]['resource_id'])
+            try:
+                cancelled = cancelActiniaCore(resourceId,
+                                              actiniaCoreUrls[index])
+            except Exception as e:
+                log.error(str(e))
+                cancelled = None
+            if not cancelled:
+                log.error('Could not cancel job %s in actinia-core'
+                          % resourceId)
+            results[index]['message'] = 'Could not write job to jobtable'
+        return results
+
+    for index, job in zip(started, jobs):
+        actiniaCoreResp = actiniaCoreResps[index]
+        if actiniaCoreResp['status'] == 'error':
+            log.error("Error start processing in actinia-core")
+            resourceId = parseActiniaIdFromUrl(actiniaCoreResp['resource_id'])
+            job = updateJob(resourceId, actiniaCoreResp)
+        if job is None:
+            results[index]['message'] = 'Could not update job in jobtable'
+        else:
+            results[index]['job'] = job
+
+    resolveJobPayloads([result['job'] for result in results
+                        if 'job' in result])
+
+    return results
+
+
+def getJob(jobid, fields=None):
     """ Method to read job from Jobtable by id
 
     This method can be called by HTTP GET
     @app.route('/processes/test/jobs/<jobid>')
     """
 
-    job = getJobById(jobid)
+    job = jobStore.getJobById(jobid, fields)
+
+    return resolveJob(job)
+
+
+def getMetrics():
+    """ Method to read the metrics of this worker
+
+    This method can be called by HTTP GET
+    @app.route('/metrics')
+    """
+    metrics = jobStore.stats()
+    metrics['actiniacore'] = actiniaCoreClient.stats()
+    metrics['circuitbreaker'] = actiniaCoreClient.breakerStats()
+    metrics['backends'] = backendRouter.stats()
+    metrics['admission'] = submissions.stats()
+    if JOBQUEUE.enabled is True:
+        metrics['jobqueue'] = submitQueue.stats()
+    return metrics
+
+
+# columns of a job the cache headers of its responses are computed from
+VERSION_FIELDS = ['version', 'time_modified', 'status', 'time_ended',
+                  'time_started', 'time_created']
+
+
+def checkJobFields(fields):
+    """ Method to check the "fields" query arg for reading jobs
+
+    This method can be called by HTTP GET
+    @app.route('/processes/test/jobs/<jobid>')
+
+    Returns:
+    valid (bool): False if an unknown column is requested
+    """
+    return parseJobFields(fields) is not None
+
+
+def getJobVersion(jobid):
+    """ Method to read the version, modification time and status of a job
+    to answer conditional requests without reading the whole job
+
+    This method can be called by HTTP GET
+    @app.route('/processes/test/jobs/<jobid>')
+    """
+    job = jobStore.getJobById(jobid, ','.join(VERSION_FIELDS))
 
     return job
 
 
+def getJobWithVersion(jobid, fields=None):
+    """ Method to read a job together with the VERSION_FIELDS
+
+    The VERSION_FIELDS are read with the requested fields, so the cache
+    headers belong to the same version of the job as the body.
+
+    This method can be called by HTTP GET
+    @app.route('/processes/test/jobs/<jobid>')
+
+    Returns:
+    job (dict): the job or its requested fields, None if not found
+    version (dict): id and VERSION_FIELDS of the job
+    """
+    if not fields:
+        job = getJob(jobid)
+        return job, job
+
+    names = [name.strip() for name in fields.split(',')]
+    job = getJob(jobid, ','.join(
+        names + [name for name in VERSION_FIELDS if name not in names]))
+    if job is None:
+        return None, None
+
+    version = {name: job[name]
+               for name in [JOBTABLE.id_field] + VERSION_FIELDS}
+    job = {name: value for name, value in job.items()
+           if name in names or name == JOBTABLE.id_field}
+    return job, version
+
+
 def getAllJobIDs():
     """ Method to read all job ids from Jobtable
 
@@ -106,21 +372,57 @@ def getAllJobIDs():
     @app.route('/processes/test/jobs.html')
     """
 
-    job = getAllIds()
+    job = jobStore.getAllIds()
 
     return job
 
 
-def getJobs(filters, process):
-    """ Method to read all jobs from Jobtable with filter
+def getJobStatistics(process, hours=24):
+    """ Method to read the job statistics of a process
+
+    This method can be called by HTTP GET
+    @app.route('/processes/test/jobs/stats')
+    """
+    try:
+        stats = jobStore.getJobStats(process, hours)
+    except Exception as e:
+        log.error('Could not read job statistics')
+        log.error(str(e))
+        return None
+
+    return stats
+
+
+def getJobs(filters, process, limit=None, after=None, fields=None,
+            archived=False, orderBy=None):
+    """ Method to read jobs from Jobtable with filter as generator
 
     This method can be called by HTTP GET
     @app.route('/processes/test/jobs')
     """
 
-    jobs = getAllJobs(filters, process)
+    jobs = jobStore.iterJobs(filters, process, limit, after, fields,
+                             archived, orderBy)
+    if jobs is None:
+        return None
+
+    return resolveJobs(jobs)
 
-    return jobs
+
+def exportJobHistory(filters, process, exportFormat):
+    """ Method to export all jobs from Jobtable and archive with filter
+
+    This method can be called by HTTP GET
+    @app.route('/processes/test/jobs/export')
+
+    Returns:
+    data (generator): the export as bytes or None if a filter is invalid
+    """
+    jobs = jobStore.iterJobHistory(filters, process)
+    if jobs is None:
+        return None
+
+    return exportJobs(resolveJobs(jobs), exportFormat)
 
 
 def updateJob(resourceId, actiniaCoreResp):
@@ -131,7 +433,7 @@ def updateJob(resourceId, actiniaCoreResp):
 
     status = actiniaCoreResp['status']
 
-    job, uuid, utcnow = updateJobByResourceID(
+    job, uuid, utcnow = jobStore.updateJobByResourceID(
         resourceId,
         actiniaCoreResp,
         status
@@ -151,17 +453,47 @@ def updateJob(resourceId, actiniaCoreResp):
     return job
 
 
+def updateJobLater(resourceId, actiniaCoreResp):
+    """ Method to buffer a job update if write-behind is enabled
+
+    Only "running" updates are buffered. Other status are written right
+    away by updateJob and replace a buffered update of the same job.
+
+    This method is called by webhook endpoint
+
+    Returns:
+    buffered (bool): True if the update was buffered
+    """
+    if WEBHOOK.write_behind is False:
+        return False
+
+    if actiniaCoreResp.get('status') == 'running':
+        updateBuffer.add(resourceId, actiniaCoreResp)
+        return True
+
+    updateBuffer.discard(resourceId)
+    return False
+
+
 def cancelJob(jobid):
     """ Method to cancel job from Jobtable by id
 
     This method can be called by HTTP POST
     @app.route('/processes/test/jobs/<jobid>/operations/cancel')
     """
-    job = getJobById(jobid)
+    job = jobStore.getJobById(jobid)
     if job is not None:
         log.debug('The job with jobid ' + str(jobid) + ' exists')
         status = job['status']
         resourceId = job['actinia_core_jobid']
+        if status in UNSUBMITTED_STATUS:
+            log.debug('Job is not yet submitted, cancel in jobtable only')
+            job = jobStore.cancelJobById(jobid, UNSUBMITTED_STATUS)
+            if job is None or job['status'] not in OUTSTANDING_STATUS:
+                return resolveJob(job)
+            # submitted in between, cancel it in actinia-core
+            status = job['status']
+            resourceId = job['actinia_core_jobid']
         if not status or not resourceId:
             log.error('Job status or resourceId is not set!')
             return None
@@ -173,18 +505,19 @@ def cancelJob(jobid):
         if connection is not None:
             if status in ['PENDING', 'RUNNING']:
                 log.debug('Status is in PENDING or RUNNING, will cancel')
-                res = cancelActiniaCore(resourceId)
+                res = cancelActiniaCore(resourceId,
+                                        job.get('actinia_core_url'))
                 if res:
                     log.debug('Actinia-Core response TRUE')
-                    job = cancelJobById(jobid)
+                    job = jobStore.cancelJobById(jobid)
                     log.debug('Job in jobtable is ' + job['status'])
-                    return job
+                    return resolveJob(job)
                 else:
                     log.debug('Actinia-Core response is None')
                     return None
             else:
                 log.debug('Status not in PENDING or RUNNING, pass')
-                return job
+                return resolveJob(job)
         else:
             log.error('There is no connection to actinia-core')
             return None
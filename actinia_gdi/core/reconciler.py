@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+
+Polling of actinia-core for jobs whose webhooks were lost
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+from actinia_gdi.core.actiniaClient import actiniaCoreClient
+from actinia_gdi.core.jobStore import jobStore
+from actinia_gdi.core.jobtable import RECONCILE_LOCK_KEY
+from actinia_gdi.core.processes import updateJob
+from actinia_gdi.resources.config import ACTINIACORE, JOBTABLE, RECONCILER
+from actinia_gdi.resources.logging import log
+
+
+class RateLimiter:
+    """Lets callers continue at most rate times per second
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        """ Wait until the next call may be sent
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def statusUrl(job):
+    """ Method to build the url of the actinia-core status of a job at its
+    backend
+    """
+    return ((job['actinia_core_url'] or ACTINIACORE.url) + 'resources/'
+            + ACTINIACORE.user + '/' + job['actinia_core_jobid'])
+
+
+class Reconciler:
+    """Polls actinia-core for jobs whose webhooks were lost
+
+    PENDING or RUNNING jobs which were not changed for stale_seconds are
+    read in batches of batch_size. Their status is requested concurrently
+    by concurrency threads, at most rate requests per second, and applied
+    by updateJob like a webhook. A polled job which is not changed by the
+    update, like an accepted job which is still PENDING, is marked as
+    polled. Both become stale again after stale_seconds.
+
+    All workers run the reconciler, but a postgres advisory lock makes
+    sure only one of them polls at a time. The thread is started on first
+    use, so each gunicorn worker gets its own after forking.
+    """
+
+    def __init__(self, config, apply):
+        self.config = config
+        self.apply = apply
+        self._limiter = RateLimiter(config.rate)
+        self._lock = threading.Lock()
+        self._pid = None
+        self.counters = {'runs': 0, 'polled': 0, 'updated': 0, 'failed': 0}
+
+    def start(self):
+        """ Start reconciling if not yet done in this process
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='Reconciler',
+                                  daemon=True)
+        thread.start()
+
+    def _count(self, name, number=1):
+        with self._lock:
+            self.counters[name] += number
+
+    def reconcileJob(self, job):
+        """ Poll the status of a job and apply it
+
+        Returns:
+        updated (bool): True if the job was updated
+        """
+        self._limiter.wait()
+        try:
+            resp = actiniaCoreClient.get(statusUrl(job))
+            actiniaCoreResp = resp.json()
+            if resp.status_code != 200 or 'status' not in actiniaCoreResp:
+                raise ValueError('actinia-core answered %s'
+                                 % resp.status_code)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.warning('Could not poll job with id %s: %s'
+                        % (job[JOBTABLE.id_field], str(e)))
+            self._count('failed')
+            return False
+        self._count('polled')
+        try:
+            record = self.apply(job['actinia_core_jobid'], actiniaCoreResp)
+        except Exception as e:
+            log.error('Could not update job with id %s: %s'
+                      % (job[JOBTABLE.id_field], str(e)))
+            self._count('failed')
+            return False
+        if record is None or record['version'] == job['version']:
+            jobStore.touchJob(job[JOBTABLE.id_field], job['version'])
+            return False
+        self._count('updated')
+        return True
+
+    def reconcile(self):
+        """ Poll all stale jobs once
+
+        Returns:
+        count (int): number of polled jobs or None if another worker
+        reconciles
+        """
+        staleBefore = datetime.utcnow() - timedelta(
+            seconds=self.config.stale_seconds)
+        with jobStore.advisoryLock(RECONCILE_LOCK_KEY) as locked:
+            if not locked:
+                log.debug('Jobs are reconciled by another worker')
+                return None
+            self._count('runs')
+            count = 0
+            position = None
+            with ThreadPoolExecutor(self.config.concurrency) as executor:
+                while True:
+                    jobs = jobStore.getStaleJobs(
+                        staleBefore, self.config.batch_size, position)
+                    list(executor.map(self.reconcileJob, jobs))
+                    count += len(jobs)
+                    if len(jobs) < self.config.batch_size:
+                        break
+                    position = {'id': jobs[-1][JOBTABLE.id_field],
+                                'value': jobs[-1]['time_modified']}
+        if count:
+            log.info('Polled actinia-core for %s stale jobs' % count)
+        return count
+
+    def _run(self):
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                log.error('Could not reconcile jobs')
+                log.error(str(e))
+            time.sleep(self.config.interval)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+reconciler = Reconciler(RECONCILER, updateJob)
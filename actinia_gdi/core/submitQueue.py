@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Background submission of QUEUED jobs to actinia-core
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import os
+import threading
+
+from actinia_gdi.core.actiniaCore import cancelActiniaCore
+from actinia_gdi.core.actiniaCore import postActiniaCore
+from actinia_gdi.core.backends import backendRouter
+from actinia_gdi.core.jobStore import jobStore
+from actinia_gdi.resources.config import JOBQUEUE
+from actinia_gdi.resources.logging import log
+
+
+def submitJob(process, preProcessChain):
+    """ Method to post a queued job to the actinia-core backend chosen by
+    backendRouter
+
+    Returns:
+    actiniaCoreResp (dict): response of actinia-core or None if it failed
+    actiniaCoreUrl (str): url of the backend
+    """
+    actiniaCoreUrl = None
+    try:
+        actiniaCoreUrl = backendRouter.choose(preProcessChain)
+        return (postActiniaCore(process, preProcessChain, actiniaCoreUrl),
+                actiniaCoreUrl)
+    except Exception as e:
+        log.error('Could not submit job to actinia-core: ' + str(e))
+        return None, actiniaCoreUrl
+
+
+class SubmitQueue:
+    """Pool of threads submitting QUEUED jobs to actinia-core
+
+    The queue itself is the jobtable, so jobs survive restarts and are
+    submitted by the threads of all workers. Jobs queued by this worker
+    wake the threads right away, others are found every poll_interval
+    seconds.
+
+    The threads are started on first use, so each gunicorn worker gets its
+    own after forking.
+    """
+
+    def __init__(self, workers, poll_interval):
+        self.workers = workers
+        self.interval = poll_interval
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.counters = {'submitted': 0, 'failed': 0}
+
+    def start(self):
+        """ Start the submitting threads if not yet done in this process
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, daemon=True,
+                                      name='SubmitQueue-%s' % number)
+            thread.start()
+        log.debug('Started %s threads submitting queued jobs' % self.workers)
+
+    def wake(self):
+        """ Tell the threads that jobs were queued
+        """
+        self.start()
+        self._wakeup.set()
+
+    def submitNext(self):
+        """ Submit the next queued job
+
+        Returns:
+        submitted (bool): False if no job is waiting, the submission
+        failed or the circuits to all actinia-core backends are open
+        """
+        if backendRouter.retryAfter():
+            # do not count attempts of jobs which can not be sent
+            return False
+        record = jobStore.submitQueuedJob(submitJob, cancelActiniaCore)
+        if record is None:
+            return False
+        with self._lock:
+            if record['status'] == 'QUEUED':
+                self.counters['failed'] += 1
+                return False
+            self.counters['submitted'] += 1
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self.submitNext():
+                    continue
+            except Exception as e:
+                log.error('Could not submit queued job')
+                log.error(str(e))
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+submitQueue = SubmitQueue(JOBQUEUE.workers, JOBQUEUE.poll_interval)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Write-behind buffer for status webhooks of actinia-core
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import atexit
+import os
+import threading
+from datetime import datetime
+
+from actinia_gdi.core.jobStore import jobStore
+from actinia_gdi.resources.config import WEBHOOK
+from actinia_gdi.resources.logging import log
+
+
+class UpdateBuffer:
+    """Keeps the latest "running" update per actinia-core resourceId and
+    writes all of them with one query, either every flush_interval
+    milliseconds or as soon as flush_size jobs are buffered.
+
+    The flush thread is started on first use, so each gunicorn worker gets
+    its own after forking.
+    """
+
+    def __init__(self, flush_interval, flush_size):
+        self.interval = flush_interval / 1000.0
+        self.size = flush_size
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def add(self, resourceId, resp):
+        """ Buffer an actinia-core response, replacing an older one
+        of the same job
+        """
+        utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+        with self._lock:
+            self._pending[resourceId] = (resp, utcnow)
+            full = len(self._pending) >= self.size
+        self._start()
+        if full:
+            self._wakeup.set()
+
+    def discard(self, resourceId):
+        """ Drop a buffered update, e.g. when the job reached a terminal
+        status which is written right away
+        """
+        with self._lock:
+            self._pending.pop(resourceId, None)
+
+    def flush(self):
+        """ Write all buffered updates
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = dict()
+        if pending:
+            jobStore.updateJobsByResourceIDs(pending)
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='UpdateBuffer',
+                                  daemon=True)
+        thread.start()
+        atexit.register(self.flush)
+        log.debug('Started write-behind buffer for status webhooks')
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.error('Could not flush buffered status updates')
+                log.error(str(e))
+
+
+updateBuffer = UpdateBuffer(WEBHOOK.flush_interval, WEBHOOK.flush_size)
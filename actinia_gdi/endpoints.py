@@ -28,22 +28,33 @@ from flask import current_app, send_from_directory
 import werkzeug
 
 from actinia_gdi.resources.logging import log
-from actinia_gdi.api.resources import Update
+from actinia_gdi.api.resources import Update, Metrics
 
 from actinia_gdi.api.processes.test import ActiniaCoreConnection
 from actinia_gdi.api.processes.test import JobTestWrapper
 from actinia_gdi.api.processes.test import JobHtmlTestWrapper
 from actinia_gdi.api.processes.test import JobIdTestWrapper
+from actinia_gdi.api.processes.test import JobStatsTestWrapper
+from actinia_gdi.api.processes.test import JobEventsTestWrapper
+from actinia_gdi.api.processes.test import JobExportTestWrapper
 
 from actinia_gdi.api.processes.loop import JobLoopWrapper
 from actinia_gdi.api.processes.loop import JobHtmlLoopWrapper
 from actinia_gdi.api.processes.loop import JobIdLoopWrapper
 from actinia_gdi.api.processes.loop import JobIdCancelLoopWrapper
+from actinia_gdi.api.processes.loop import JobStatsLoopWrapper
+from actinia_gdi.api.processes.loop import JobEventsLoopWrapper
+from actinia_gdi.api.processes.loop import JobExportLoopWrapper
+from actinia_gdi.api.processes.loop import JobBatchLoopWrapper
 
 from actinia_gdi.api.processes.sentinel1 import JobS1Wrapper
 from actinia_gdi.api.processes.sentinel1 import JobHtmlS1Wrapper
 from actinia_gdi.api.processes.sentinel1 import JobIdS1Wrapper
 from actinia_gdi.api.processes.sentinel1 import JobIdCancelS1Wrapper
+from actinia_gdi.api.processes.sentinel1 import JobStatsS1Wrapper
+from actinia_gdi.api.processes.sentinel1 import JobEventsS1Wrapper
+from actinia_gdi.api.processes.sentinel1 import JobExportS1Wrapper
+from actinia_gdi.api.processes.sentinel1 import JobBatchS1Wrapper
 
 
 # endpoints loaded if run as standalone app
@@ -76,6 +87,21 @@ def addEndpoints(app, apidoc):
         JobHtmlTestWrapper,
         '/processes/test/jobs.html'
     )
+    # GET: statistics
+    apidoc.add_resource(
+        JobStatsTestWrapper,
+        '/processes/test/jobs/stats'
+    )
+    # GET: export of all jobs
+    apidoc.add_resource(
+        JobExportTestWrapper,
+        '/processes/test/jobs/export'
+    )
+    # GET: stream of job changes
+    apidoc.add_resource(
+        JobEventsTestWrapper,
+        '/processes/test/jobs/events'
+    )
     # GET: read
     apidoc.add_resource(
         JobIdTestWrapper,
@@ -93,6 +119,26 @@ def addEndpoints(app, apidoc):
         JobHtmlLoopWrapper,
         '/processes/loop/jobs.html'
     )
+    # POST: create many jobs
+    apidoc.add_resource(
+        JobBatchLoopWrapper,
+        '/processes/loop/jobs:batch'
+    )
+    # GET: statistics
+    apidoc.add_resource(
+        JobStatsLoopWrapper,
+        '/processes/loop/jobs/stats'
+    )
+    # GET: export of all jobs
+    apidoc.add_resource(
+        JobExportLoopWrapper,
+        '/processes/loop/jobs/export'
+    )
+    # GET: stream of job changes
+    apidoc.add_resource(
+        JobEventsLoopWrapper,
+        '/processes/loop/jobs/events'
+    )
     # GET: read
     apidoc.add_resource(
         JobIdLoopWrapper,
@@ -115,6 +161,26 @@ def addEndpoints(app, apidoc):
         JobHtmlS1Wrapper,
         '/processes/sentinel1/jobs.html'
     )
+    # POST: create many jobs
+    apidoc.add_resource(
+        JobBatchS1Wrapper,
+        '/processes/sentinel1/jobs:batch'
+    )
+    # GET: statistics
+    apidoc.add_resource(
+        JobStatsS1Wrapper,
+        '/processes/sentinel1/jobs/stats'
+    )
+    # GET: export of all jobs
+    apidoc.add_resource(
+        JobExportS1Wrapper,
+        '/processes/sentinel1/jobs/export'
+    )
+    # GET: stream of job changes
+    apidoc.add_resource(
+        JobEventsS1Wrapper,
+        '/processes/sentinel1/jobs/events'
+    )
     # GET: read
     apidoc.add_resource(
         JobIdS1Wrapper,
@@ -126,6 +192,10 @@ def addEndpoints(app, apidoc):
         '/processes/sentinel1/jobs/<jobid>/operations/cancel'
     )
 
+    # #### METRICS
+    # GET: metrics of the worker
+    apidoc.add_resource(Metrics, '/metrics')
+
     # #### WEBHOOK FROM ACTINIA-CORE
     # POST: trigger status update
     apidoc.add_resource(
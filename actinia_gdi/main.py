@@ -29,9 +29,12 @@ from flask_cors import CORS
 from flask_restful_swagger_2 import Api
 
 from actinia_gdi import endpoints
-from actinia_gdi.core.jobtable import initJobDB
+from actinia_gdi.core.healthProbe import healthProbe
+from actinia_gdi.core.jobStore import jobStore
+from actinia_gdi.core.reconciler import reconciler
+from actinia_gdi.core.submitQueue import submitQueue
 from actinia_gdi.resources.logging import log
-from actinia_gdi.resources.config import APP
+from actinia_gdi.resources.config import APP, JOBQUEUE, RECONCILER
 
 
 app = Flask(__name__)
@@ -51,7 +54,13 @@ apidoc = Api(
 )
 
 endpoints.addEndpoints(app, apidoc)
-initJobDB()
+jobStore.init()
+healthProbe.start()
+if JOBQUEUE.enabled is True:
+    # also submits jobs queued before the restart
+    submitQueue.start()
+if RECONCILER.enabled is True:
+    reconciler.start()
 
 
 if __name__ == '__main__':
@@ -24,12 +24,18 @@ __copyright__ = "2018-present mundialis GmbH & Co. KG"
 __license__ = "Apache-2.0"
 
 
-from peewee import Model
-from peewee import CharField, DateTimeField, AutoField
-from playhouse.postgres_ext import BinaryJSONField
-from playhouse.pool import PooledPostgresqlExtDatabase
+import threading
+import time
 
-from actinia_gdi.resources.config import JOBTABLE
+from peewee import Model, SQL
+from peewee import CharField, DateTimeField, AutoField, BlobField
+from peewee import BigIntegerField, CompositeKey, IntegerField
+from peewee import SmallIntegerField
+from playhouse.postgres_ext import BinaryJSONField, PostgresqlExtDatabase
+from playhouse.pool import PooledPostgresqlExtDatabase, MaxConnectionsExceeded
+
+from actinia_gdi.resources.config import JOBTABLE, JOBTABLE_REPLICA
+from actinia_gdi.resources.config import PAYLOADSTORE
 from actinia_gdi.resources.logging import log
 
 
@@ -37,18 +43,122 @@ log.debug("Database config loaded: %s:%s/%s/%s.%s" % (
     JOBTABLE.host, JOBTABLE.port, JOBTABLE.database,
     JOBTABLE.schema, JOBTABLE.table))
 
+
+class _CountConnects:
+    """Counts new connections to postgres, placed between the pool and
+    PostgresqlExtDatabase by JobDatabase
+    """
+    def _connect(self):
+        conn = super(_CountConnects, self)._connect()
+        self.counters['connects'] += 1
+        return conn
+
+
+class JobDatabase(PooledPostgresqlExtDatabase, _CountConnects,
+                  PostgresqlExtDatabase):
+    """Connection pool of the jobtable which counts how it is used
+
+    A connection is checked out for each "with jobdb:" block, waits happen
+    if all JOBTABLE.max_connections are in use.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.counters = {
+            'checkouts': 0,
+            'connects': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0
+        }
+        self._waiting = set()
+        self._started = time.monotonic()
+        super(JobDatabase, self).__init__(*args, **kwargs)
+
+    def connect(self, reuse_if_open=False):
+        start = time.monotonic()
+        try:
+            return super(JobDatabase, self).connect(reuse_if_open)
+        except MaxConnectionsExceeded:
+            with self._pool_lock:
+                self.counters['timeouts'] += 1
+            raise
+        finally:
+            with self._pool_lock:
+                if threading.get_ident() in self._waiting:
+                    self._waiting.discard(threading.get_ident())
+                    self.counters['waits'] += 1
+                    self.counters['wait_seconds'] += time.monotonic() - start
+
+    def _connect(self):
+        with self._pool_lock:
+            try:
+                conn = super(JobDatabase, self)._connect()
+            except MaxConnectionsExceeded:
+                self._waiting.add(threading.get_ident())
+                raise
+            self.counters['checkouts'] += 1
+        return conn
+
+    def prewarm(self, count):
+        """ Open up to count connections and keep them idle in the pool
+        """
+        with self._pool_lock:
+            count = min(count, self._max_connections) - len(
+                self._connections) - len(self._in_use)
+            conns = [self._connect() for _ in range(max(count, 0))]
+            for conn in conns:
+                self._close(conn)
+            self.counters['checkouts'] -= len(conns)
+        log.debug('Opened %s connections to jobtable' % len(conns))
+
+    def stats(self):
+        """ Return the counters and the current use of the pool
+        """
+        with self._pool_lock:
+            stats = dict(self.counters)
+            stats['in_use'] = len(self._in_use)
+            stats['idle'] = len(self._connections)
+        stats['max_connections'] = self._max_connections
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats['connects_per_second'] = round(
+            stats['connects'] / (time.monotonic() - self._started), 3)
+        return stats
+
+
 """database connection"""
-jobdb = PooledPostgresqlExtDatabase(
+jobdb = JobDatabase(
     JOBTABLE.database, **{
         'host': JOBTABLE.host,
         'port': JOBTABLE.port,
         'user': JOBTABLE.user,
         'password': JOBTABLE.pw,
-        'max_connections': 8,
-        'stale_timeout': 300
+        'max_connections': JOBTABLE.max_connections,
+        'stale_timeout': JOBTABLE.stale_timeout,
+        # wait for a free connection instead of failing right away, e.g.
+        # when more requests than connections are served asynchronously
+        # (peewee waits forever for 0, so None is passed to not wait)
+        'timeout': JOBTABLE.pool_timeout or None
     }
 )
 
+"""optional connection to a read replica, see actinia_gdi.core.jobRouter"""
+jobreplica = None
+if JOBTABLE_REPLICA.host:
+    log.debug("Replica config loaded: %s:%s" % (
+        JOBTABLE_REPLICA.host, JOBTABLE_REPLICA.port or JOBTABLE.port))
+    jobreplica = JobDatabase(
+        JOBTABLE_REPLICA.database or JOBTABLE.database, **{
+            'host': JOBTABLE_REPLICA.host,
+            'port': JOBTABLE_REPLICA.port or JOBTABLE.port,
+            'user': JOBTABLE_REPLICA.user or JOBTABLE.user,
+            'password': JOBTABLE_REPLICA.pw or JOBTABLE.pw,
+            'max_connections': (JOBTABLE_REPLICA.max_connections
+                                or JOBTABLE.max_connections),
+            'stale_timeout': JOBTABLE.stale_timeout,
+            'timeout': JOBTABLE.pool_timeout or None
+        }
+    )
+
 
 class BaseModel(Model):
     """Base Model for tables in jobdb
@@ -59,11 +169,16 @@ class BaseModel(Model):
 
 class Job(BaseModel):
     """Model for jobtable in database
+
+    The declared indexes are the managed index set of the jobtable, see
+    actinia_gdi.core.jobtable.createJobIndexes. BinaryJSONField is GIN
+    indexed by default, which is only wanted for job_description as the
+    other JSONB columns are never filtered but often rewritten.
     """
     idpk_jobs = AutoField()
     process = CharField(null=True)
     feature_type = CharField(null=True)
-    rule_configuration = BinaryJSONField(null=True)
+    rule_configuration = BinaryJSONField(null=True, index=False)
     job_description = BinaryJSONField(null=True)
     time_created = DateTimeField(null=True)
     time_started = DateTimeField(null=True)
@@ -71,9 +186,108 @@ class Job(BaseModel):
     time_ended = DateTimeField(null=True)
     metadata = CharField(null=True)
     status = CharField(null=True)
-    actinia_core_response = BinaryJSONField(null=True)
+    actinia_core_response = BinaryJSONField(null=True, index=False)
     actinia_core_jobid = CharField(null=True)
+    # incremented on each change, used for the ETag of a job
+    version = IntegerField(default=0, constraints=[SQL('DEFAULT 0')])
+    time_modified = DateTimeField(null=True)
+    # failed submissions of a queued job to actinia-core
+    submit_attempts = IntegerField(default=0, constraints=[SQL('DEFAULT 0')])
+    # url of the actinia-core backend the job was sent to
+    actinia_core_url = CharField(null=True)
 
     class Meta:
         table_name = JOBTABLE.table
         schema = JOBTABLE.schema
+        indexes = (
+            # listing jobs of a process ordered by id
+            (('process', 'idpk_jobs'), False),
+            # finding jobs without change for the reconciler
+            (('status', 'time_modified'), False),
+            # listing jobs ordered by a column and the id, each page is a
+            # range scan, see actinia_gdi.core.jobtable.parseJobOrder
+            (('time_created', 'idpk_jobs'), False),
+            (('time_ended', 'idpk_jobs'), False),
+            (('status', 'idpk_jobs'), False),
+            (('actinia_core_jobid', 'idpk_jobs'), False),
+        )
+
+
+class JobArchive(Job):
+    """Model for the archive of finished jobs in database
+
+    Same columns as the jobtable. The table is partitioned by month of
+    time_created and created by actinia_gdi.core.jobtable.initJobArchive.
+    """
+    # GIN indexed as in the jobtable, archived jobs are filtered the same
+    job_description = BinaryJSONField(null=True, index=True)
+
+    class Meta:
+        table_name = JOBTABLE.archive_table
+        schema = JOBTABLE.schema
+
+
+class JobPayload(BaseModel):
+    """Model for large parts of actinia-core responses in database
+
+    Content addressed by the sha256 digest of the payload, so identical
+    payloads of repeated status updates are only stored once. See
+    actinia_gdi.core.payloadStore.
+    """
+    digest = CharField(primary_key=True)
+    codec = CharField()
+    data = BlobField()
+    time_expires = DateTimeField(null=True, index=True)
+
+    class Meta:
+        table_name = PAYLOADSTORE.table
+        schema = JOBTABLE.schema
+
+
+class JobStatsStatus(BaseModel):
+    """Model for the number of jobs per process and status
+
+    This and the following statistics tables are maintained by a trigger on
+    the jobtable, see actinia_gdi.core.jobStats. Each count is spread over
+    JOBTABLE.stats_shards rows by the id of the job, readers sum them up.
+    """
+    process = CharField()
+    status = CharField()
+    shard = SmallIntegerField(default=0)
+    count = BigIntegerField(default=0)
+
+    class Meta:
+        table_name = JOBTABLE.table + '_stats_status'
+        schema = JOBTABLE.schema
+        primary_key = CompositeKey('process', 'status', 'shard')
+
+
+class JobStatsDuration(BaseModel):
+    """Model for the histogram of queue wait ('wait') and run duration
+    ('run') per process
+    """
+    process = CharField()
+    kind = CharField()
+    bucket = IntegerField()
+    shard = SmallIntegerField(default=0)
+    count = BigIntegerField(default=0)
+
+    class Meta:
+        table_name = JOBTABLE.table + '_stats_duration'
+        schema = JOBTABLE.schema
+        primary_key = CompositeKey('process', 'kind', 'bucket', 'shard')
+
+
+class JobStatsHourly(BaseModel):
+    """Model for the number of finished jobs per process, hour and status
+    """
+    process = CharField()
+    hour = DateTimeField()
+    status = CharField()
+    shard = SmallIntegerField(default=0)
+    count = BigIntegerField(default=0)
+
+    class Meta:
+        table_name = JOBTABLE.table + '_stats_hourly'
+        schema = JOBTABLE.schema
+        primary_key = CompositeKey('process', 'hour', 'status', 'shard')
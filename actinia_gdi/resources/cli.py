@@ -45,6 +45,107 @@ def about():
     return text
 
 
+def jobindexes():
+    """Report missing, unused and undeclared indexes of the jobtable
+    """
+    # imported here as it needs the jobtable config and database
+    from actinia_gdi.core.jobtable import getJobIndexReport
+
+    report = getJobIndexReport()
+
+    print('Declared indexes: ' + ', '.join(report['declared']))
+    for key in ['missing', 'unused', 'undeclared']:
+        if report[key]:
+            print(key.capitalize() + ' indexes: ' + ', '.join(report[key]))
+        else:
+            print('No ' + key + ' indexes')
+    if report['missing']:
+        print('Missing indexes are created by createjobindexes or in the '
+              'background on next startup of actinia-gdi')
+
+
+def createjobindexes():
+    """Create missing indexes of the jobtable, which can take long for a
+    large jobtable
+    """
+    # imported here as it needs the jobtable config and database
+    from actinia_gdi.core.jobtable import createJobIndexes, getJobIndexReport
+
+    createJobIndexes()
+    missing = getJobIndexReport()['missing']
+    if missing:
+        print('Missing indexes: ' + ', '.join(missing))
+        sys.exit(1)
+    print('All declared indexes exist')
+
+
+def archivejobs():
+    """Move finished jobs older than JOBTABLE.archive_after days (or the
+    number of days given as argument) to the job archive
+    """
+    # imported here as it needs the jobtable config and database
+    from actinia_gdi.core.jobtable import initJobArchive, archiveJobs
+
+    days = None
+    if len(sys.argv) > 1:
+        days = int(sys.argv[1])
+
+    initJobArchive()
+    count = archiveJobs(days)
+    print('Archived ' + str(count) + ' jobs')
+
+
+def purgepayloads():
+    """Delete stored parts of actinia-core responses which are expired
+    """
+    # imported here as it needs the jobtable config and database
+    from actinia_gdi.core.payloadStore import purgePayloads
+
+    count = purgePayloads()
+    print('Purged ' + str(count) + ' payloads')
+
+
+def rebuildjobstats():
+    """Compute the job statistics from all jobs again
+    """
+    # imported here as it needs the jobtable config and database
+    from actinia_gdi.core.jobtable import TERMINAL_STATUS
+    from actinia_gdi.core.jobStats import rebuildJobStats
+
+    rebuildJobStats(TERMINAL_STATUS)
+    print('Rebuilt job statistics')
+
+
+def exportjobs():
+    """Export all jobs of the jobtable and the archive. Arguments are the
+    format (ndjson, csv or parquet), the output file (default stdout) and
+    the process (default all)
+    """
+    # imported here as it needs the jobtable config and database
+    from actinia_gdi.core.jobtable import iterJobHistory
+    from actinia_gdi.core.jobExport import exportJobs, exportFormats
+
+    exportFormat = sys.argv[1] if len(sys.argv) > 1 else 'ndjson'
+    output = sys.argv[2] if len(sys.argv) > 2 else '-'
+    process = sys.argv[3] if len(sys.argv) > 3 else 'test'
+
+    if exportFormat not in exportFormats():
+        print('Format must be one of ' + ', '.join(exportFormats()),
+              file=sys.stderr)
+        sys.exit(1)
+
+    data = exportJobs(iterJobHistory({}, process), exportFormat)
+    if output == '-':
+        for part in data:
+            sys.stdout.buffer.write(part)
+        sys.stdout.buffer.flush()
+    else:
+        with open(output, 'wb') as file:
+            for part in data:
+                file.write(part)
+        print('Exported jobs to ' + output)
+
+
 # used in pc2grass
 def parseExe(process):
     # no api docs model
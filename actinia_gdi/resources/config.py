@@ -54,6 +54,75 @@ class JOBTABLE:
     schema = 'actinia'
     table = 'tab_jobs'
     id_field = 'idpk_jobs'
+    # connections per worker, check postgres max_connections for all workers
+    max_connections = 8
+    # seconds after which an idle connection is closed
+    stale_timeout = 300
+    # seconds to wait for a free connection, 0 fails right away
+    pool_timeout = 10
+    # connections opened on worker start
+    prewarm = 2
+    # number of rows read per query when listing jobs
+    page_size = 500
+    # postgres channel to notify all workers about changed jobs
+    notify_channel = 'actinia_gdi_jobs'
+    # table (partitioned by month) for finished jobs moved by archivejobs
+    archive_table = 'tab_jobs_archive'
+    # days after which finished jobs are moved to the archive
+    archive_after = 30
+    # number of jobs moved per transaction
+    archive_batch = 1000
+    # number of rows fetched and written at a time when exporting jobs
+    export_chunk = 5000
+    # where jobs are stored, "postgres" or "memory" (tests, benchmarks)
+    store = 'postgres'
+    # create missing indexes of the jobtable in the background on startup,
+    # if False only by the createjobindexes command
+    create_indexes = True
+    # counter rows per process and status in the job statistics, jobs are
+    # spread over them by id so concurrent status changes rarely wait
+    stats_shards = 16
+
+
+class JOBTABLE_REPLICA:
+    """Default config for an optional read replica of the jobtable database
+
+    Not used if no host is configured. Options which are not set are taken
+    from JOBTABLE.
+    """
+    host = None
+    port = None
+    database = None
+    user = None
+    pw = None
+    max_connections = None
+    # seconds a changed job is read from JOBTABLE instead of the replica
+    recent_seconds = 10
+
+
+class JOBCACHE:
+    """Default config for the cache of jobs read by id
+    """
+    # maximum number of cached jobs per worker, 0 disables the cache
+    size = 1000
+    # seconds a job which is not yet finished stays cached
+    ttl = 10
+    # seconds HTTP clients and proxies may cache a finished job
+    http_max_age = 86400
+
+
+class PAYLOADSTORE:
+    """Default config for large parts of actinia-core responses, which are
+    stored compressed outside of the jobtable
+    """
+    table = 'tab_job_payloads'
+    # smaller payloads (bytes of JSON) stay in the jobtable
+    min_size = 1024
+    # days to keep each payload, 0 keeps it forever
+    process_results = 90
+    process_log = 30
+    process_chain_list = 30
+    resources = 30
 
 
 class LOGCONFIG:
@@ -73,6 +142,112 @@ class ACTINIACORE:
     password = 'actinia'
     esa_apihub_user = 'changeme'
     esa_apihub_pw = 'changeme'
+    # maximum number of jobs in one batch submission
+    batch_size = 500
+    # number of jobs of a batch forwarded to actinia-core at the same time
+    batch_concurrency = 8
+    # seconds to wait for a connection and for each response
+    connect_timeout = 5
+    read_timeout = 30
+    # retries of idempotent requests, waiting backoff * 2^n seconds
+    retries = 3
+    retry_backoff = 0.5
+    # connections kept open per worker
+    pool_size = 10
+    # seconds between health checks of actinia-core and the jobtable
+    health_interval = 10
+    # submissions to actinia-core running at a time per worker, more are
+    # answered with 503
+    max_in_flight = 20
+    # seconds sent as Retry-After if max_in_flight is reached
+    retry_after = 5
+    # urls of all actinia-core deployments to send jobs to, only url if
+    # empty. url is also used for jobs created before backends were set.
+    backends = []
+    # weight of each backend, 1 for all if empty
+    weights = []
+    # how a backend is chosen for a job: least_jobs, round_robin or affinity
+    routing = 'least_jobs'
+    # key of the job whose value decides the backend for routing affinity,
+    # so jobs on the same input data are sent to the same backend
+    affinity_key = 'feature_type'
+
+
+class WEBHOOK:
+    """Default config for status webhooks of actinia-core
+    """
+    # buffer "running" webhooks and write only the latest one per job
+    write_behind = False
+    # milliseconds after which buffered webhooks are written
+    flush_interval = 1000
+    # number of buffered jobs which triggers writing right away
+    flush_size = 200
+
+
+class JOBEVENTS:
+    """Default config for the stream of job changes
+    """
+    # seconds between keep-alive comments of server-sent events
+    heartbeat = 15
+    # maximum seconds a long-poll request waits for events
+    max_wait = 60
+    # maximum number of undelivered events per client
+    queue_size = 1000
+
+
+class JOBQUEUE:
+    """Default config for queued submission of jobs to actinia-core
+    """
+    # answer new jobs with 202 and submit them by background workers
+    enabled = False
+    # submitting threads per worker
+    workers = 4
+    # seconds between checks for queued jobs of other workers
+    poll_interval = 2
+    # seconds before a failed submission is tried again
+    retry_delay = 30
+    # failed submissions after which a job is set to ERROR
+    max_attempts = 5
+    # seconds after which a job claimed by a submitter which died is
+    # submitted again
+    lease = 300
+
+
+class CIRCUITBREAKER:
+    """Default config for the circuit breaker in front of actinia-core
+    """
+    # number of last calls to compute the error and slow call rates
+    window = 20
+    # calls in the window before the circuit can open
+    min_calls = 10
+    # rate of failed calls which opens the circuit
+    error_rate = 0.5
+    # milliseconds after which a call is counted as slow
+    slow_ms = 10000
+    # rate of slow calls which opens the circuit
+    slow_rate = 0.8
+    # seconds the circuit stays open before trial calls are let through
+    open_seconds = 30
+    # successful trial calls which close the circuit again
+    half_open_calls = 3
+
+
+class RECONCILER:
+    """Default config for polling actinia-core for jobs whose webhooks were
+    lost
+    """
+    # poll the status of stale jobs in the background
+    enabled = False
+    # seconds between runs
+    interval = 60
+    # seconds without change after which a PENDING or RUNNING job is polled
+    stale_seconds = 600
+    # jobs read and polled at a time
+    batch_size = 50
+    # status requests sent at the same time
+    concurrency = 4
+    # maximum status requests per second
+    rate = 10
 
 
 class GISTABLE:
@@ -114,6 +289,8 @@ class Configfile:
 
         # JOBTABLE
         if config.has_section("JOBTABLE"):
+            if config.has_option("JOBTABLE", "store"):
+                JOBTABLE.store = config.get("JOBTABLE", "store")
             if config.has_option("JOBTABLE", "host"):
                 JOBTABLE.host = config.get("JOBTABLE", "host")
             if config.has_option("JOBTABLE", "port"):
@@ -130,6 +307,90 @@ class Configfile:
                 JOBTABLE.table = config.get("JOBTABLE", "table")
             if config.has_option("JOBTABLE", "id_field"):
                 JOBTABLE.id_field = config.get("JOBTABLE", "id_field")
+            if config.has_option("JOBTABLE", "max_connections"):
+                JOBTABLE.max_connections = config.getint(
+                    "JOBTABLE", "max_connections")
+            if config.has_option("JOBTABLE", "stale_timeout"):
+                JOBTABLE.stale_timeout = config.getint(
+                    "JOBTABLE", "stale_timeout")
+            if config.has_option("JOBTABLE", "pool_timeout"):
+                JOBTABLE.pool_timeout = config.getint(
+                    "JOBTABLE", "pool_timeout")
+            if config.has_option("JOBTABLE", "prewarm"):
+                JOBTABLE.prewarm = config.getint("JOBTABLE", "prewarm")
+            if config.has_option("JOBTABLE", "page_size"):
+                JOBTABLE.page_size = config.getint("JOBTABLE", "page_size")
+            if config.has_option("JOBTABLE", "notify_channel"):
+                JOBTABLE.notify_channel = config.get(
+                    "JOBTABLE", "notify_channel")
+            if config.has_option("JOBTABLE", "archive_table"):
+                JOBTABLE.archive_table = config.get(
+                    "JOBTABLE", "archive_table")
+            if config.has_option("JOBTABLE", "archive_after"):
+                JOBTABLE.archive_after = config.getint(
+                    "JOBTABLE", "archive_after")
+            if config.has_option("JOBTABLE", "archive_batch"):
+                JOBTABLE.archive_batch = config.getint(
+                    "JOBTABLE", "archive_batch")
+            if config.has_option("JOBTABLE", "export_chunk"):
+                JOBTABLE.export_chunk = config.getint(
+                    "JOBTABLE", "export_chunk")
+            if config.has_option("JOBTABLE", "create_indexes"):
+                JOBTABLE.create_indexes = config.getboolean(
+                    "JOBTABLE", "create_indexes")
+            if config.has_option("JOBTABLE", "stats_shards"):
+                JOBTABLE.stats_shards = config.getint(
+                    "JOBTABLE", "stats_shards")
+
+        # JOBTABLE_REPLICA
+        if config.has_section("JOBTABLE_REPLICA"):
+            if config.has_option("JOBTABLE_REPLICA", "host"):
+                JOBTABLE_REPLICA.host = config.get("JOBTABLE_REPLICA", "host")
+            if config.has_option("JOBTABLE_REPLICA", "port"):
+                JOBTABLE_REPLICA.port = config.get("JOBTABLE_REPLICA", "port")
+            if config.has_option("JOBTABLE_REPLICA", "database"):
+                JOBTABLE_REPLICA.database = config.get(
+                    "JOBTABLE_REPLICA", "database")
+            if config.has_option("JOBTABLE_REPLICA", "user"):
+                JOBTABLE_REPLICA.user = config.get("JOBTABLE_REPLICA", "user")
+            if config.has_option("JOBTABLE_REPLICA", "pw"):
+                JOBTABLE_REPLICA.pw = config.get("JOBTABLE_REPLICA", "pw")
+            if config.has_option("JOBTABLE_REPLICA", "max_connections"):
+                JOBTABLE_REPLICA.max_connections = config.getint(
+                    "JOBTABLE_REPLICA", "max_connections")
+            if config.has_option("JOBTABLE_REPLICA", "recent_seconds"):
+                JOBTABLE_REPLICA.recent_seconds = config.getint(
+                    "JOBTABLE_REPLICA", "recent_seconds")
+
+        # JOBCACHE
+        if config.has_section("JOBCACHE"):
+            if config.has_option("JOBCACHE", "size"):
+                JOBCACHE.size = config.getint("JOBCACHE", "size")
+            if config.has_option("JOBCACHE", "ttl"):
+                JOBCACHE.ttl = config.getint("JOBCACHE", "ttl")
+            if config.has_option("JOBCACHE", "http_max_age"):
+                JOBCACHE.http_max_age = config.getint(
+                    "JOBCACHE", "http_max_age")
+
+        # PAYLOADSTORE
+        if config.has_section("PAYLOADSTORE"):
+            if config.has_option("PAYLOADSTORE", "table"):
+                PAYLOADSTORE.table = config.get("PAYLOADSTORE", "table")
+            if config.has_option("PAYLOADSTORE", "min_size"):
+                PAYLOADSTORE.min_size = config.getint(
+                    "PAYLOADSTORE", "min_size")
+            if config.has_option("PAYLOADSTORE", "process_results"):
+                PAYLOADSTORE.process_results = config.getint(
+                    "PAYLOADSTORE", "process_results")
+            if config.has_option("PAYLOADSTORE", "process_log"):
+                PAYLOADSTORE.process_log = config.getint(
+                    "PAYLOADSTORE", "process_log")
+            if config.has_option("PAYLOADSTORE", "process_chain_list"):
+                PAYLOADSTORE.process_chain_list = config.getint(
+                    "PAYLOADSTORE", "process_chain_list")
+            if config.has_option("PAYLOADSTORE", "resources"):
+                PAYLOADSTORE.resources = config.getint(
+                    "PAYLOADSTORE", "resources")
 
         # LOGGING
         if config.has_section("LOGCONFIG"):
@@ -157,6 +418,134 @@ class Configfile:
             if config.has_option("ACTINIACORE", "esa_apihub_pw"):
                 ACTINIACORE.esa_apihub_pw = config.get(
                     "ACTINIACORE", "esa_apihub_pw")
+            if config.has_option("ACTINIACORE", "batch_size"):
+                ACTINIACORE.batch_size = config.getint(
+                    "ACTINIACORE", "batch_size")
+            if config.has_option("ACTINIACORE", "batch_concurrency"):
+                ACTINIACORE.batch_concurrency = config.getint(
+                    "ACTINIACORE", "batch_concurrency")
+            if config.has_option("ACTINIACORE", "connect_timeout"):
+                ACTINIACORE.connect_timeout = config.getfloat(
+                    "ACTINIACORE", "connect_timeout")
+            if config.has_option("ACTINIACORE", "read_timeout"):
+                ACTINIACORE.read_timeout = config.getfloat(
+                    "ACTINIACORE", "read_timeout")
+            if config.has_option("ACTINIACORE", "retries"):
+                ACTINIACORE.retries = config.getint(
+                    "ACTINIACORE", "retries")
+            if config.has_option("ACTINIACORE", "retry_backoff"):
+                ACTINIACORE.retry_backoff = config.getfloat(
+                    "ACTINIACORE", "retry_backoff")
+            if config.has_option("ACTINIACORE", "pool_size"):
+                ACTINIACORE.pool_size = config.getint(
+                    "ACTINIACORE", "pool_size")
+            if config.has_option("ACTINIACORE", "health_interval"):
+                ACTINIACORE.health_interval = config.getfloat(
+                    "ACTINIACORE", "health_interval")
+            if config.has_option("ACTINIACORE", "max_in_flight"):
+                ACTINIACORE.max_in_flight = config.getint(
+                    "ACTINIACORE", "max_in_flight")
+            if config.has_option("ACTINIACORE", "retry_after"):
+                ACTINIACORE.retry_after = config.getint(
+                    "ACTINIACORE", "retry_after")
+            if config.has_option("ACTINIACORE", "backends"):
+                ACTINIACORE.backends = [
+                    url.strip() for url in config.get(
+                        "ACTINIACORE", "backends").split(',')
+                    if url.strip()]
+            if config.has_option("ACTINIACORE", "weights"):
+                ACTINIACORE.weights = [
+                    int(weight) for weight in config.get(
+                        "ACTINIACORE", "weights").split(',')
+                    if weight.strip()]
+            if config.has_option("ACTINIACORE", "routing"):
+                ACTINIACORE.routing = config.get("ACTINIACORE", "routing")
+            if config.has_option("ACTINIACORE", "affinity_key"):
+                ACTINIACORE.affinity_key = config.get(
+                    "ACTINIACORE", "affinity_key")
+
+        # WEBHOOK
+        if config.has_section("WEBHOOK"):
+            if config.has_option("WEBHOOK", "write_behind"):
+                WEBHOOK.write_behind = config.getboolean(
+                    "WEBHOOK", "write_behind")
+            if config.has_option("WEBHOOK", "flush_interval"):
+                WEBHOOK.flush_interval = config.getint(
+                    "WEBHOOK", "flush_interval")
+            if config.has_option("WEBHOOK", "flush_size"):
+                WEBHOOK.flush_size = config.getint("WEBHOOK", "flush_size")
+
+        # JOBEVENTS
+        if config.has_section("JOBEVENTS"):
+            if config.has_option("JOBEVENTS", "heartbeat"):
+                JOBEVENTS.heartbeat = config.getint("JOBEVENTS", "heartbeat")
+            if config.has_option("JOBEVENTS", "max_wait"):
+                JOBEVENTS.max_wait = config.getint("JOBEVENTS", "max_wait")
+            if config.has_option("JOBEVENTS", "queue_size"):
+                JOBEVENTS.queue_size = config.getint(
+                    "JOBEVENTS", "queue_size")
+
+        # JOBQUEUE
+        if config.has_section("JOBQUEUE"):
+            if config.has_option("JOBQUEUE", "enabled"):
+                JOBQUEUE.enabled = config.getboolean("JOBQUEUE", "enabled")
+            if config.has_option("JOBQUEUE", "workers"):
+                JOBQUEUE.workers = config.getint("JOBQUEUE", "workers")
+            if config.has_option("JOBQUEUE", "poll_interval"):
+                JOBQUEUE.poll_interval = config.getfloat(
+                    "JOBQUEUE", "poll_interval")
+            if config.has_option("JOBQUEUE", "retry_delay"):
+                JOBQUEUE.retry_delay = config.getint(
+                    "JOBQUEUE", "retry_delay")
+            if config.has_option("JOBQUEUE", "max_attempts"):
+                JOBQUEUE.max_attempts = config.getint(
+                    "JOBQUEUE", "max_attempts")
+            if config.has_option("JOBQUEUE", "lease"):
+                JOBQUEUE.lease = config.getint("JOBQUEUE", "lease")
+
+        # RECONCILER
+        if config.has_section("RECONCILER"):
+            if config.has_option("RECONCILER", "enabled"):
+                RECONCILER.enabled = config.getboolean(
+                    "RECONCILER", "enabled")
+            if config.has_option("RECONCILER", "interval"):
+                RECONCILER.interval = config.getfloat(
+                    "RECONCILER", "interval")
+            if config.has_option("RECONCILER", "stale_seconds"):
+                RECONCILER.stale_seconds = config.getint(
+                    "RECONCILER", "stale_seconds")
+            if config.has_option("RECONCILER", "batch_size"):
+                RECONCILER.batch_size = config.getint(
+                    "RECONCILER", "batch_size")
+            if config.has_option("RECONCILER", "concurrency"):
+                RECONCILER.concurrency = config.getint(
+                    "RECONCILER", "concurrency")
+            if config.has_option("RECONCILER", "rate"):
+                RECONCILER.rate = config.getfloat("RECONCILER", "rate")
+
+        # CIRCUITBREAKER
+        if config.has_section("CIRCUITBREAKER"):
+            if config.has_option("CIRCUITBREAKER", "window"):
+                CIRCUITBREAKER.window = config.getint(
+                    "CIRCUITBREAKER", "window")
+            if config.has_option("CIRCUITBREAKER", "min_calls"):
+                CIRCUITBREAKER.min_calls = config.getint(
+                    "CIRCUITBREAKER", "min_calls")
+            if config.has_option("CIRCUITBREAKER", "error_rate"):
+                CIRCUITBREAKER.error_rate = config.getfloat(
+                    "CIRCUITBREAKER", "error_rate")
+            if config.has_option("CIRCUITBREAKER", "slow_ms"):
+                CIRCUITBREAKER.slow_ms = config.getint(
+                    "CIRCUITBREAKER", "slow_ms")
+            if config.has_option("CIRCUITBREAKER", "slow_rate"):
+                CIRCUITBREAKER.slow_rate = config.getfloat(
+                    "CIRCUITBREAKER", "slow_rate")
+            if config.has_option("CIRCUITBREAKER", "open_seconds"):
+                CIRCUITBREAKER.open_seconds = config.getfloat(
+                    "CIRCUITBREAKER", "open_seconds")
+            if config.has_option("CIRCUITBREAKER", "half_open_calls"):
+                CIRCUITBREAKER.half_open_calls = config.getint(
+                    "CIRCUITBREAKER", "half_open_calls")
 
         # GISTABLE
         if config.has_section("GISTABLE"):
@@ -34,7 +34,13 @@ entry_points = {
     'console_scripts': [
         'name = actinia_gdi.resources.cli:name',
         'about = actinia_gdi.resources.cli:about',
-        'pc2grass = actinia_gdi.resources.cli:pc2grass'
+        'pc2grass = actinia_gdi.resources.cli:pc2grass',
+        'jobindexes = actinia_gdi.resources.cli:jobindexes',
+        'createjobindexes = actinia_gdi.resources.cli:createjobindexes',
+        'archivejobs = actinia_gdi.resources.cli:archivejobs',
+        'purgepayloads = actinia_gdi.resources.cli:purgepayloads',
+        'rebuildjobstats = actinia_gdi.resources.cli:rebuildjobstats',
+        'exportjobs = actinia_gdi.resources.cli:exportjobs'
     ]
 }
 
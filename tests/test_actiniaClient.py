@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from actinia_gdi.core.actiniaClient import ActiniaCoreClient
+from actinia_gdi.core.loadShedding import CircuitOpenError
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    connections = set()
+    # status codes to answer before 200
+    failures = []
+
+    def answer(self):
+        Handler.requests.append((self.command, self.path))
+        Handler.connections.add(self.client_address)
+        if self.path.startswith('/api/v1/slow'):
+            time.sleep(0.5)
+        status = Handler.failures.pop(0) if Handler.failures else 200
+        body = b'{"status": "ok"}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = answer
+
+    def log_message(self, *args):
+        pass
+
+
+class Config:
+    user = 'actinia'
+    password = 'actinia'
+    connect_timeout = 1
+    read_timeout = 0.2
+    retries = 2
+    retry_backoff = 0
+    pool_size = 2
+    backends = []
+
+
+class BreakerConfig:
+    window = 4
+    min_calls = 4
+    error_rate = 0.5
+    slow_ms = 10000
+    slow_rate = 1
+    open_seconds = 60
+    half_open_calls = 1
+
+
+class ActiniaCoreClientTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        Config.url = 'http://127.0.0.1:%s/api/v1/' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        Handler.requests = []
+        Handler.connections = set()
+        Handler.failures = []
+        self.client = ActiniaCoreClient(Config, BreakerConfig)
+
+    def test_connection_reused(self):
+        for _ in range(3):
+            assert self.client.get(Config.url + 'version').status_code == 200
+
+        assert len(Handler.requests) == 3
+        assert len(Handler.connections) == 1
+        stats = self.client.stats()['GET version']
+        assert stats['calls'] == 3
+        assert stats['errors'] == 0
+
+    def test_retry_idempotent_only(self):
+        Handler.failures = [503]
+        assert self.client.get(Config.url + 'version').status_code == 200
+        assert len(Handler.requests) == 2
+
+        Handler.failures = [503]
+        resp = self.client.post(Config.url + 'locations/x', data='{}')
+        assert resp.status_code == 503
+        assert len(Handler.requests) == 3
+        assert self.client.stats()['POST locations']['errors'] == 1
+
+    def test_read_timeout(self):
+        with self.assertRaises(requests.exceptions.RequestException):
+            self.client.post(Config.url + 'slow')
+        assert self.client.stats()['POST slow']['errors'] == 1
+
+    def test_circuit_opens_on_errors(self):
+        Handler.failures = [500, 500, 500, 500]
+        for _ in range(4):
+            self.client.get(Config.url + 'version')
+        assert self.client.breaker().stats()['state'] == 'open'
+
+        with self.assertRaises(CircuitOpenError) as context:
+            self.client.get(Config.url + 'version')
+        assert context.exception.retry_after > 0
+        assert len(Handler.requests) == 4
+
+    def test_probe_bypasses_circuit(self):
+        Handler.failures = [500, 500, 500, 500]
+        for _ in range(4):
+            self.client.get(Config.url + 'version')
+
+        assert self.client.probe(Config.url + 'version').status_code == 200
+        assert len(Handler.requests) == 5
+        # a successful probe does not close the circuit
+        assert self.client.breaker().stats()['state'] == 'open'
@@ -0,0 +1,569 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import threading
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from flask import Flask, Response, json
+from flask_restful_swagger_2 import Api
+
+from actinia_gdi import endpoints
+from actinia_gdi.api.processes.processes import setJobCacheHeaders
+from actinia_gdi.api.processes.processes import streamJobs
+from actinia_gdi.core import payloadStore, processes
+from actinia_gdi.core.processes import validateJobs
+from actinia_gdi.core import actiniaCore, jobEvents
+from actinia_gdi.core.jobStore import MemoryJobStore
+from actinia_gdi.core.jobtable import decodeJobCursor
+from actinia_gdi.core.loadShedding import CircuitOpenError
+from actinia_gdi.core.payloadStore import decompressPayload, splitPayloads
+from actinia_gdi.resources.config import ACTINIACORE, JOBCACHE, JOBEVENTS
+
+
+def actiniaCoreResp(resourceId, status='accepted'):
+    return {
+        'resource_id': resourceId,
+        'status': status,
+        'urls': {'status': 'http://actinia-core/resources/gdi/'
+                 + resourceId}
+    }
+
+
+app = Flask(__name__)
+endpoints.addEndpoints(app, Api(app))
+
+
+class JobCacheHeadersTest(unittest.TestCase):
+
+    def test_running_job(self):
+        job = {'idpk_jobs': 3, 'version': 2, 'status': 'RUNNING',
+               'time_modified': datetime(2020, 1, 2, 3, 4, 5),
+               'time_created': datetime(2020, 1, 1)}
+
+        res = setJobCacheHeaders(Response(''), job)
+
+        assert res.get_etag() == ('3-2', False)
+        assert res.headers['Last-Modified'] == 'Thu, 02 Jan 2020 03:04:05 GMT'
+        assert res.cache_control.no_cache
+        assert res.cache_control.max_age is None
+
+    def test_finished_job(self):
+        job = {'idpk_jobs': 3, 'version': 4, 'status': 'SUCCESS',
+               'time_modified': None,
+               'time_ended': datetime(2020, 1, 2)}
+
+        res = setJobCacheHeaders(Response(''), job)
+
+        assert res.headers['Last-Modified'] == 'Thu, 02 Jan 2020 00:00:00 GMT'
+        assert res.cache_control.public
+        assert res.cache_control.max_age == JOBCACHE.http_max_age
+
+    def test_etag_of_fields(self):
+        job = {'idpk_jobs': 3, 'version': 2, 'status': 'RUNNING'}
+
+        status = setJobCacheHeaders(Response(''), job, 'status')
+        process = setJobCacheHeaders(Response(''), job, 'process')
+
+        assert status.get_etag()[0].startswith('3-2-')
+        assert status.get_etag() != process.get_etag()
+
+
+class JobsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+        self.store.insertNewJobs([
+            ({}, {'feature_uuid': uuid}, 'loop', None,
+             actiniaCoreResp('resource_id-' + uuid)) for uuid in 'abc'])
+        patcher = mock.patch.object(processes, 'jobStore', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+
+    def test_pages(self):
+        resp = self.client.get('/processes/loop/jobs?limit=2&fields=status')
+        first = resp.get_json()
+
+        assert [job['idpk_jobs'] for job in first['jobs']] == [1, 2]
+        assert first['jobs'][0] == {'idpk_jobs': 1, 'status': 'PENDING'}
+
+        resp = self.client.get('/processes/loop/jobs?limit=2&after='
+                               + first['next'])
+        rest = resp.get_json()
+
+        assert [job['idpk_jobs'] for job in rest['jobs']] == [3]
+        assert rest['next'] is None
+
+    def test_filter(self):
+        resp = self.client.get(
+            '/processes/loop/jobs?job_description.feature_uuid=b')
+
+        assert [job['idpk_jobs'] for job in resp.get_json()['jobs']] == [2]
+
+    def test_order(self):
+        resp = self.client.get('/processes/loop/jobs?limit=2'
+                               '&order_by=-idpk_jobs&fields=status')
+        first = resp.get_json()
+
+        assert [job['idpk_jobs'] for job in first['jobs']] == [3, 2]
+        assert resp.mimetype == 'application/json'
+
+        resp = self.client.get('/processes/loop/jobs?limit=2'
+                               '&order_by=-idpk_jobs&after=' + first['next'])
+
+        assert [job['idpk_jobs'] for job in resp.get_json()['jobs']] == [1]
+
+    def test_bad_request(self):
+        for args in ['limit=0', 'limit=x', 'unknown=x', 'after=x',
+                     'fields=unknown', 'order_by=job_description']:
+            resp = self.client.get('/processes/loop/jobs?' + args)
+            assert resp.status_code == 400, args
+
+
+class StreamJobsTest(unittest.TestCase):
+
+    def stream(self, jobs, limit, orderBy=None):
+        return json.loads(''.join(streamJobs(iter(jobs), limit, orderBy)))
+
+    def test_all_jobs(self):
+        jobs = [{'idpk_jobs': 1}, {'idpk_jobs': 2}]
+
+        assert self.stream(jobs, None) == {'jobs': jobs, 'next': None}
+        assert self.stream([], None) == {'jobs': [], 'next': None}
+
+    def test_limit_reached(self):
+        jobs = [{'idpk_jobs': 1, 'status': 'SUCCESS'},
+                {'idpk_jobs': 2, 'status': 'RUNNING'}]
+
+        listing = self.stream(jobs, 2, '-status')
+
+        assert listing['jobs'] == jobs
+        assert decodeJobCursor(listing['next'], '-status') == {
+            'id': 2, 'value': 'RUNNING'}
+
+    def test_less_than_limit(self):
+        # no more jobs to list
+        assert self.stream([{'idpk_jobs': 1}], 2)['next'] is None
+
+    def test_streamed(self):
+        chunks = streamJobs(iter([{'idpk_jobs': 1}]), None)
+
+        # the document is started before the first job is read
+        assert next(chunks) == '{"jobs": ['
+
+
+class JobIdTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+        self.store.insertNewJob({}, {'feature_uuid': 'a'}, 'loop', None,
+                                actiniaCoreResp('resource_id-1'))
+        patcher = mock.patch.object(processes, 'jobStore', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+
+    def test_get_fields(self):
+        resp = self.client.get('/processes/loop/jobs/1?fields=status')
+
+        assert resp.status_code == 200
+        assert resp.get_json() == {'idpk_jobs': 1, 'status': 'PENDING'}
+        assert resp.headers['ETag'].startswith('"1-0-')
+
+    def test_unknown_field(self):
+        resp = self.client.get('/processes/loop/jobs/1?fields=unknown')
+
+        assert resp.status_code == 400
+
+    def test_unknown_job(self):
+        resp = self.client.get('/processes/loop/jobs/7')
+
+        assert resp.status_code == 404
+
+    def test_etag_of_body(self):
+        self.store.updateJobByResourceID(
+            'resource_id-1', actiniaCoreResp('resource_id-1', 'running'),
+            'running')
+        getJobVersion = processes.getJobVersion
+
+        def changedAfterVersion(jobid):
+            # the job changes between the conditional check and the read
+            version = getJobVersion(jobid)
+            self.store.updateJobByResourceID(
+                'resource_id-1',
+                actiniaCoreResp('resource_id-1', 'finished'), 'finished')
+            return version
+
+        with mock.patch(
+                'actinia_gdi.api.processes.processes.getJobVersion',
+                changedAfterVersion):
+            resp = self.client.get('/processes/loop/jobs/1?fields=status')
+
+        assert resp.get_json()['status'] == 'SUCCESS'
+        assert resp.headers['ETag'].startswith('"1-2-')
+        assert resp.headers['Cache-Control'].startswith('public')
+
+
+class JobPostTest(unittest.TestCase):
+
+    def setUp(self):
+        for target, name, value in [
+                (processes, 'jobStore', MemoryJobStore()),
+                (processes.backendRouter, 'choose', lambda jsonDict: None)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+
+    def test_unhealthy(self):
+        with mock.patch.object(processes, 'checkConnectionWithoutResponse',
+                               return_value=None):
+            resp = self.client.post('/processes/loop/jobs', json={})
+
+        assert resp.status_code == 503
+        assert resp.headers['Retry-After'] == str(
+            ACTINIACORE.health_interval)
+
+    def test_circuit_open(self):
+        # the circuit opened after the backend was chosen
+        with mock.patch.object(processes, 'checkConnectionWithoutResponse',
+                               return_value=True), \
+                mock.patch.object(actiniaCore.actiniaCoreClient, 'post',
+                                  side_effect=CircuitOpenError(30)):
+            resp = self.client.post('/processes/loop/jobs', json={})
+
+        assert resp.status_code == 503
+        assert resp.headers['Retry-After'] == '30'
+        assert processes.jobStore.getAllIds() == []
+
+
+class JobEventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+        for resourceId in ['resource_id-1', 'resource_id-2']:
+            self.store.insertNewJob({}, {}, 'loop', None,
+                                    actiniaCoreResp(resourceId))
+        # the memory store sends the events to the listener of this worker,
+        # which does not listen on postgres
+        for patcher in [
+                mock.patch.object(processes, 'jobStore', self.store),
+                mock.patch.object(jobEvents.jobEventListener, 'start'),
+                mock.patch.object(JOBEVENTS, 'heartbeat', 0.05)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+        self.subscribers = list(jobEvents.jobEventListener._subscribers)
+
+    def tearDown(self):
+        # every stream and long-poll unsubscribes when it ends
+        assert jobEvents.jobEventListener._subscribers == self.subscribers
+
+    def running(self, resourceId, delay):
+        timer = threading.Timer(
+            delay, self.store.updateJobByResourceID,
+            (resourceId, actiniaCoreResp(resourceId, 'running'), 'running'))
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_long_poll(self):
+        self.running('resource_id-2', 0.1)
+
+        resp = self.client.get('/processes/loop/jobs/events?timeout=5')
+
+        assert resp.status_code == 200
+        events = resp.get_json()['events']
+        assert [event['idpk_jobs'] for event in events] == [2]
+        assert events[0]['status'] == 'RUNNING'
+        assert events[0]['version'] == 1
+
+    def test_long_poll_timeout(self):
+        resp = self.client.get('/processes/loop/jobs/events?timeout=0')
+
+        assert resp.get_json() == {'events': [], 'reset': False}
+
+    def test_long_poll_filter(self):
+        self.running('resource_id-1', 0.05)
+        self.running('resource_id-2', 0.1)
+
+        resp = self.client.get(
+            '/processes/test/jobs/events?idpk_jobs=2&timeout=5')
+
+        assert [event['idpk_jobs']
+                for event in resp.get_json()['events']] == [2]
+
+    def test_long_poll_known_version(self):
+        self.store.updateJobByResourceID(
+            'resource_id-1', actiniaCoreResp('resource_id-1', 'running'),
+            'running')
+
+        # the job changed before the request, it is returned right away
+        resp = self.client.get(
+            '/processes/loop/jobs/events?idpk_jobs=1&version=0&timeout=5')
+
+        assert resp.get_json()['events'] == [{
+            'idpk_jobs': 1, 'status': 'RUNNING', 'process': 'loop',
+            'actinia_core_jobid': 'resource_id-1', 'version': 1}]
+
+    def test_bad_request(self):
+        for args in ['timeout=x', 'version=x', 'status__gte=RUNNING']:
+            resp = self.client.get('/processes/loop/jobs/events?' + args)
+            assert resp.status_code == 400, args
+
+    def test_stream(self):
+        resp = self.client.get('/processes/loop/jobs/events',
+                               headers={'Accept': 'text/event-stream'},
+                               buffered=False)
+        chunks = resp.response
+
+        assert resp.mimetype == 'text/event-stream'
+        assert resp.headers['Cache-Control'] == 'no-cache'
+        assert next(chunks) == b': connected\n\n'
+        assert next(chunks) == b': keep-alive\n\n'
+
+        self.store.updateJobByResourceID(
+            'resource_id-1', actiniaCoreResp('resource_id-1', 'running'),
+            'running')
+
+        event, data = next(chunks).decode().strip().split('\n')
+        assert event == 'event: job'
+        assert json.loads(data[len('data: '):])['status'] == 'RUNNING'
+        resp.close()
+
+    def test_stream_reset(self):
+        resp = self.client.get('/processes/loop/jobs/events',
+                               headers={'Accept': 'text/event-stream'},
+                               buffered=False)
+        chunks = resp.response
+        next(chunks)
+
+        # the client did not read, so events are dropped
+        with mock.patch.object(jobEvents.queue.Queue, 'put_nowait',
+                               side_effect=jobEvents.queue.Full):
+            self.store.cancelJobById(1)
+
+        assert next(chunks) == b'event: reset\ndata: {}\n\n'
+        resp.close()
+
+
+class ValidateJobsTest(unittest.TestCase):
+
+    def test_valid_jobs(self):
+        assert validateJobs([{'feature_uuid': 'a'}, {}]) == []
+
+    def test_invalid_jobs(self):
+        assert validateJobs({'feature_uuid': 'a'}) == [
+            {'index': None, 'message': 'expected a non-empty array'}]
+        assert validateJobs([]) == [
+            {'index': None, 'message': 'expected a non-empty array'}]
+        assert validateJobs([{}, 'b', None]) == [
+            {'index': 1, 'message': 'expected an object'},
+            {'index': 2, 'message': 'expected an object'}]
+
+    def test_too_many_jobs(self):
+        with mock.patch.object(ACTINIACORE, 'batch_size', 2):
+            errors = validateJobs([{}, {}, {}])
+
+        assert errors == [{'index': None, 'message': 'more than 2 jobs'}]
+
+
+class JobBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+        for target, name, value in [
+                (processes, 'jobStore', self.store),
+                (processes.backendRouter, 'chooseMany',
+                 lambda jsonList: [None] * len(jsonList)),
+                (processes, 'checkConnectionWithoutResponse',
+                 lambda service: True)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+
+    def test_partially_failing_batch(self):
+        def postActiniaCore(process, jsonDict, url):
+            if jsonDict['feature_uuid'] == 'b':
+                raise Exception('actinia-core not reachable')
+            status = 'error' if jsonDict['feature_uuid'] == 'c' else None
+            return actiniaCoreResp(
+                'resource_id-' + jsonDict['feature_uuid'],
+                status or 'accepted')
+
+        with mock.patch.object(processes, 'postActiniaCore',
+                               postActiniaCore), \
+                mock.patch.object(processes, 'updateJob', return_value=None):
+            resp = self.client.post('/processes/loop/jobs:batch', json=[
+                {'feature_uuid': 'a'}, {'feature_uuid': 'b'},
+                {'feature_uuid': 'c'}])
+
+        jobs = resp.get_json()['jobs']
+        assert resp.status_code == 207
+        assert jobs[0]['job']['actinia_core_jobid'] == 'resource_id-a'
+        assert jobs[1] == {'index': 1,
+                           'message': 'Could not start job in actinia-core'}
+        # the failed job could not be updated
+        assert jobs[2] == {'index': 2,
+                           'message': 'Could not update job in jobtable'}
+
+    def test_failed_insert(self):
+        def postActiniaCore(process, jsonDict, url):
+            return actiniaCoreResp('resource_id-' + jsonDict['feature_uuid'])
+
+        with mock.patch.object(processes, 'postActiniaCore',
+                               postActiniaCore), \
+                mock.patch.object(processes.backendRouter, 'chooseMany',
+                                  return_value=['http://core-1/',
+                                                'http://core-2/']), \
+                mock.patch.object(self.store, 'insertNewJobs',
+                                  side_effect=Exception('no jobtable')), \
+                mock.patch.object(processes, 'cancelActiniaCore',
+                                  return_value=True) as cancelActiniaCore:
+            resp = self.client.post('/processes/loop/jobs:batch', json=[
+                {'feature_uuid': 'a'}, {'feature_uuid': 'b'}])
+
+        assert resp.status_code == 500
+        assert resp.get_json()['jobs'][1] == {
+            'index': 1, 'message': 'Could not write job to jobtable'}
+        # the started jobs are not left running in actinia-core
+        assert cancelActiniaCore.call_args_list == [
+            mock.call('resource_id-a', 'http://core-1/'),
+            mock.call('resource_id-b', 'http://core-2/')]
+
+    def test_invalid_item(self):
+        resp = self.client.post('/processes/loop/jobs:batch',
+                                json=[{'feature_uuid': 'a'}, 'b'])
+
+        assert resp.status_code == 400
+
+
+class JobExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+        self.store.insertNewJobs([
+            ({}, {'feature_uuid': uuid}, 'loop', None,
+             actiniaCoreResp('resource_id-' + uuid)) for uuid in 'ab'])
+        patcher = mock.patch.object(processes, 'jobStore', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+
+    def test_export(self):
+        resp = self.client.get('/processes/test/jobs/export?format=csv'
+                               + '&status=PENDING')
+
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        assert resp.headers['Content-Disposition'] == (
+            'attachment; filename="jobs-test.csv"')
+        assert len(resp.get_data(as_text=True).splitlines()) == 3
+
+    def test_invalid_export(self):
+        for args in ['format=xml', 'unknown=x']:
+            resp = self.client.get('/processes/test/jobs/export?' + args)
+            assert resp.status_code == 400, args
+
+
+class PayloadRefsTest(unittest.TestCase):
+    """ Responses of the jobtable hold references to stored payloads,
+    which are resolved in all API responses
+    """
+
+    def setUp(self):
+        self.payloads = dict()
+        self.store = MemoryJobStore()
+        self.store.insertNewJob({}, {'feature_uuid': 'a'}, 'loop', None,
+                                self.largeResp('resource_id-1'))
+        self.store._jobs[1]['actinia_core_response'] = self.split(
+            self.store._jobs[1]['actinia_core_response'])
+
+        for target, name, value in [
+                (processes, 'jobStore', self.store),
+                (payloadStore, '_readPayloads', self.readPayloads),
+                (processes.backendRouter, 'choose', lambda jsonDict: None),
+                (processes, 'checkConnectionWithoutResponse',
+                 lambda service: True)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+
+    def largeResp(self, resourceId):
+        resp = actiniaCoreResp(resourceId)
+        resp['process_log'] = [{'stdout': 'x' * 5000}]
+        return resp
+
+    def split(self, resp):
+        resp, payloads = splitPayloads(resp)
+        for _, digest, codec, data in payloads:
+            self.payloads[digest] = decompressPayload(codec, data)
+        return resp
+
+    def readPayloads(self, digests, db):
+        return {digest: self.payloads[digest] for digest in digests}
+
+    def assertResolved(self, data):
+        assert '$ref' not in data
+        assert 'x' * 5000 in data
+
+    def test_read_jobs(self):
+        for url in ['/processes/loop/jobs', '/processes/loop/jobs/1',
+                    '/processes/test/jobs/export']:
+            self.assertResolved(self.client.get(url).get_data(as_text=True))
+
+    def test_create_job(self):
+        insertNewJob = self.store.insertNewJob
+
+        def insertSplit(*args):
+            record = insertNewJob(*args)
+            stored = self.store._jobs[record['idpk_jobs']]
+            stored['actinia_core_response'] = self.split(
+                stored['actinia_core_response'])
+            record['actinia_core_response'] = stored['actinia_core_response']
+            return record
+
+        largeResp = self.largeResp('resource_id-2')
+        with mock.patch.object(self.store, 'insertNewJob', insertSplit), \
+                mock.patch.object(processes, 'postActiniaCore',
+                                  return_value=largeResp):
+            resp = self.client.post('/processes/loop/jobs',
+                                    json={'feature_uuid': 'b'})
+
+        assert resp.status_code == 201
+        self.assertResolved(resp.get_data(as_text=True))
+
+    def test_cancel_job(self):
+        with mock.patch.object(processes, 'cancelActiniaCore',
+                               return_value=True):
+            resp = self.client.post(
+                '/processes/loop/jobs/1/operations/cancel')
+
+        assert resp.get_json()['status'] == 'TERMINATED'
+        self.assertResolved(resp.get_data(as_text=True))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+ASYNC = all(importlib.util.find_spec(name) is not None
+            for name in ['gevent', 'psycogreen'])
+
+# jobs are kept in memory, so the app starts without postgres
+CONFIG = """
+[JOBTABLE]
+store = memory
+
+[JOBEVENTS]
+heartbeat = 1
+"""
+
+# serves the app with one gevent worker and reads from an open event
+# stream while other requests are answered
+SMOKE = """
+import json
+import time
+
+from actinia_gdi.asyncwsgi import application
+
+import psycopg2.extensions
+import requests
+from gevent import monkey
+from gevent.pywsgi import WSGIServer
+
+server = WSGIServer(('127.0.0.1', 0), application, log=None)
+server.start()
+url = 'http://127.0.0.1:%s/processes/test/jobs' % server.server_port
+
+stream = requests.get(url + '/events', stream=True, timeout=10,
+                      headers={'Accept': 'text/event-stream'})
+lines = stream.iter_lines(decode_unicode=True)
+result = {'patched': monkey.is_module_patched('socket')
+          and psycopg2.extensions.get_wait_callback() is not None,
+          'stream': [next(lines)], 'requests': []}
+
+for path in ['/events?timeout=0', '?limit=1', '/events?timeout=1']:
+    started = time.time()
+    resp = requests.get(url + path, timeout=10)
+    result['requests'].append(
+        [resp.status_code, round(time.time() - started, 1)])
+
+# the stream was kept open meanwhile
+result['stream'] += [next(lines), next(lines)]
+stream.close()
+server.stop()
+print(json.dumps(result))
+"""
+
+
+@unittest.skipIf(not ASYNC, 'gevent or psycogreen are not installed')
+class AsyncWsgiTest(unittest.TestCase):
+
+    def test_stream_does_not_block_worker(self):
+        with tempfile.TemporaryDirectory() as cwd:
+            os.mkdir(os.path.join(cwd, 'config'))
+            with open(os.path.join(cwd, 'config', 'test.ini'), 'w') as f:
+                f.write(CONFIG)
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+                [os.getcwd()] + sys.path))
+            proc = subprocess.run(
+                [sys.executable, '-c', SMOKE], cwd=cwd, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+
+        assert proc.returncode == 0, proc.stderr.decode()[-2000:]
+        result = json.loads(proc.stdout.decode().splitlines()[-1])
+
+        assert result['patched']
+        assert result['stream'] == [': connected', '', ': keep-alive']
+        # answered while the stream is open, the long-poll after its timeout
+        assert [status for status, _ in result['requests']] == [200] * 3
+        assert result['requests'][0][1] < 1
+        assert result['requests'][1][1] < 1
+        assert 1 <= result['requests'][2][1] < 2
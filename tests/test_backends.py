@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import unittest
+
+from actinia_gdi.core.actiniaClient import ActiniaCoreClient
+from actinia_gdi.core.backends import BackendRouter
+from actinia_gdi.core.loadShedding import ServiceUnavailable
+
+
+class Config:
+    url = 'http://core-1/api/v1/'
+    backends = ['http://core-1/api/v1/', 'http://core-2/api/v1/',
+                'http://core-3/api/v1/']
+    user = 'actinia'
+    password = 'actinia'
+    pool_size = 1
+
+
+class BreakerConfig:
+    window = 1
+    min_calls = 1
+    error_rate = 1
+    slow_ms = 10000
+    slow_rate = 1
+    open_seconds = 60
+    half_open_calls = 1
+
+
+class BackendRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = ActiniaCoreClient(Config, BreakerConfig)
+        self.load = {None: 3, 'http://core-2/api/v1/': 1}
+
+    def router(self, policy, weights=[]):
+        return BackendRouter(self.client, weights, policy, 'feature_type',
+                             lambda: self.load)
+
+    def openCircuit(self, backend):
+        breaker = self.client.breaker(backend)
+        breaker.allow()
+        breaker.record(0, True)
+
+    def test_least_jobs(self):
+        # jobs without url belong to ACTINIACORE.url
+        backends = self.router('least_jobs').chooseMany([{}] * 4)
+        assert backends == ['http://core-3/api/v1/', 'http://core-2/api/v1/',
+                            'http://core-3/api/v1/', 'http://core-2/api/v1/']
+
+    def test_weighted_round_robin(self):
+        router = self.router('round_robin', [2, 1, 0])
+        backends = router.chooseMany([{}] * 6)
+        assert backends.count('http://core-1/api/v1/') == 4
+        assert backends.count('http://core-2/api/v1/') == 2
+        assert router.stats()['backends']['http://core-3/api/v1/'][
+            'routed'] == 0
+
+    def test_affinity(self):
+        router = self.router('affinity')
+        keys = ['tile-%s' % number for number in range(20)]
+        before = {key: router.choose({'feature_type': key}) for key in keys}
+        assert len(set(before.values())) == 3
+        assert router.choose({'feature_type': 'tile-1'}) == before['tile-1']
+
+        # only jobs of a failing backend move
+        self.openCircuit(before['tile-1'])
+        after = {key: router.choose({'feature_type': key}) for key in keys}
+        for key in keys:
+            if before[key] == before['tile-1']:
+                assert after[key] != before[key]
+            else:
+                assert after[key] == before[key]
+
+    def test_skips_open_circuits(self):
+        router = self.router('least_jobs')
+        self.openCircuit('http://core-2/api/v1/')
+        self.openCircuit('http://core-3/api/v1/')
+        assert router.chooseMany([{}] * 2) == ['http://core-1/api/v1/'] * 2
+
+        self.openCircuit('http://core-1/api/v1/')
+        assert router.retryAfter() > 0
+        with self.assertRaises(ServiceUnavailable) as context:
+            router.choose({})
+        assert context.exception.retry_after > 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import os
+import time
+import unittest
+from unittest import mock
+
+from actinia_gdi.core import healthProbe as healthProbeModule
+from actinia_gdi.core.healthProbe import HealthProbe, probeActiniaCore
+
+
+class HealthProbeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.failing = False
+
+    def probe(self):
+        self.calls.append(time.monotonic())
+        if self.failing:
+            raise ConnectionError('down')
+
+    def testStateIsCachedBetweenChecks(self):
+        healthProbe = HealthProbe(60, {'actinia_core': self.probe})
+        # pretend the thread is running
+        healthProbe._pid = os.getpid()
+        state = healthProbe.state()
+        self.assertTrue(state['actinia_core']['healthy'])
+        self.assertIsNone(state['actinia_core']['error'])
+        self.assertIn('latency_ms', state['actinia_core'])
+        self.failing = True
+        for _ in range(10):
+            self.assertTrue(healthProbe.isHealthy('actinia_core'))
+        self.assertEqual(len(self.calls), 1)
+
+    def testCheckStoresFailure(self):
+        healthProbe = HealthProbe(60, {'actinia_core': self.probe})
+        healthProbe._pid = os.getpid()
+        self.failing = True
+        healthProbe.check()
+        state = healthProbe.state()
+        self.assertFalse(state['actinia_core']['healthy'])
+        self.assertEqual(state['actinia_core']['error'], 'down')
+
+    def testStaleStateIsCheckedAgain(self):
+        healthProbe = HealthProbe(0.01, {'actinia_core': self.probe})
+        healthProbe._pid = os.getpid()
+        healthProbe.state()
+        time.sleep(0.05)
+        healthProbe.state()
+        self.assertEqual(len(self.calls), 2)
+
+    def testThreadRefreshesState(self):
+        healthProbe = HealthProbe(0.01, {'actinia_core': self.probe})
+        healthProbe.start()
+        time.sleep(0.1)
+        self.assertGreater(len(self.calls), 2)
+
+    def testProbeBypassesCircuitBreaker(self):
+        with mock.patch.object(healthProbeModule,
+                               'actiniaCoreClient') as client:
+            client.backends.return_value = ['http://core-1/']
+            client.probe.return_value.text = '{}'
+            probeActiniaCore()
+
+        client.probe.assert_called_once_with('http://core-1/version')
+        client.get.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
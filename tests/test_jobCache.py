@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import time
+import unittest
+
+from actinia_gdi.core.jobCache import JobCache
+
+
+TERMINAL = ['SUCCESS', 'ERROR', 'TERMINATED']
+
+
+class JobCacheTest(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = JobCache(10, 60, TERMINAL)
+
+        assert cache.get(1) is None
+        cache.put(1, {'idpk_jobs': 1, 'status': 'RUNNING'}, cache.token(1))
+
+        assert cache.get('1')['status'] == 'RUNNING'
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_lru_eviction(self):
+        cache = JobCache(2, 60, TERMINAL)
+        for jobid in [1, 2]:
+            cache.put(jobid, {'status': 'RUNNING'}, cache.token(jobid))
+        cache.get(1)
+        cache.put(3, {'status': 'RUNNING'}, cache.token(3))
+
+        assert cache.get(2) is None
+        assert cache.get(1) is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_ttl_only_for_unfinished_jobs(self):
+        cache = JobCache(10, 0, TERMINAL)
+        cache.put(1, {'status': 'RUNNING'}, cache.token(1))
+        cache.put(2, {'status': 'SUCCESS'}, cache.token(2))
+        time.sleep(0.01)
+
+        assert cache.get(1) is None
+        assert cache.get(2) is not None
+        assert cache.stats()['expirations'] == 1
+
+    def test_invalidate(self):
+        cache = JobCache(10, 60, TERMINAL)
+        cache.put(1, {'status': 'RUNNING'}, cache.token(1))
+        cache.invalidate(1)
+
+        assert cache.get(1) is None
+        assert cache.stats()['invalidations'] == 1
+
+    def test_no_put_of_record_read_before_invalidation(self):
+        cache = JobCache(10, 60, TERMINAL)
+        token = cache.token(1)
+        cache.invalidate(1)
+        cache.put(1, {'status': 'RUNNING'}, token)
+
+        assert cache.get(1) is None
+
+    def test_put_after_invalidation_of_other_job(self):
+        cache = JobCache(10, 60, TERMINAL)
+        token = cache.token(1)
+        cache.invalidate(2)
+        cache.put(1, {'status': 'RUNNING'}, token)
+
+        assert cache.get(1) is not None
+
+    def test_no_put_after_dropped_invalidation(self):
+        cache = JobCache(2, 60, TERMINAL)
+        token = cache.token(1)
+        # the invalidation of job 1 is dropped from the bounded generations
+        for jobid in [1, 2, 3]:
+            cache.invalidate(jobid)
+        cache.put(1, {'status': 'RUNNING'}, token)
+
+        assert cache.get(1) is None
+
+    def test_disabled(self):
+        cache = JobCache(0, 60, TERMINAL)
+        cache.put(1, {'status': 'SUCCESS'}, cache.token(1))
+
+        assert cache.get(1) is None
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import json
+import unittest
+from unittest import mock
+
+from werkzeug.datastructures import MultiDict
+
+from actinia_gdi.core import jobEvents
+from actinia_gdi.core.jobEvents import buildEventFilter, notifyJobChanges
+
+
+class NotifyJobChangesTest(unittest.TestCase):
+
+    @mock.patch.object(jobEvents, 'jobdb')
+    def test_one_statement(self, jobdb):
+        notifyJobChanges([
+            {'idpk_jobs': 1, 'status': 'RUNNING', 'version': 2},
+            {'idpk_jobs': 2, 'status': 'SUCCESS', 'version': 5}
+        ])
+
+        jobdb.execute_sql.assert_called_once()
+        sql, (channel, events) = jobdb.execute_sql.call_args[0]
+        assert 'unnest' in sql
+        assert [json.loads(event)['idpk_jobs'] for event in events] == [1, 2]
+        assert json.loads(events[1])['status'] == 'SUCCESS'
+
+    @mock.patch.object(jobEvents, 'jobdb')
+    def test_no_changes(self, jobdb):
+        notifyJobChanges([])
+
+        jobdb.execute_sql.assert_not_called()
+
+
+class BuildEventFilterTest(unittest.TestCase):
+
+    def test_filter_by_process(self):
+        matches = buildEventFilter(MultiDict(), 'loop')
+
+        assert matches({'idpk_jobs': 1, 'process': 'loop'})
+        assert not matches({'idpk_jobs': 2, 'process': 'test'})
+        assert buildEventFilter(MultiDict(), 'test')(
+            {'idpk_jobs': 2, 'process': 'loop'})
+
+    def test_filter_by_args(self):
+        matches = buildEventFilter(MultiDict([
+            ('idpk_jobs__in', '1,2'),
+            ('status', 'RUNNING'),
+            # args of the stream
+            ('timeout', '5')
+        ]), 'test')
+
+        assert matches({'idpk_jobs': 2, 'status': 'RUNNING'})
+        assert not matches({'idpk_jobs': 3, 'status': 'RUNNING'})
+        assert not matches({'idpk_jobs': 1, 'status': 'SUCCESS'})
+
+    def test_invalid_filter(self):
+        for key in ['process', 'status__gte', 'job_description']:
+            assert buildEventFilter(MultiDict([(key, 'x')]), 'test') is None
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import csv
+import io
+import json
+import unittest
+from datetime import datetime
+
+from actinia_gdi.core.jobExport import exportJobs, pyarrow
+
+
+JOBS = [{
+    'idpk_jobs': jobid,
+    'status': 'SUCCESS',
+    'job_description': {'feature_uuid': str(jobid)},
+    'time_created': datetime(2020, 1, jobid),
+    'version': 2
+} for jobid in range(1, 8)]
+
+
+class JobExportTest(unittest.TestCase):
+
+    def test_ndjson(self):
+        parts = list(exportJobs(iter(JOBS), 'ndjson', 3))
+        lines = b''.join(parts).decode('utf-8').splitlines()
+
+        assert len(parts) == 3
+        assert len(lines) == 7
+        job = json.loads(lines[0])
+        assert job['job_description'] == {'feature_uuid': '1'}
+        assert job['time_created'] == '2020-01-01T00:00:00'
+        assert job['time_ended'] is None
+
+    def test_csv(self):
+        data = b''.join(exportJobs(iter(JOBS), 'csv', 3)).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(data)))
+
+        assert len(rows) == 7
+        assert rows[6]['idpk_jobs'] == '7'
+        assert json.loads(rows[6]['job_description']) == {
+            'feature_uuid': '7'}
+
+    def test_streamed_in_chunks(self):
+        read = []
+
+        def records():
+            for job in JOBS:
+                read.append(job['idpk_jobs'])
+                yield job
+
+        parts = exportJobs(records(), 'ndjson', 3)
+        next(parts)
+
+        # only the first chunk was read
+        assert read == [1, 2, 3]
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet
+
+        data = b''.join(exportJobs(iter(JOBS), 'parquet', 3))
+        parquet = pyarrow.parquet.ParquetFile(io.BytesIO(data))
+
+        assert parquet.num_row_groups == 3
+        table = parquet.read()
+        assert table.num_rows == 7
+        assert table.column('version').to_pylist() == [2] * 7
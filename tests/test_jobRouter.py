@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import time
+import unittest
+from unittest import mock
+
+from actinia_gdi.core.jobRouter import JobRouter
+
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+
+@mock.patch('actinia_gdi.core.jobRouter.jobEventListener')
+class JobRouterTest(unittest.TestCase):
+
+    def test_without_replica(self, listener):
+        router = JobRouter(PRIMARY, None, 10)
+        router.changed(1)
+
+        assert router.read() == PRIMARY
+        assert router.read(2) == PRIMARY
+
+    def test_reads_from_replica(self, listener):
+        router = JobRouter(PRIMARY, REPLICA, 10)
+
+        assert router.read() == REPLICA
+        assert router.read(1) == REPLICA
+        listener.start.assert_called()
+
+    def test_changed_job_read_from_primary(self, listener):
+        router = JobRouter(PRIMARY, REPLICA, 10)
+        router.changed(1)
+
+        assert router.read('1') == PRIMARY
+        assert router.read(2) == REPLICA
+        assert router.read() == REPLICA
+
+    def test_changed_job_expires(self, listener):
+        router = JobRouter(PRIMARY, REPLICA, 0)
+        router.changed(1)
+        time.sleep(0.01)
+
+        assert router.read(1) == REPLICA
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import unittest
+from unittest import mock
+
+from peewee import ColumnMetadata, Model
+
+from actinia_gdi.core import jobStats
+from actinia_gdi.core.jobStats import bucketPercentiles
+from actinia_gdi.resources.config import JOBTABLE
+
+
+class JobStatsTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        # bucket 3 holds durations up to one second, bucket 39 up to 1023 s
+        stats = bucketPercentiles({3: 50, 11: 40, 39: 10})
+
+        assert stats['count'] == 100
+        assert stats['p50'] == 1.0
+        assert stats['p90'] == 7.0
+        assert stats['p99'] == 1023.0
+
+    def test_no_durations(self):
+        stats = bucketPercentiles({})
+
+        assert stats == {'count': 0, 'p50': None, 'p90': None, 'p99': None}
+
+
+class FakeCursor:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+@mock.patch.object(Model, 'table_exists', return_value=True)
+class InitJobStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executed = []
+        self.bodies = jobStats._functionBodies(['SUCCESS', 'ERROR'])
+        self.columns = ['process', 'status', 'shard', 'count']
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        if 'pg_proc' in sql:
+            return FakeCursor([
+                ('%s_stats_%s' % (JOBTABLE.table, suffix), body)
+                for suffix, body in self.bodies.items()])
+        if 'pg_trigger' in sql:
+            return FakeCursor([(1,)])
+        return FakeCursor([])
+
+    def getColumns(self, table, schema=None):
+        return [ColumnMetadata(name, 'integer', False, False, table, None)
+                for name in self.columns]
+
+    def initJobStats(self, terminalStatus):
+        with mock.patch.object(jobStats, 'jobdb') as jobdb, \
+                mock.patch.object(jobStats, 'rebuildJobStats') as rebuild:
+            jobdb.execute_sql.side_effect = self.execute
+            jobdb.get_columns.side_effect = self.getColumns
+            jobStats.initJobStats(terminalStatus)
+        self.jobdb = jobdb
+        return rebuild
+
+    def test_unchanged(self, tableExists):
+        rebuild = self.initJobStats(['SUCCESS', 'ERROR'])
+
+        assert len(self.executed) == 2
+        assert not any('advisory' in sql or 'CREATE' in sql
+                       for sql in self.executed)
+        rebuild.assert_not_called()
+
+    def test_changed_trigger(self, tableExists):
+        rebuild = self.initJobStats(['SUCCESS', 'ERROR', 'TERMINATED'])
+
+        # the function differs, the lock is taken before anything is created
+        assert 'pg_advisory_xact_lock' in self.executed[1]
+        assert 'CREATE TRIGGER' in self.executed[-1]
+        # the tables exist, so the statistics are kept
+        rebuild.assert_not_called()
+
+    def test_unsharded_tables(self, tableExists):
+        self.columns = ['process', 'status', 'count']
+        # both checks and the migration see the tables, then they are gone
+        tableExists.side_effect = [True] * 7 + [False]
+
+        rebuild = self.initJobStats(['SUCCESS', 'ERROR'])
+
+        # the old tables are dropped and filled again after creating them
+        assert 'pg_advisory_xact_lock' in self.executed[0]
+        self.jobdb.drop_tables.assert_called_once()
+        rebuild.assert_called_once_with(['SUCCESS', 'ERROR'])
+
+
+class TriggerTest(unittest.TestCase):
+
+    def test_sharded_counts(self):
+        trigger = jobStats._functionBodies(['SUCCESS'])['trigger']
+
+        assert 'NEW.idpk_jobs %% %s' % JOBTABLE.stats_shards in trigger
+        assert trigger.count('AND shard = s;') == 2
+        assert 'ON CONFLICT (process, status, shard)' in trigger
+
+    def test_lock_order(self):
+        trigger = jobStats._functionBodies(['SUCCESS'])['trigger']
+        update = trigger[trigger.index("TG_OP = 'UPDATE'"):
+                         trigger.index('ELSE\n                    INSERT')]
+        lower, higher = update.split('ELSE')
+
+        # the counter row with the lower key is always changed first
+        assert lower.index('count - 1') < lower.index('INSERT')
+        assert higher.index('INSERT') < higher.index('count - 1')
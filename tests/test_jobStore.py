@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import unittest
+from unittest import mock
+
+from actinia_gdi.core import processes
+from actinia_gdi.core.jobStore import JobStore, MemoryJobStore
+from actinia_gdi.core.jobStore import PostgresJobStore, jsonContains
+from actinia_gdi.core.jobtable import encodeJobCursor
+
+
+def actiniaCoreResp(resourceId, status='accepted'):
+    return {
+        'resource_id': resourceId,
+        'status': status,
+        'urls': {'status': 'http://actinia-core/resources/gdi/'
+                 + resourceId}
+    }
+
+
+class JobStoreTest(unittest.TestCase):
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            JobStore()
+
+        class PartialJobStore(JobStore):
+
+            def getJobById(self, jobid, fields=None):
+                return None
+
+        # a store missing methods fails on creation, not on first use
+        with self.assertRaises(TypeError) as raised:
+            PartialJobStore()
+        assert 'insertNewJob' in str(raised.exception)
+
+    def test_stores_implement_interface(self):
+        for store in [PostgresJobStore, MemoryJobStore]:
+            assert not store.__abstractmethods__, store
+
+
+class MemoryJobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+        self.store.insertNewJobs([
+            ({}, {'feature_uuid': 'a'}, 'test', None,
+             actiniaCoreResp('resource_id-1')),
+            ({}, {'feature_uuid': 'b'}, 'loop', None,
+             actiniaCoreResp('resource_id-2')),
+            ({}, {'feature_uuid': 'c'}, 'loop', None,
+             actiniaCoreResp('resource_id-3'))
+        ])
+
+    def test_insert_and_get(self):
+        job = self.store.getJobById('2')
+
+        assert job['idpk_jobs'] == 2
+        assert job['status'] == 'PENDING'
+        assert job['actinia_core_jobid'] == 'resource_id-2'
+        assert self.store.getJobById(2, 'status') == {
+            'idpk_jobs': 2, 'status': 'PENDING'}
+        assert self.store.getJobById(4) is None
+        assert self.store.getJobById(2, 'unknown') is None
+        assert self.store.getAllIds() == [1, 2, 3]
+
+    def test_status_transitions(self):
+        job, uuid, _ = self.store.updateJobByResourceID(
+            'resource_id-1', actiniaCoreResp('resource_id-1', 'running'),
+            'running')
+        assert job['status'] == 'RUNNING'
+        assert job['version'] == 1
+        assert uuid == 'a'
+
+        job = self.store.cancelJobById(1)
+        assert job['status'] == 'TERMINATED'
+
+        job, _, _ = self.store.updateJobByResourceID(
+            'resource_id-1', actiniaCoreResp('resource_id-1', 'finished'),
+            'finished')
+        assert job['status'] == 'TERMINATED'
+        assert job['version'] == 2
+
+    def test_filter_and_pages(self):
+        jobs = self.store.getAllJobs({}, 'loop')
+        assert [job['idpk_jobs'] for job in jobs] == [2, 3]
+
+        jobs = self.store.getAllJobs(
+            {'job_description.feature_uuid': 'c'}, 'test')
+        assert [job['idpk_jobs'] for job in jobs] == [3]
+        assert self.store.getAllJobs({'unknown': 'x'}, 'test') is None
+
+        first = list(self.store.iterJobs({}, 'test', 2, orderBy='-idpk_jobs'))
+        after = encodeJobCursor(first[-1], '-idpk_jobs')
+        rest = list(self.store.iterJobs({}, 'test', after=after,
+                                        orderBy='-idpk_jobs'))
+        assert [job['idpk_jobs'] for job in first + rest] == [3, 2, 1]
+
+        # the cursor of the default order holds only the id
+        after = encodeJobCursor({'idpk_jobs': 1})
+        jobs = self.store.iterJobs({}, 'test', after=after)
+        assert [job['idpk_jobs'] for job in jobs] == [2, 3]
+
+    def test_order_without_value(self):
+        self.store.cancelJobById(2)
+
+        jobs = self.store.iterJobs({}, 'test', orderBy='time_ended')
+        assert [job['idpk_jobs'] for job in jobs] == [2, 1, 3]
+
+        # as in the index, jobs without value come first if descending
+        first = list(self.store.iterJobs({}, 'test', 2,
+                                         orderBy='-time_ended'))
+        after = encodeJobCursor(first[-1], '-time_ended')
+        rest = list(self.store.iterJobs({}, 'test', after=after,
+                                        orderBy='-time_ended'))
+        assert [job['idpk_jobs'] for job in first + rest] == [3, 1, 2]
+
+    def test_submit_queued_job(self):
+        queued = self.store.insertNewJob({'a': 1}, {}, 'loop', None, None)
+        assert queued['status'] == 'QUEUED'
+
+        submitted = []
+
+        def submit(process, preProcessChain):
+            submitted.append((process, preProcessChain))
+            return actiniaCoreResp('resource_id-4'), 'http://core-2/'
+
+        job = self.store.submitQueuedJob(submit, None)
+        assert submitted == [('loop', {'a': 1})]
+        assert job['status'] == 'PENDING'
+        assert job['actinia_core_jobid'] == 'resource_id-4'
+        assert job['actinia_core_url'] == 'http://core-2/'
+        assert self.store.getBackendLoad() == {None: 3, 'http://core-2/': 1}
+        assert self.store.submitQueuedJob(submit, None) is None
+
+    def test_failed_submission_stays_queued(self):
+        self.store.insertNewJob({}, {}, 'loop', None, None)
+
+        job = self.store.submitQueuedJob(lambda process, pc: (None, None),
+                                         None)
+        assert job['status'] == 'QUEUED'
+        assert job['submit_attempts'] == 1
+        # tried again after JOBQUEUE.retry_delay
+        assert self.store.submitQueuedJob(
+            lambda process, pc: (None, None), None) is None
+
+    def test_cancel_while_submitting(self):
+        self.store.insertNewJob({}, {}, 'loop', None, None)
+        cancelled = []
+
+        def cancel(resourceId, url):
+            cancelled.append((resourceId, url))
+
+        def submit(process, preProcessChain):
+            job = self.store.cancelJobById(4)
+            assert job['status'] == 'TERMINATED'
+            return actiniaCoreResp('resource_id-4'), 'http://core-2/'
+
+        job = self.store.submitQueuedJob(submit, cancel)
+        assert job['status'] == 'TERMINATED'
+        assert job['actinia_core_jobid'] is None
+        # the job created in actinia-core is cancelled as well
+        assert cancelled == [('resource_id-4', 'http://core-2/')]
+
+    def test_cancel_after_submission(self):
+        self.store.insertNewJob({}, {}, 'loop', None, None)
+        getJobById = self.store.getJobById
+
+        def submittedAfterRead(jobid):
+            job = getJobById(jobid)
+            self.store.submitQueuedJob(
+                lambda process, pc: (actiniaCoreResp('resource_id-4'),
+                                     'http://core-2/'), None)
+            return job
+
+        with mock.patch.object(processes, 'jobStore', self.store), \
+                mock.patch.object(self.store, 'getJobById',
+                                  submittedAfterRead), \
+                mock.patch.object(processes, 'checkConnectionWithoutResponse',
+                                  return_value=True), \
+                mock.patch.object(processes, 'cancelActiniaCore',
+                                  return_value=True) as cancelActiniaCore:
+            job = processes.cancelJob(4)
+
+        assert job['status'] == 'TERMINATED'
+        cancelActiniaCore.assert_called_once_with('resource_id-4',
+                                                  'http://core-2/')
+
+    def test_json_contains(self):
+        assert jsonContains({'a': {'b': 1, 'c': 2}}, {'a': {'b': 1}})
+        assert jsonContains({'a': [1, 2]}, {'a': [2]})
+        assert not jsonContains({'a': 1}, {'b': 1})
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from playhouse.postgres_ext import PostgresqlExtDatabase
+
+from actinia_gdi.model.jobtabelle import JobDatabase
+
+
+class FakeConnection:
+    closed = 0
+    server_version = 120000
+
+    def get_transaction_status(self):
+        return 0
+
+    def close(self):
+        self.closed = 1
+
+
+@mock.patch.object(PostgresqlExtDatabase, '_connect',
+                   lambda self: FakeConnection())
+class JobDatabaseTest(unittest.TestCase):
+
+    def test_prewarm(self):
+        db = JobDatabase('test', max_connections=4, timeout=1)
+        db.prewarm(2)
+        stats = db.stats()
+
+        assert stats['connects'] == 2
+        assert stats['idle'] == 2
+        assert stats['checkouts'] == 0
+
+    def test_reuse_and_waits(self):
+        db = JobDatabase('test', max_connections=1, timeout=2)
+
+        def hold():
+            db.connect()
+            time.sleep(0.2)
+            db.close()
+
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = db.stats()
+
+        assert stats['checkouts'] == 2
+        assert stats['connects'] == 1
+        assert stats['waits'] == 1
+        assert stats['wait_seconds'] > 0
+        assert stats['in_use'] == 0
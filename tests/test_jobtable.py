@@ -0,0 +1,571 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from werkzeug.datastructures import MultiDict
+
+from actinia_gdi.core import jobtable
+from actinia_gdi.core.jobtable import buildJobFilter, parseJobFilters
+from actinia_gdi.core.jobtable import compareJobIndexes, jobIndexStatements
+from actinia_gdi.core.jobtable import decodeJobCursor, encodeJobCursor
+from actinia_gdi.core.jobtable import keysetCondition, orderColumns
+from actinia_gdi.core.jobtable import parseJobFields, parseJobOrder
+from actinia_gdi.model.jobtabelle import Job, JobArchive
+from actinia_gdi.resources.config import JOBCACHE, JOBTABLE
+
+
+def where(condition):
+    sql, params = Job.select(Job.idpk_jobs).where(condition).sql()
+    return sql.split(' WHERE ', 1)[1], params
+
+
+def names(columns):
+    return [column.name for column in columns]
+
+
+class JobIndexesTest(unittest.TestCase):
+
+    def test_compare_job_indexes(self):
+        report = compareJobIndexes(['a', 'b', 'c'], [
+            ('a', True, False, 5),
+            # left invalid by an aborted build
+            ('b', False, False, 0),
+            ('pkey', True, True, 0),
+            ('old', True, False, 0)
+        ])
+
+        assert report == {
+            'declared': ['a', 'b', 'c'],
+            'missing': ['b', 'c'],
+            'unused': ['b', 'old'],
+            'undeclared': ['old']
+        }
+
+    def test_job_index_statements(self):
+        statements = jobIndexStatements(['job_time_created_idpk_jobs'])
+
+        assert [name for name, _, _ in statements] == [
+            'job_time_created_idpk_jobs', 'job_time_created_idpk_jobs']
+        assert statements[0][1] == (
+            'DROP INDEX CONCURRENTLY IF EXISTS '
+            '"%s"."job_time_created_idpk_jobs"' % JOBTABLE.schema)
+        assert statements[1][1].startswith(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+            '"job_time_created_idpk_jobs"')
+        assert statements[1][1].endswith(
+            '("time_created", "idpk_jobs")')
+
+    def test_no_job_index_statements(self):
+        assert jobIndexStatements([]) == []
+
+    def test_indexes_after_columns(self):
+        calls = mock.Mock()
+        with mock.patch.object(Job, 'table_exists', return_value=True), \
+                mock.patch.object(jobtable, 'addJobColumns',
+                                  calls.addJobColumns), \
+                mock.patch.object(jobtable, 'initJobArchive',
+                                  calls.initJobArchive), \
+                mock.patch.object(jobtable.JobPayload, 'create_table'), \
+                mock.patch.object(jobtable, 'initJobStats'), \
+                mock.patch.object(jobtable, 'startJobIndexes',
+                                  calls.startJobIndexes):
+            jobtable.initJobDB()
+
+        assert [call[0] for call in calls.mock_calls] == [
+            'addJobColumns', 'initJobArchive', 'addJobColumns',
+            'startJobIndexes']
+
+
+class JobFilterTest(unittest.TestCase):
+
+    def test_parse_job_filters(self):
+        conditions = parseJobFilters(MultiDict([
+            ('limit', '10'),
+            ('status', 'RUNNING'),
+            ('idpk_jobs__in', '1,2'),
+            ('time_created__gte', '2020-01-01T01:00:00+01:00'),
+            ('job_description.feature_uuid', 'a')
+        ]))
+
+        assert [(field.name, operator, value)
+                for field, operator, value in conditions] == [
+            ('status', '=', 'RUNNING'),
+            ('idpk_jobs', 'in', [1, 2]),
+            ('time_created', 'gte', datetime(2020, 1, 1)),
+            ('job_description', 'contains', {'feature_uuid': 'a'})
+        ]
+        assert parseJobFilters(MultiDict()) == []
+
+    def test_parse_invalid_job_filters(self):
+        for key, value in [
+                ('unknown', 'x'),
+                ('status__like', 'RUN'),
+                ('idpk_jobs', 'x'),
+                ('time_created__lt', 'yesterday'),
+                # only the indexed JSON columns
+                ('rule_configuration.feature_uuid', 'a'),
+                ('job_description', 'a'),
+                ('job_description__contains', '{'),
+                ('status.key', 'x')]:
+            assert parseJobFilters(MultiDict([(key, value)])) is None, key
+
+    def test_build_job_filter(self):
+        assert where(buildJobFilter(MultiDict([('status__in', 'QUEUED')]),
+                                    'loop')) == (
+            '(("t1"."process" = %s) AND ("t1"."status" IN (%s)))',
+            ['loop', 'QUEUED'])
+        assert buildJobFilter(MultiDict([('unknown', 'x')]), 'loop') is None
+
+
+class JobFieldsTest(unittest.TestCase):
+
+    def test_parse_job_fields(self):
+        assert parseJobFields(None) == []
+        assert parseJobFields('') == []
+        # the id is always read
+        assert names(parseJobFields('status, process,')) == [
+            'idpk_jobs', 'status', 'process']
+        assert names(parseJobFields('idpk_jobs')) == ['idpk_jobs']
+        columns = parseJobFields('time_ended', JobArchive)
+        assert columns[1] is JobArchive.time_ended
+
+    def test_parse_unknown_job_fields(self):
+        assert parseJobFields('status,unknown') is None
+
+
+class JobOrderTest(unittest.TestCase):
+
+    def test_order_columns(self):
+        columns = orderColumns()
+
+        assert 'time_created' in columns
+        assert 'actinia_core_jobid' in columns
+        # only indexed together with time_modified
+        assert 'time_modified' not in columns
+        assert orderColumns(JobArchive) == columns
+
+    def test_parse_job_order(self):
+        assert parseJobOrder(None) == (Job.idpk_jobs, False)
+        assert parseJobOrder('-idpk_jobs') == (Job.idpk_jobs, True)
+        assert parseJobOrder('time_created') == (Job.time_created, False)
+        assert parseJobOrder('-time_ended') == (Job.time_ended, True)
+        field, descending = parseJobOrder('time_ended', JobArchive)
+        assert field is JobArchive.time_ended
+
+    def test_parse_invalid_job_order(self):
+        assert parseJobOrder('time_started') is None
+        assert parseJobOrder('job_description') is None
+        assert parseJobOrder('unknown') is None
+
+
+class JobCursorTest(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        record = {'idpk_jobs': 7, 'time_created': datetime(2020, 1, 2, 3)}
+
+        cursor = encodeJobCursor(record, '-time_created')
+        position = decodeJobCursor(cursor, '-time_created')
+
+        assert position == {'id': 7, 'value': datetime(2020, 1, 2, 3)}
+        assert decodeJobCursor(encodeJobCursor(record)) == {
+            'id': 7, 'value': None}
+
+    def test_cursor_without_value(self):
+        record = {'idpk_jobs': 7, 'time_ended': None}
+
+        cursor = encodeJobCursor(record, 'time_ended')
+
+        assert decodeJobCursor(cursor, 'time_ended') == {
+            'id': 7, 'value': None}
+
+    def test_invalid_cursor(self):
+        cursor = encodeJobCursor({'idpk_jobs': 7, 'status': 'RUNNING'},
+                                 'status')
+
+        # created for another order
+        assert decodeJobCursor(cursor, '-status') is None
+        assert decodeJobCursor(cursor) is None
+        assert decodeJobCursor('not a cursor', 'status') is None
+
+
+class KeysetConditionTest(unittest.TestCase):
+
+    def test_order_by_id(self):
+        position = {'id': 7, 'value': None}
+
+        assert where(keysetCondition(
+            Job.idpk_jobs, False, Job.idpk_jobs, position)) == (
+            '("t1"."idpk_jobs" > %s)', [7])
+        assert where(keysetCondition(
+            Job.idpk_jobs, True, Job.idpk_jobs, position)) == (
+            '("t1"."idpk_jobs" < %s)', [7])
+
+    def test_row_value_comparison(self):
+        position = {'id': 7, 'value': 'RUNNING'}
+
+        assert where(keysetCondition(
+            Job.status, False, Job.idpk_jobs, position)) == (
+            '(("t1"."status", "t1"."idpk_jobs") > (%s, %s))',
+            ['RUNNING', 7])
+        assert where(keysetCondition(
+            Job.status, True, Job.idpk_jobs, position)) == (
+            '(("t1"."status", "t1"."idpk_jobs") < (%s, %s))',
+            ['RUNNING', 7])
+
+    def test_position_without_value(self):
+        # continues the segment of jobs without value by id
+        position = {'id': 7, 'value': None}
+
+        assert where(keysetCondition(
+            Job.time_ended, True, Job.idpk_jobs, position)) == (
+            '("t1"."idpk_jobs" < %s)', [7])
+
+
+def runningResp(resourceId, log):
+    return {'resource_id': resourceId, 'status': 'running',
+            'process_log': [{'stdout': log * 5000}]}
+
+
+@mock.patch.object(jobtable, 'jobChanged')
+@mock.patch.object(jobtable, 'notifyJobChanges')
+@mock.patch.object(jobtable, 'jobdb')
+class UpdateJobsByResourceIDsTest(unittest.TestCase):
+
+    def update(self, records):
+        query = mock.Mock()
+        query.execute.return_value = records
+        update = mock.patch.object(jobtable.Job, 'update')
+        self.addCleanup(update.stop)
+        update.start().return_value.from_.return_value.where.return_value \
+            .returning.return_value.dicts.return_value = query
+        return jobtable.updateJobsByResourceIDs({
+            'resource_id-1': (runningResp('resource_id-1', 'a'), 'utcnow'),
+            'resource_id-2': (runningResp('resource_id-2', 'b'), 'utcnow')})
+
+    @mock.patch.object(jobtable, 'insertPayloads')
+    def test_payloads_of_updated_jobs(self, insertPayloads, jobdb, notify,
+                                      changed):
+        # the status of the second job does not allow the update
+        count = self.update([{'idpk_jobs': 1, 'status': 'RUNNING',
+                              'actinia_core_jobid': 'resource_id-1'}])
+
+        assert count == 1
+        payloads = insertPayloads.call_args[0][0]
+        assert insertPayloads.call_count == 1
+        assert [field for field, _, _, _ in payloads] == ['process_log']
+        notify.assert_called_once()
+
+    @mock.patch.object(jobtable, 'insertPayloads')
+    def test_no_updated_jobs(self, insertPayloads, jobdb, notify, changed):
+        assert self.update([]) == 0
+        insertPayloads.assert_not_called()
+
+
+class FakeCursor:
+
+    def __init__(self, rows, fields=None):
+        # the columns of RETURNING and SELECT, by default the whole job
+        columns = [field.column_name
+                   for field in fields or Job._meta.sorted_fields]
+        self.description = [(column,) for column in columns]
+        self.rows = [tuple(row.get(column) for column in columns)
+                     for row in rows]
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+@mock.patch.object(jobtable, 'jobChanged')
+@mock.patch.object(jobtable, 'notifyJobChanges')
+@mock.patch.object(jobtable, 'jobdb')
+class CompareAndSetTest(unittest.TestCase):
+    """ The status transitions are checked by the WHERE of the UPDATE sent
+    to postgres, not by reading the job before
+    """
+
+    def execute(self, *results):
+        self.executed = []
+        results = list(results)
+
+        def executeSql(sql, params=None, *args, **kwargs):
+            self.executed.append((sql, params))
+            return FakeCursor(results.pop(0))
+
+        execute = mock.patch.object(
+            Job._meta.database, 'execute_sql', side_effect=executeSql)
+        self.addCleanup(execute.stop)
+        execute.start()
+
+    def test_update_status(self, jobdb, notify, changed):
+        self.execute([{'idpk_jobs': 1, 'status': 'SUCCESS',
+                       'job_description': {'feature_uuid': 'uuid'}}])
+
+        record, uuid, _ = jobtable.updateJobByResourceID(
+            'resource_id-1', {'status': 'finished'}, 'finished')
+
+        sql, params = self.executed[0]
+        assert len(self.executed) == 1
+        assert sql.startswith('UPDATE ')
+        assert (' WHERE (("tab_jobs"."actinia_core_jobid" = %s) AND '
+                '("tab_jobs"."status" IN (%s, %s))) RETURNING ') in sql
+        assert params[-3:] == ['resource_id-1', 'PENDING', 'RUNNING']
+        assert '"version" = ("tab_jobs"."version" + %s)' in sql
+        assert record['status'] == 'SUCCESS' and uuid == 'uuid'
+        notify.assert_called_once()
+        changed.assert_called_once_with(1)
+
+    def test_transition_not_allowed(self, jobdb, notify, changed):
+        # the job was terminated before the webhook arrived
+        self.execute([], [{'idpk_jobs': 1, 'status': 'TERMINATED'}])
+
+        record, _, _ = jobtable.updateJobByResourceID(
+            'resource_id-1', {'status': 'running'}, 'running')
+
+        assert self.executed[0][0].startswith('UPDATE ')
+        assert self.executed[1][0].startswith('SELECT ')
+        assert record['status'] == 'TERMINATED'
+        notify.assert_not_called()
+        changed.assert_not_called()
+
+    def test_no_predecessors(self, jobdb, notify, changed):
+        # a webhook can not set a job back to pending, nothing is updated
+        self.execute([{'idpk_jobs': 1, 'status': 'RUNNING'}])
+
+        record, _, _ = jobtable.updateJobByResourceID(
+            'resource_id-1', {'status': 'accepted'}, 'accepted')
+
+        assert len(self.executed) == 1
+        assert self.executed[0][0].startswith('SELECT ')
+        assert record['status'] == 'RUNNING'
+
+    def test_cancel(self, jobdb, notify, changed):
+        self.execute([{'idpk_jobs': 1, 'status': 'TERMINATED'}])
+
+        record = jobtable.cancelJobById(1, ['QUEUED'])
+
+        sql, params = self.executed[0]
+        assert (' WHERE (("tab_jobs"."idpk_jobs" = %s) AND '
+                '("tab_jobs"."status" IN (%s))) RETURNING ') in sql
+        assert params[-2:] == [1, 'QUEUED']
+        assert record['status'] == 'TERMINATED'
+        changed.assert_called_once_with(1)
+
+    def test_cancel_ended_job(self, jobdb, notify, changed):
+        self.execute([], [{'idpk_jobs': 1, 'status': 'SUCCESS'}])
+
+        record = jobtable.cancelJobById(1)
+
+        fromStatus = jobtable.JOB_STATUS_PREDECESSORS['TERMINATED']
+        assert self.executed[0][1][-len(fromStatus) - 1:] == [1] + fromStatus
+        assert self.executed[1][0].startswith('SELECT ')
+        assert record['status'] == 'SUCCESS'
+        notify.assert_not_called()
+
+
+class FakeReadDatabase:
+    """ Replica returning the given pages of jobs, one per query
+    """
+
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+    def execute(self, query):
+        self.executed.append(query.sql())
+        return FakeCursor(self.pages.pop(0) if self.pages else [],
+                          query._returning)
+
+
+def jobs(*ids, **values):
+    return [dict({'idpk_jobs': jobid}, **values) for jobid in ids]
+
+
+@mock.patch.object(JOBTABLE, 'page_size', 2)
+class IterJobPagesTest(unittest.TestCase):
+
+    def iterJobPages(self, db, *args, **kwargs):
+        with mock.patch.object(jobtable, 'jobRouter') as jobRouter:
+            jobRouter.read.return_value = db
+            return list(jobtable.iterJobPages(*args, **kwargs))
+
+    def test_pages(self):
+        db = FakeReadDatabase(jobs(1, 2), jobs(3, 4), jobs(5))
+
+        records = self.iterJobPages(db, Job.process == 'loop')
+
+        assert [job['idpk_jobs'] for job in records] == [1, 2, 3, 4, 5]
+        # each page continues behind the last job instead of an OFFSET
+        assert [params for _, params in db.executed] == [
+            ['loop', 2], ['loop', 2, 2], ['loop', 4, 2]]
+        sql = db.executed[1][0]
+        assert 'OFFSET' not in sql
+        assert sql.endswith('WHERE (("t1"."process" = %s) AND '
+                            '("t1"."idpk_jobs" > %s)) '
+                            'ORDER BY "t1"."idpk_jobs" ASC LIMIT %s')
+
+    def test_limit(self):
+        db = FakeReadDatabase(jobs(4, 5), jobs(6))
+
+        records = self.iterJobPages(db, Job.process == 'loop', limit=3,
+                                    position={'id': 3, 'value': None})
+
+        assert [job['idpk_jobs'] for job in records] == [4, 5, 6]
+        # the last page only reads the jobs left to the limit
+        assert [params for _, params in db.executed] == [
+            ['loop', 3, 2], ['loop', 5, 1]]
+
+    def test_order_with_null_values(self):
+        # jobs which did not end yet precede the others in descending order
+        db = FakeReadDatabase(
+            jobs(5, 4), jobs(3),
+            jobs(2, time_ended=datetime(2020, 1, 2))
+            + jobs(1, time_ended=datetime(2020, 1, 1)),
+            [])
+
+        records = self.iterJobPages(db, Job.process == 'loop',
+                                    order=(Job.time_ended, True))
+
+        assert [job['idpk_jobs'] for job in records] == [5, 4, 3, 2, 1]
+        where = [sql.split(' WHERE ')[1] for sql, _ in db.executed]
+        assert '"t1"."time_ended" IS NULL' in where[0]
+        assert '("t1"."idpk_jobs" < %s)' in where[1]
+        assert '"t1"."time_ended" IS NOT NULL' in where[2]
+        assert '"t1"."idpk_jobs" <' not in where[2]
+        assert where[2].endswith('ORDER BY "t1"."time_ended" DESC, '
+                                 '"t1"."idpk_jobs" DESC LIMIT %s')
+        assert db.executed[3][1][1:] == [datetime(2020, 1, 1), 1, 2]
+
+    def test_continue_in_segment_with_values(self):
+        db = FakeReadDatabase(jobs(1, time_ended=datetime(2020, 1, 1)))
+        position = {'id': 2, 'value': datetime(2020, 1, 2)}
+
+        records = self.iterJobPages(db, Job.process == 'loop',
+                                    position=position,
+                                    order=(Job.time_ended, True))
+
+        # the segment of jobs without value was listed before
+        assert [job['idpk_jobs'] for job in records] == [1]
+        assert len(db.executed) == 1
+        assert '(("t1"."time_ended", "t1"."idpk_jobs") < (%s, %s))' \
+            in db.executed[0][0]
+
+
+@mock.patch.object(jobtable, 'jobdb')
+class JobArchiveTest(unittest.TestCase):
+
+    def executed(self, jobdb):
+        return [call[0][0] for call in jobdb.execute_sql.call_args_list]
+
+    def test_init_job_archive(self, jobdb):
+        jobtable.initJobArchive()
+
+        executed = self.executed(jobdb)
+        assert 'PARTITION BY RANGE (time_created)' in executed[0]
+        assert 'DEFAULT' in executed[1]
+        # an index for each order of listings and GIN for job_description
+        assert sum(' USING ' not in sql for sql in executed[2:]) == \
+            1 + len(jobtable.orderColumns(JobArchive))
+        assert executed[-1] == (
+            'CREATE INDEX IF NOT EXISTS "%s_job_description" ON "%s"."%s" '
+            'USING GIN (job_description)' % (
+                JOBTABLE.archive_table, JOBTABLE.schema,
+                JOBTABLE.archive_table))
+
+    @mock.patch.object(JOBTABLE, 'archive_batch', 2)
+    def test_archive_jobs(self, jobdb):
+        select = mock.patch.object(Job, 'select')
+        self.addCleanup(select.stop)
+        select.start().return_value.where.return_value.order_by \
+            .return_value.limit.return_value.tuples.side_effect = [
+                [(1, datetime(2020, 1, 5)), (2, datetime(2020, 2, 1, 3))],
+                [(3, None)],
+                []]
+
+        assert jobtable.archiveJobs(10) == 3
+
+        executed = self.executed(jobdb)
+        # a partition for each month of the first batch, none for jobs
+        # without time_created
+        assert "FROM ('2020-01-01') TO ('2020-02-01')" in executed[0]
+        assert "FROM ('2020-02-01') TO ('2020-03-01')" in executed[1]
+        assert executed[2].startswith('WITH moved AS (DELETE FROM ')
+        assert 'RETURNING' in executed[2] and 'INSERT INTO' in executed[2]
+        assert jobdb.execute_sql.call_args_list[2][0][1] == ([1, 2],)
+        assert executed[3] == executed[2]
+        assert jobdb.execute_sql.call_args_list[3][0][1] == ([3],)
+        assert len(executed) == 4
+
+
+@mock.patch.object(jobtable.jobCache, 'size', 0)
+@mock.patch.object(JOBCACHE, 'size', 0)
+class ArchivedJobByIdTest(unittest.TestCase):
+
+    def getJobById(self, db, jobid, columns=None):
+        with mock.patch.object(jobtable, 'jobRouter') as jobRouter:
+            jobRouter.read.return_value = db
+            return jobtable.getJobById(jobid, columns)
+
+    def test_archived_job(self):
+        db = FakeReadDatabase([], jobs(4, status='SUCCESS'))
+
+        record = self.getJobById(db, 4)
+
+        assert record['idpk_jobs'] == 4 and record['status'] == 'SUCCESS'
+        # read from the archive after the jobtable
+        assert '"%s" AS "t1"' % JOBTABLE.table in db.executed[0][0]
+        assert '"%s" AS "t1"' % JOBTABLE.archive_table in db.executed[1][0]
+        assert db.executed[1][1][0] == 4
+
+    def test_archived_job_fields(self):
+        db = FakeReadDatabase([], jobs(4, status='SUCCESS'))
+
+        record = self.getJobById(db, 4, parseJobFields('status'))
+
+        assert record == {'idpk_jobs': 4, 'status': 'SUCCESS'}
+        assert db.executed[1][0].startswith(
+            'SELECT "t1"."idpk_jobs", "t1"."status" FROM ')
+
+    def test_unknown_job(self):
+        assert self.getJobById(FakeReadDatabase([], []), 4) is None
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import time
+import unittest
+
+from actinia_gdi.core.loadShedding import Admission, CircuitBreaker
+from actinia_gdi.core.loadShedding import ServiceUnavailable
+
+
+class Config:
+    window = 4
+    min_calls = 4
+    error_rate = 0.5
+    slow_ms = 100
+    slow_rate = 0.75
+    open_seconds = 0.05
+    half_open_calls = 2
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(Config)
+
+    def call(self, seconds=0, failed=False):
+        allowed = self.breaker.allow()
+        if allowed:
+            self.breaker.record(seconds, failed)
+        return allowed
+
+    def testOpensOnErrorRate(self):
+        for failed in [False, True, False]:
+            self.call(failed=failed)
+        self.assertEqual(self.breaker.stats()['state'], 'closed')
+        self.call(failed=True)
+        self.assertEqual(self.breaker.stats()['state'], 'open')
+        self.assertFalse(self.call())
+        self.assertEqual(self.breaker.retryAfter(), 1)
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def testOpensOnSlowCalls(self):
+        for _ in range(3):
+            self.call(seconds=0.2)
+        self.call()
+        self.assertEqual(self.breaker.stats()['state'], 'open')
+
+    def testHalfOpenTrialsClose(self):
+        for _ in range(4):
+            self.call(failed=True)
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.retryAfter(), 0)
+        # one trial at a time
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(0, False)
+        self.assertEqual(self.breaker.stats()['state'], 'half_open')
+        self.assertTrue(self.call())
+        self.assertEqual(self.breaker.stats()['state'], 'closed')
+
+    def testHalfOpenFailureOpensAgain(self):
+        for _ in range(4):
+            self.call(failed=True)
+        time.sleep(0.06)
+        self.call(failed=True)
+        stats = self.breaker.stats()
+        self.assertEqual(stats['state'], 'open')
+        self.assertEqual(stats['opened'], 2)
+
+
+class AdmissionTest(unittest.TestCase):
+
+    def testRejectsAboveLimit(self):
+        admission = Admission(2, 7)
+        with admission.admit():
+            with admission.admit():
+                self.assertEqual(admission.stats()['in_flight'], 2)
+                with self.assertRaises(ServiceUnavailable) as context:
+                    with admission.admit():
+                        pass
+                self.assertEqual(context.exception.retry_after, 7)
+        with admission.admit(2):
+            pass
+        self.assertEqual(admission.stats(), {
+            'admitted': 3, 'rejected': 1, 'in_flight': 0, 'limit': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import unittest
+from unittest import mock
+
+from actinia_gdi.core import payloadStore
+from actinia_gdi.core.payloadStore import compressPayload, decompressPayload
+from actinia_gdi.core.payloadStore import insertPayloads, splitPayloads
+
+
+LOG = [{'executable': 'r.info', 'stdout': 'x' * 2000}]
+
+
+class PayloadStoreTest(unittest.TestCase):
+
+    def test_compress_roundtrip(self):
+        digest, codec, data = compressPayload(LOG)
+
+        assert len(data) < 2000
+        assert decompressPayload(codec, data) == LOG
+        assert compressPayload(LOG)[0] == digest
+
+    def test_split_large_fields(self):
+        resp = {
+            'status': 'running',
+            'process_log': LOG,
+            'process_results': {},
+            'urls': {'status': 'url', 'resources': ['x' * 2000]}
+        }
+        small, payloads = splitPayloads(resp)
+
+        assert [p[0] for p in payloads] == ['process_log', 'urls.resources']
+        assert small['process_log'] == {'$ref': payloads[0][1]}
+        assert small['urls']['resources'] == {'$ref': payloads[1][1]}
+        assert small['urls']['status'] == 'url'
+        assert small['process_results'] == {}
+        assert resp['process_log'] == LOG
+
+    def test_split_stored_response(self):
+        small, _ = splitPayloads({'process_log': LOG})
+        again, payloads = splitPayloads(small)
+
+        assert again == small
+        assert payloads == []
+
+    def test_insert_payloads_once(self):
+        # the same log in two responses of a batch
+        _, first = splitPayloads({'process_log': LOG})
+        _, second = splitPayloads({'process_log': LOG, 'urls': {
+            'resources': ['x' * 2000]}})
+
+        with mock.patch.object(payloadStore, 'JobPayload') as JobPayload:
+            insertPayloads(first + second)
+
+        rows = JobPayload.insert_many.call_args[0][0]
+        assert JobPayload.insert_many.call_count == 1
+        assert sorted(row['digest'] for row in rows) == sorted(
+            [first[0][1], second[1][1]])
+
+    def test_zstd_without_zstandard(self):
+        with mock.patch.object(payloadStore, 'zstandard', None):
+            with self.assertRaisesRegex(ValueError, 'zstandard'):
+                decompressPayload('zstd', b'data')
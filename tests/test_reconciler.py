@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import json
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from actinia_gdi.core.jobStore import MemoryJobStore
+from actinia_gdi.core import reconciler as reconcilerModule
+from actinia_gdi.core.reconciler import RateLimiter, Reconciler
+from actinia_gdi.resources.config import ACTINIACORE
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    status = {}
+
+    def do_GET(self):
+        resourceId = self.path.split('/')[-1]
+        if resourceId not in Handler.status:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({
+            'resource_id': resourceId,
+            'status': Handler.status[resourceId],
+            'urls': {'status': 'http://actinia-core/' + resourceId}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Config:
+    stale_seconds = 60
+    batch_size = 2
+    concurrency = 2
+    rate = 1000
+
+
+def actiniaCoreResp(resourceId):
+    return {
+        'resource_id': resourceId,
+        'status': 'accepted',
+        'urls': {'status': 'http://actinia-core/resources/gdi/'
+                 + resourceId}
+    }
+
+
+class ReconcilerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:%s/api/v1/' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+        self.jobStore = reconcilerModule.jobStore
+        reconcilerModule.jobStore = self.store
+        self.store.insertNewJobs([
+            ({}, {}, 'loop', None, actiniaCoreResp('resource_id-%s' % n),
+             self.url) for n in range(1, 6)])
+        # all but the last job are stale
+        for jobid in range(1, 5):
+            self.store._jobs[jobid]['time_modified'] -= timedelta(hours=1)
+        Handler.status = {'resource_id-1': 'finished',
+                          'resource_id-2': 'running',
+                          'resource_id-3': 'accepted',
+                          'resource_id-5': 'finished'}
+
+    def tearDown(self):
+        reconcilerModule.jobStore = self.jobStore
+
+    def apply(self, resourceId, resp):
+        record, _, _ = self.store.updateJobByResourceID(
+            resourceId, resp, resp['status'])
+        return record
+
+    def test_reconcile_stale_jobs(self):
+        reconciler = Reconciler(Config, self.apply)
+        assert reconciler.reconcile() == 4
+
+        status = [self.store.getJobById(jobid)['status']
+                  for jobid in range(1, 6)]
+        assert status == ['SUCCESS', 'RUNNING', 'PENDING', 'PENDING',
+                          'PENDING']
+        assert reconciler.stats() == {
+            'runs': 1, 'polled': 3, 'updated': 2, 'failed': 1}
+
+        # only the job which could not be polled is still stale
+        assert reconciler.reconcile() == 1
+        assert reconciler.stats()['polled'] == 3
+
+    def test_stale_jobs_in_batches(self):
+        staleBefore = datetime.utcnow() - timedelta(minutes=1)
+        first = self.store.getStaleJobs(staleBefore, 3)
+        rest = self.store.getStaleJobs(staleBefore, 3, {
+            'id': first[-1]['idpk_jobs'],
+            'value': first[-1]['time_modified']})
+        assert [job['idpk_jobs'] for job in first + rest] == [1, 2, 3, 4]
+
+    def test_status_url_default_backend(self):
+        job = {'actinia_core_url': None, 'actinia_core_jobid': 'x'}
+        assert reconcilerModule.statusUrl(job) == (
+            ACTINIACORE.url + 'resources/' + ACTINIACORE.user + '/x')
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.wait()
+        assert time.monotonic() - start >= 0.09
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018-present mundialis GmbH & Co. KG
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Test
+"""
+
+__author__ = "Carmen Tawalika"
+__copyright__ = "2018-present mundialis GmbH & Co. KG"
+__license__ = "Apache-2.0"
+
+
+import time
+import unittest
+from unittest import mock
+
+from actinia_gdi.core import updateBuffer as updateBufferModule
+from actinia_gdi.core.jobStore import MemoryJobStore
+from actinia_gdi.core.updateBuffer import UpdateBuffer
+
+
+def actiniaCoreResp(resourceId, progress):
+    return {
+        'resource_id': resourceId,
+        'status': 'running',
+        'progress': {'step': progress},
+        'urls': {'status': 'http://actinia-core/resources/gdi/'
+                 + resourceId}
+    }
+
+
+def waitFor(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+class UpdateBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+        self.store.insertNewJobs([
+            ({}, {}, 'loop', None, {
+                'resource_id': resourceId, 'status': 'accepted',
+                'urls': {'status': 'http://actinia-core/resources/gdi/'
+                         + resourceId}})
+            for resourceId in ['resource_id-1', 'resource_id-2']])
+        patcher = mock.patch.object(updateBufferModule, 'jobStore',
+                                    self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_latest_update_per_job(self):
+        # flushed by hand only
+        buffer = UpdateBuffer(60000, 10)
+
+        with mock.patch.object(self.store, 'updateJobsByResourceIDs',
+                               wraps=self.store.updateJobsByResourceIDs) \
+                as update:
+            for progress in range(1, 4):
+                buffer.add('resource_id-1',
+                           actiniaCoreResp('resource_id-1', progress))
+            buffer.add('resource_id-2', actiniaCoreResp('resource_id-2', 1))
+            buffer.flush()
+            buffer.flush()
+
+        update.assert_called_once()
+        assert sorted(update.call_args[0][0]) == [
+            'resource_id-1', 'resource_id-2']
+        job = self.store.getJobById(1)
+        assert job['status'] == 'RUNNING'
+        assert job['actinia_core_response']['progress'] == {'step': 3}
+        assert job['version'] == 1
+
+    def test_discard(self):
+        buffer = UpdateBuffer(60000, 10)
+        buffer.add('resource_id-1', actiniaCoreResp('resource_id-1', 1))
+        buffer.add('resource_id-2', actiniaCoreResp('resource_id-2', 1))
+
+        buffer.discard('resource_id-1')
+        buffer.flush()
+
+        assert self.store.getJobById(1)['status'] == 'PENDING'
+        assert self.store.getJobById(2)['status'] == 'RUNNING'
+
+    def test_flush_when_full(self):
+        buffer = UpdateBuffer(60000, 2)
+        buffer.add('resource_id-1', actiniaCoreResp('resource_id-1', 1))
+        time.sleep(0.05)
+        assert self.store.getJobById(1)['status'] == 'PENDING'
+
+        buffer.add('resource_id-2', actiniaCoreResp('resource_id-2', 1))
+
+        assert waitFor(lambda: self.store.getJobById(1)['status']
+                       == 'RUNNING')
+
+    def test_flush_interval(self):
+        buffer = UpdateBuffer(20, 10)
+        buffer.add('resource_id-1', actiniaCoreResp('resource_id-1', 1))
+
+        assert waitFor(lambda: self.store.getJobById(1)['status']
+                       == 'RUNNING')